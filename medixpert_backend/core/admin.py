@@ -0,0 +1,347 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Disease, HealthRecord, Prediction, Symptom, UserProfile
+from .sharding import shard_aliases
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_THRESHOLD = 100_000
+
+
+def estimated_rows(queryset):
+    """Row count of the queryset's table from planner statistics, or None"""
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [table],
+            )
+        elif connection.vendor == "sqlite":
+            # Only present once ANALYZE has run; the first number of each stat
+            # is the rows an index covers, fewer than the table for a partial one
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                "AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            return max(int(str(stat).split()[0]) for (stat,) in rows)
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    estimate = int(row[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count of an unfiltered changelist from the
+    planner statistics instead of running COUNT(*) over the whole table.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_rows(queryset)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def _periods(first, last, kind):
+    """(start, end) of every year, month or day between first and last"""
+    day = first
+    while day <= last:
+        if kind == "year":
+            start, end = date(day.year, 1, 1), date(day.year + 1, 1, 1)
+        elif kind == "month":
+            start = date(day.year, day.month, 1)
+            end = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        else:
+            start = day
+            end = date.fromordinal(day.toordinal() + 1)
+        yield start, end
+        day = end
+
+
+def _plain_edge(aggregate):
+    """Min() or Max() of a single column, without a filter"""
+    return (
+        isinstance(aggregate, (Min, Max))
+        and aggregate.filter is None
+        and isinstance(aggregate.source_expressions[0], F)
+    )
+
+
+class DateProbeQuerySet(QuerySet):
+    """
+    Answers dates() and datetimes() (the admin date hierarchy) with one
+    indexed EXISTS probe per candidate year, month or day instead of a
+    DISTINCT over every row of the table.
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # SQLite reads MIN() or MAX() straight off an index only when it is
+        # alone in the query; the date hierarchy asks for both at once
+        if args or not all(_plain_edge(value) for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        return {alias: self._edge(value) for alias, value in kwargs.items()}
+
+    def _edge(self, aggregate):
+        field_name = aggregate.source_expressions[0].name
+        order = field_name if isinstance(aggregate, Min) else f"-{field_name}"
+        return (
+            self.filter(**{f"{field_name}__isnull": False})
+            .order_by(order)
+            .values_list(field_name, flat=True)
+            .first()
+        )
+
+    def _has_rows(self, field_name, start, end):
+        # Our bounds go first: SQLite seeks the index with the first range it
+        # finds, and the changelist's own (wider) date filter comes earlier
+        bounded = self.model._base_manager.db_manager(self.db).filter(
+            **{f"{field_name}__gte": start, f"{field_name}__lt": end}
+        )
+        return (bounded & self).exists()
+
+    def _probe(self, field_name, kind, order, day_of, bound):
+        """Periods that hold at least one row, as bound(first day)"""
+        if kind not in ("year", "month", "day"):
+            return None
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds["first"] is None:
+            return []
+        found = [
+            bound(start)
+            for start, end in _periods(
+                day_of(bounds["first"]), day_of(bounds["last"]), kind
+            )
+            if self._has_rows(field_name, bound(start), bound(end))
+        ]
+        return found[::-1] if order == "DESC" else found
+
+    def dates(self, field_name, kind, order="ASC"):
+        found = self._probe(field_name, kind, order, lambda d: d, lambda d: d)
+        return super().dates(field_name, kind, order) if found is None else found
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None):
+        def day_of(value):
+            return timezone.localtime(value).date() if settings.USE_TZ else value.date()
+
+        def bound(day):
+            value = datetime(day.year, day.month, day.day)
+            return timezone.make_aware(value) if settings.USE_TZ else value
+
+        found = self._probe(field_name, kind, order, day_of, bound)
+        if found is None:
+            return super().datetimes(field_name, kind, order, tzinfo)
+        return found
+
+
+def date_probe(queryset):
+    clone = DateProbeQuerySet(
+        model=queryset.model,
+        query=queryset.query.chain(),
+        using=queryset._db,
+        hints=queryset._hints,
+    )
+    clone._prefetch_related_lookups = queryset._prefetch_related_lookups
+    return clone
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Which shard the changelist reads per-user rows from"""
+
+    title = "shard"
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def value(self):
+        return super().value() or next(iter(shard_aliases()), None)
+
+    def choices(self, changelist):
+        # Rows live on exactly one shard; there is no "all shards" listing
+        choices = super().choices(changelist)
+        next(choices)
+        yield from choices
+
+    def queryset(self, request, queryset):
+        alias = self.value()
+        return queryset.using(alias) if alias in shard_aliases() else queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelists for tables with millions of rows: estimated unfiltered
+    counts, no second full count, index-probed date hierarchy, raw-id
+    widgets, and objects looked up on whichever shard holds them.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_queryset(self, request):
+        return date_probe(super().get_queryset(request))
+
+    def get_object(self, request, object_id, from_field=None):
+        if not shard_aliases():
+            return super().get_object(request, object_id, from_field)
+        model = self.model
+        field = (
+            model._meta.pk if from_field is None else model._meta.get_field(from_field)
+        )
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for alias in shard_aliases():
+            found = (
+                self.get_queryset(request)
+                .using(alias)
+                .filter(**{field.name: object_id})
+                .first()
+            )
+            if found is not None:
+                return found
+        return None
+
+    def get_readonly_fields(self, request, obj=None):
+        # Owners never change; it also keeps the form from validating shard
+        # rows against the default database
+        readonly = super().get_readonly_fields(request, obj)
+        return (*readonly, *self.owner_fields) if obj else readonly
+
+
+def update_in_batches(queryset, batch_size=1000, **changes):
+    """UPDATE a possibly huge selection in short pk-ordered batches"""
+    manager = queryset.model._default_manager.db_manager(queryset.db)
+    ids = queryset.order_by("pk").values_list("pk", flat=True)
+    updated = last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return updated
+        updated += manager.filter(pk__in=batch).update(**changes)
+        last_pk = batch[-1]
+
+
+def status_action(status, label):
+    @admin.action(
+        description=f"Mark selected health records as {label}", permissions=["change"]
+    )
+    def action(modeladmin, request, queryset):
+        # Records leave the review queue, so drop any lease on them the way
+        # review_queue.release() does
+        updated = update_in_batches(
+            queryset,
+            status=status,
+            reviewer=None,
+            lease_expires_at=None,
+            updated_at=timezone.now(),
+        )
+        modeladmin.message_user(request, f"{updated} health records marked as {label}.")
+
+    action.__name__ = f"mark_{status}"
+    return action
+
+
+@admin.register(Symptom)
+class SymptomAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "created_at")
+    search_fields = ("name",)
+
+
+@admin.register(Disease)
+class DiseaseAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "severity", "created_at")
+    list_filter = ("severity",)
+    search_fields = ("name",)
+    filter_horizontal = ("symptoms",)
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "age", "gender", "created_at")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    search_fields = ("=user__username",)
+
+
+@admin.register(Prediction)
+class PredictionAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "user",
+        "predicted_disease",
+        "confidence_score",
+        "symptom_names",
+        "timestamp",
+    )
+    list_select_related = ("user", "predicted_disease")
+    list_filter = (ShardFilter, "predicted_disease")
+    date_hierarchy = "timestamp"
+    sortable_by = ("id", "timestamp")
+    # Exact match uses the username index; icontains would scan every user
+    search_fields = ("=user__username",)
+    raw_id_fields = ("user", "predicted_disease")
+    autocomplete_fields = ("symptoms",)
+    owner_fields = ("user",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("symptoms")
+
+    @admin.display(description="symptoms")
+    def symptom_names(self, obj):
+        return ", ".join(symptom.name for symptom in obj.symptoms.all())
+
+
+@admin.register(HealthRecord)
+class HealthRecordAdmin(LargeTableAdmin):
+    list_display = (
+        "id",
+        "user",
+        "prediction_summary",
+        "status",
+        "follow_up_date",
+        "reviewer_id",
+        "created_at",
+    )
+    list_select_related = ("user", "prediction__predicted_disease")
+    list_filter = (ShardFilter, "status")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at", "-id")
+    sortable_by = ("id", "created_at", "follow_up_date")
+    search_fields = ("=user__username",)
+    raw_id_fields = ("user", "prediction", "reviewer")
+    owner_fields = ("user", "prediction")
+    actions = [
+        status_action("reviewed", "reviewed"),
+        status_action("treated", "treated"),
+        status_action("follow_up", "follow-up required"),
+    ]
+
+    @admin.display(description="prediction", ordering="prediction_id")
+    def prediction_summary(self, obj):
+        # Not str(obj.prediction), which would follow prediction.user again
+        return f"#{obj.prediction_id} {obj.prediction.predicted_disease.name}"
@@ -0,0 +1,141 @@
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DiseaseIncidenceRollup, RollupWatermark, UserProfile
+
+AGE_BANDS = [(17, "0-17"), (29, "18-29"), (44, "30-44"), (64, "45-64")]
+
+# Rollups key fields, in the order used by the delta counters below. Severity
+# is not one of them: it is read from the disease when querying, so changing
+# a disease's severity regroups its past counts instead of splitting them
+ROLLUP_KEY = ("period", "period_start", "disease_id", "age_band", "gender")
+
+# Set while predictions are deleted only to be moved elsewhere (shard moves,
+# archiving), which must not lower the incidence counts
+_suspended = contextvars.ContextVar("rollups_suspended", default=False)
+
+
+def rollup_mode():
+    return getattr(settings, "ANALYTICS_ROLLUP_MODE", "incremental")
+
+
+@contextmanager
+def suspend_rollups():
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+def rollups_suspended():
+    return _suspended.get()
+
+
+def age_band(age):
+    if age is None:
+        return ""
+    for upper, label in AGE_BANDS:
+        if age <= upper:
+            return label
+    return "65+"
+
+
+def profile_dimensions(user_ids, batch_size=10000):
+    """
+    Map user id -> (age band, gender). Profiles are read for every batch of
+    predictions rather than cached, so a profile created, edited or deleted
+    in any process is counted the same way a rebuild would count it.
+    """
+    user_ids = list(set(user_ids))
+    dimensions = dict.fromkeys(user_ids, ("", ""))
+    # Within SQLite's limit on query parameters
+    for start in range(0, len(user_ids), batch_size):
+        for user_id, age, gender in (
+            UserProfile.objects.using("default")
+            .filter(user_id__in=user_ids[start : start + batch_size])
+            .values_list("user_id", "age", "gender")
+        ):
+            dimensions[user_id] = (age_band(age), gender or "")
+    return dimensions
+
+
+def count_predictions(rows, sign=1):
+    """
+    Fold (timestamp, disease_id, user_id) rows into rollup deltas.
+
+    Every prediction counts once towards its day and once towards its week.
+    """
+    rows = list(rows)
+    dimensions = profile_dimensions(row[2] for row in rows)
+    deltas = Counter()
+    for timestamp, disease_id, user_id in rows:
+        day = timezone.localdate(timestamp)
+        week = day - timedelta(days=day.weekday())
+        band, gender = dimensions[user_id]
+        deltas[("day", day, disease_id, band, gender)] += sign
+        deltas[("week", week, disease_id, band, gender)] += sign
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add counters into the rollup table with in-place increments"""
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        lookup = dict(zip(ROLLUP_KEY, key))
+        rows = DiseaseIncidenceRollup.objects.using("default").filter(**lookup)
+        if rows.update(count=F("count") + delta):
+            continue
+        try:
+            with transaction.atomic(using="default"):
+                DiseaseIncidenceRollup.objects.using("default").create(
+                    count=delta, **lookup
+                )
+        except IntegrityError:
+            # Another worker created the row between our update and insert
+            rows.update(count=F("count") + delta)
+
+
+def record_prediction(prediction, sign):
+    """Count a created (+1) or deleted (-1) prediction once its write commits"""
+    row = (prediction.timestamp, prediction.predicted_disease_id, prediction.user_id)
+    transaction.on_commit(
+        lambda: apply_deltas(count_predictions([row], sign)),
+        using=prediction._state.db,
+    )
+
+
+def prediction_rows(queryset):
+    return queryset.values_list("timestamp", "predicted_disease_id", "user_id")
+
+
+def compact(alias, batch_size=5000):
+    """Fold predictions newer than the alias's watermark into the rollups"""
+    from .models import Prediction
+
+    watermark, _ = RollupWatermark.objects.using("default").get_or_create(name=alias)
+    folded = 0
+    while True:
+        batch = list(
+            Prediction.objects.using(alias)
+            .filter(pk__gt=watermark.last_prediction_id)
+            .order_by("pk")
+            .values_list("pk", "timestamp", "predicted_disease_id", "user_id")[
+                :batch_size
+            ]
+        )
+        if not batch:
+            return folded
+        with transaction.atomic(using="default"):
+            apply_deltas(count_predictions(row[1:] for row in batch))
+            watermark.last_prediction_id = batch[-1][0]
+            watermark.save(using="default")
+        folded += len(batch)
@@ -0,0 +1,344 @@
+import heapq
+import json
+import time
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .analytics import rollup_mode, suspend_rollups
+from .models import (
+    Disease,
+    HealthRecord,
+    Prediction,
+    PredictionArchiveSegment,
+    RollupWatermark,
+    Symptom,
+)
+from .sharding import user_queryset
+
+# Health records still in a workflow (review queue, follow-up reminders) keep
+# their prediction in the hot tables
+ACTIVE_STATUSES = ("pending", "follow_up")
+
+PREDICTION_COLUMNS = (
+    "id",
+    "timestamp",
+    "predicted_disease_id",
+    "confidence_score",
+    "additional_symptoms",
+    "notes",
+)
+HEALTH_RECORD_COLUMNS = (
+    "id",
+    "prediction_id",
+    "doctor_notes",
+    "prescription",
+    "follow_up_date",
+    "status",
+    "diagnosis_confirmed",
+    "created_at",
+    "updated_at",
+)
+DATETIME_COLUMNS = ("timestamp", "created_at", "updated_at")
+
+
+def _config(name, default):
+    return getattr(settings, "ARCHIVE", {}).get(name, default)
+
+
+def hot_cutoff():
+    """Predictions older than this are moved to the archive"""
+    return timezone.now() - timedelta(days=_config("AFTER_DAYS", 365))
+
+
+def _month(timestamp):
+    return timezone.localdate(timestamp).replace(day=1)
+
+
+def _columns(rows, columns):
+    # Rows decoded from older segments lack columns added since
+    return {column: [row.get(column) for row in rows] for column in columns}
+
+
+def _rows(block):
+    rows = [dict(zip(block, values)) for values in zip(*block.values())]
+    for row in rows:
+        for column in DATETIME_COLUMNS:
+            if column in row:
+                row[column] = parse_datetime(row[column])
+        if row.get("follow_up_date"):
+            row["follow_up_date"] = parse_date(row["follow_up_date"])
+    return rows
+
+
+def encode(predictions, records):
+    """Compress rows column by column; repeated values then compress well"""
+    payload = {
+        "predictions": _columns(predictions, PREDICTION_COLUMNS + ("symptom_ids",)),
+        "health_records": _columns(records, HEALTH_RECORD_COLUMNS),
+    }
+    data = json.dumps(payload, separators=(",", ":"), default=lambda v: v.isoformat())
+    return zlib.compress(data.encode(), 9)
+
+
+def decode(payload):
+    """(predictions, health records) as row dicts, newest first"""
+    block = json.loads(zlib.decompress(payload))
+    return _rows(block["predictions"]), _rows(block["health_records"])
+
+
+def _candidates(alias, cutoff, after_pk, batch_size):
+    predictions = Prediction.objects.using(alias).filter(
+        pk__gt=after_pk, timestamp__lt=cutoff
+    )
+    if rollup_mode() != "incremental":
+        # Only rows already folded into the rollups by compact_rollups
+        watermark = (
+            RollupWatermark.objects.using("default")
+            .filter(name=alias)
+            .values_list("last_prediction_id", flat=True)
+            .first()
+        )
+        predictions = predictions.filter(pk__lte=watermark or 0)
+    return list(
+        predictions.exclude(healthrecord__status__in=ACTIVE_STATUSES)
+        .exclude(healthrecord__follow_up_date__gte=timezone.localdate())
+        .select_for_update()
+        .order_by("pk")
+        .values("user_id", *PREDICTION_COLUMNS)[:batch_size]
+    )
+
+
+def _merge_segment(alias, user_id, month, predictions, records):
+    segment = (
+        PredictionArchiveSegment.objects.using(alias)
+        .select_for_update()
+        .filter(user_id=user_id, month=month)
+        .first()
+    )
+    if segment is None:
+        segment = PredictionArchiveSegment(user_id=user_id, month=month)
+    else:
+        # Rows archived again (e.g. after a restore) replace the old copies
+        ids = {row["id"] for row in predictions}
+        old_predictions, old_records = decode(segment.payload)
+        predictions = [row for row in old_predictions if row["id"] not in ids] + (
+            predictions
+        )
+        records = [row for row in old_records if row["prediction_id"] not in ids] + (
+            records
+        )
+    predictions.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    records.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+    segment.first_timestamp = predictions[-1]["timestamp"]
+    segment.last_timestamp = predictions[0]["timestamp"]
+    segment.min_prediction_id = min(row["id"] for row in predictions)
+    segment.max_prediction_id = max(row["id"] for row in predictions)
+    segment.prediction_count = len(predictions)
+    segment.health_record_count = len(records)
+    segment.min_health_record_id = min((row["id"] for row in records), default=None)
+    segment.max_health_record_id = max((row["id"] for row in records), default=None)
+    segment.last_health_record_at = records[0]["created_at"] if records else None
+    segment.payload = encode(predictions, records)
+    segment.save(using=alias)
+
+
+def archive_batch(alias, cutoff, after_pk=0, batch_size=500):
+    """
+    Move up to batch_size predictions older than cutoff, with their symptoms
+    and health records, into their users' monthly segments.
+
+    Everything happens in one short transaction, so the hot tables are never
+    locked for longer than one batch. Returns (predictions, health records,
+    last primary key seen); the last key is None once nothing is left.
+    """
+    with transaction.atomic(using=alias):
+        predictions = _candidates(alias, cutoff, after_pk, batch_size)
+        if not predictions:
+            return 0, 0, None
+        ids = [row["id"] for row in predictions]
+
+        symptom_ids = defaultdict(list)
+        through = Prediction.symptoms.through.objects.using(alias)
+        for prediction_id, symptom_id in through.filter(
+            prediction_id__in=ids
+        ).values_list("prediction_id", "symptom_id"):
+            symptom_ids[prediction_id].append(symptom_id)
+        records = defaultdict(list)
+        for record in (
+            HealthRecord.objects.using(alias)
+            .filter(prediction_id__in=ids)
+            .values(*HEALTH_RECORD_COLUMNS)
+        ):
+            records[record["prediction_id"]].append(record)
+
+        groups = defaultdict(lambda: ([], []))
+        for row in predictions:
+            row["symptom_ids"] = sorted(symptom_ids[row["id"]])
+            group = groups[(row.pop("user_id"), _month(row["timestamp"]))]
+            group[0].append(row)
+            group[1].extend(records[row["id"]])
+        for (user_id, month), (rows, user_records) in groups.items():
+            _merge_segment(alias, user_id, month, rows, user_records)
+
+        # Health records and symptom links cascade; archived predictions still
+        # count towards disease incidence
+        with suspend_rollups():
+            Prediction.objects.using(alias).filter(pk__in=ids).delete()
+    return len(ids), sum(len(r) for r in records.values()), ids[-1]
+
+
+def archive_old_predictions(alias, cutoff=None, batch_size=None, pause=None):
+    """Archive everything older than cutoff, batch by batch; returns totals"""
+    cutoff = cutoff or hot_cutoff()
+    batch_size = batch_size or _config("BATCH_SIZE", 500)
+    pause = _config("PAUSE", 0.05) if pause is None else pause
+    totals = {"predictions": 0, "health_records": 0, "batches": 0}
+    last_pk = 0
+    while True:
+        predictions, records, last_pk = archive_batch(
+            alias, cutoff, last_pk, batch_size
+        )
+        if last_pk is None:
+            return totals
+        totals["predictions"] += predictions
+        totals["health_records"] += records
+        totals["batches"] += 1
+        # Let queued writers in between batches
+        time.sleep(pause)
+
+
+def _segments(user, start=None, end=None):
+    segments = user_queryset(PredictionArchiveSegment, user)
+    if start:
+        segments = segments.filter(month__gte=start.replace(day=1))
+    if end:
+        segments = segments.filter(month__lte=end)
+    return segments
+
+
+def _in_range(timestamp, start, end):
+    day = timezone.localdate(timestamp)
+    return (start is None or day >= start) and (end is None or day <= end)
+
+
+def _prediction(user, row):
+    prediction = Prediction(
+        user=user, **{column: row[column] for column in PREDICTION_COLUMNS}
+    )
+    # Read by CachedSymptomsField like a prefetch; ids are all it needs
+    prediction._prefetched_objects_cache = {
+        "symptoms": [Symptom(pk=pk) for pk in row["symptom_ids"]]
+    }
+    return prediction
+
+
+def _health_record(user, row, prediction):
+    return HealthRecord(
+        user=user,
+        prediction=prediction,
+        **{column: row.get(column) for column in HEALTH_RECORD_COLUMNS},
+    )
+
+
+def archived_predictions(user, start=None, end=None, newest_first=True):
+    """A user's archived predictions as unsaved Prediction instances"""
+    segments = _segments(user, start, end).order_by(
+        "-month" if newest_first else "month"
+    )
+    for segment in segments:
+        rows, _ = decode(segment.payload)
+        if not newest_first:
+            rows.reverse()
+        for row in rows:
+            if _in_range(row["timestamp"], start, end):
+                yield _prediction(user, row)
+
+
+def archived_health_records(user, start=None, end=None, newest_first=True):
+    """A user's archived health records, filtered on their creation date"""
+    # A record can be created after its prediction's month, so the start
+    # bound narrows down the segments by their newest record instead
+    segments = _segments(user, end=end).filter(health_record_count__gt=0)
+    if start:
+        segments = segments.filter(last_health_record_at__date__gte=start)
+    segments = segments.order_by("-month")
+    records = []
+    for segment in segments:
+        predictions, rows = decode(segment.payload)
+        by_id = {row["id"]: row for row in predictions}
+        for row in rows:
+            if _in_range(row["created_at"], start, end):
+                prediction = _prediction(user, by_id[row["prediction_id"]])
+                records.append(_health_record(user, row, prediction))
+    records.sort(key=lambda r: (r.created_at, r.pk), reverse=newest_first)
+    return records
+
+
+def find_prediction(user, pk):
+    # Id ranges of segments overlap when predictions were backfilled or moved
+    segments = _segments(user).filter(
+        min_prediction_id__lte=pk, max_prediction_id__gte=pk
+    )
+    for segment in segments:
+        for row in decode(segment.payload)[0]:
+            if row["id"] == pk:
+                return _prediction(user, row)
+    return None
+
+
+def find_health_record(user, pk):
+    segments = _segments(user).filter(
+        min_health_record_id__lte=pk, max_health_record_id__gte=pk
+    )
+    for segment in segments:
+        predictions, rows = decode(segment.payload)
+        for row in rows:
+            if row["id"] == pk:
+                prediction = next(
+                    p for p in predictions if p["id"] == row["prediction_id"]
+                )
+                return _health_record(user, row, _prediction(user, prediction))
+    return None
+
+
+def counts(user):
+    """(archived predictions, archived health records) for a user"""
+    totals = _segments(user).aggregate(
+        predictions=Sum("prediction_count"), records=Sum("health_record_count")
+    )
+    return totals["predictions"] or 0, totals["records"] or 0
+
+
+def merge_newest_first(hot, archived, key):
+    """Interleave two newest-first sequences (hot rows can be older than
+    archived ones while their health records are still in a workflow)"""
+    return list(heapq.merge(hot, archived, key=key, reverse=True))
+
+
+def rollup_rows(alias, segments_per_batch=100):
+    """
+    (timestamp, disease_id, user_id) rows of every archived prediction in
+    an alias, in lists of up to segments_per_batch segments.
+    """
+    diseases = set(Disease.objects.using(alias).values_list("id", flat=True))
+    batch = []
+    segments = PredictionArchiveSegment.objects.using(alias).order_by("pk")
+    for count, segment in enumerate(segments.iterator(chunk_size=100), 1):
+        for row in decode(segment.payload)[0]:
+            disease_id = row["predicted_disease_id"]
+            # Hot predictions of a deleted disease are deleted with it
+            if disease_id in diseases:
+                batch.append((row["timestamp"], disease_id, segment.user_id))
+        if count % segments_per_batch == 0:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
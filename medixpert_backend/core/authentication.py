@@ -0,0 +1,196 @@
+import copy
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import TTLCache
+from .db_routers import pin_if_recent_writer
+from .models import UserChange
+
+# User fields embedded in issued tokens; these cover everything UserSerializer
+# renders and the staff flags permission classes check, so read-only requests
+# never need the User row.
+USER_CLAIMS = (
+    "username",
+    "email",
+    "first_name",
+    "last_name",
+    "date_joined",
+    "is_staff",
+    "is_superuser",
+)
+
+_user_cache = TTLCache(ttl=getattr(settings, "JWT_USER_CACHE_TTL", 60))
+
+# user id -> time the user was last changed, for changes recent enough that
+# access tokens issued before them are still valid. Filled from the UserChange
+# table, so changes made by any process count.
+_invalidated = {}
+_sync = {"at": None, "watermark": None, "pruned": 0}
+_sync_lock = threading.Lock()
+
+# Changes are stamped before their transaction commits, so each sync re-reads
+# this many seconds before the previous one
+SYNC_OVERLAP = 60
+
+
+def get_tokens_for_user(user):
+    """Issue a refresh token (and its access token) carrying the user claims"""
+    refresh = RefreshToken.for_user(user)
+    for claim in USER_CLAIMS:
+        value = getattr(user, claim)
+        refresh[claim] = value.isoformat() if claim == "date_joined" else value
+    return refresh
+
+
+def _claimed_user_id(validated_token):
+    """The token's user id as the User primary key type (claims are strings)"""
+    user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    return User._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+
+
+def _record_change(user_id, changed_at):
+    changes = UserChange.objects.using("default")
+    if changes.filter(user_id=user_id).update(changed_at=changed_at):
+        return
+    try:
+        with transaction.atomic(using="default"):
+            changes.create(user_id=user_id, changed_at=changed_at)
+    except IntegrityError:
+        # Another process recorded the first change meanwhile
+        changes.filter(user_id=user_id).update(changed_at=changed_at)
+
+
+def invalidate_user(user_id):
+    """
+    Drop a cached user and stop trusting claims in tokens issued before now,
+    in this process at once and in the others at their next sync.
+    """
+    changed_at = time.time()
+    _user_cache.delete(user_id)
+    _invalidated[user_id] = changed_at
+    _record_change(user_id, datetime.fromtimestamp(changed_at, tz=timezone.utc))
+
+
+def sync_invalidations(force=False):
+    """Pull user changes made by other processes since the last sync"""
+    now = time.monotonic()
+    interval = getattr(settings, "JWT_INVALIDATION_SYNC_INTERVAL", 1)
+    if not force and _sync["at"] is not None and now - _sync["at"] < interval:
+        return
+    with _sync_lock:
+        started = time.time()
+        oldest = started - api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        since = oldest
+        if _sync["watermark"] is not None:
+            since = max(oldest, _sync["watermark"] - SYNC_OVERLAP)
+        changes = (
+            UserChange.objects.using("default")
+            .filter(changed_at__gte=datetime.fromtimestamp(since, tz=timezone.utc))
+            .values_list("user_id", "changed_at")
+        )
+        for user_id, changed_at in changes.iterator(chunk_size=10000):
+            changed_at = changed_at.timestamp()
+            if changed_at > _invalidated.get(user_id, 0):
+                _invalidated[user_id] = changed_at
+                _user_cache.delete(user_id)
+        if started - _sync["pruned"] > SYNC_OVERLAP:
+            # Every token issued before these changes has expired
+            for user_id in [u for u, at in _invalidated.items() if at < oldest]:
+                del _invalidated[user_id]
+            _sync["pruned"] = started
+        _sync["watermark"] = started
+        _sync["at"] = now
+
+
+def purge_user_changes():
+    """Delete changes older than every access token that could predate them"""
+    oldest = time.time() - api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    deleted, _ = (
+        UserChange.objects.using("default")
+        .filter(changed_at__lt=datetime.fromtimestamp(oldest, tz=timezone.utc))
+        .delete()
+    )
+    return deleted
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that avoids a database lookup per request.
+
+    Safe (read-only) requests build the user from the signed token claims.
+    Everything else resolves the user through a short-TTL in-process cache,
+    falling back to the database on a miss. Both stop trusting what they hold
+    for a user changed since, once the change is synced.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        sync_invalidations()
+
+        user = None
+        if request.method in SAFE_METHODS and getattr(
+            settings, "JWT_TRUST_USER_CLAIMS", True
+        ):
+            user = self.get_user_from_claims(validated_token)
+        if user is None:
+            user = self.get_user(validated_token)
+        pin_if_recent_writer(user.pk)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        user_id = _claimed_user_id(validated_token)
+        user = _user_cache.get(user_id) if user_id is not None else None
+        if user is None:
+            user = super().get_user(validated_token)
+            _user_cache.set(user_id, user)
+        # Hand out a copy so one request cannot mutate another's user
+        return copy.copy(user)
+
+    def get_user_from_claims(self, validated_token):
+        """Build an unsaved-looking User from token claims, or None if untrusted"""
+        user_id = _claimed_user_id(validated_token)
+        issued_at = validated_token.get("iat")
+        if user_id is None or issued_at is None:
+            return None
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            return None
+
+        changed_at = _invalidated.get(user_id)
+        if changed_at is not None and issued_at <= changed_at:
+            return None
+
+        user = User(
+            **{api_settings.USER_ID_FIELD: user_id},
+            username=validated_token["username"],
+            email=validated_token["email"],
+            first_name=validated_token["first_name"],
+            last_name=validated_token["last_name"],
+            date_joined=parse_datetime(validated_token["date_joined"]),
+            is_staff=validated_token["is_staff"],
+            is_superuser=validated_token["is_superuser"],
+            is_active=True,
+        )
+        # Mark the instance as loaded so the ORM treats it like a fetched row
+        user._state.adding = False
+        user._state.db = "default"
+        return user
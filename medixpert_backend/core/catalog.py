@@ -0,0 +1,135 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import TTLCache
+from .models import CatalogVersion, Disease, Symptom, new_catalog_token
+
+_version_cache = TTLCache(ttl=getattr(settings, "CATALOG_VERSION_TTL", 5), maxsize=1)
+_fragments = {"stamp": None, "diseases": {}, "symptoms": {}, "payloads": {}}
+_build_lock = threading.Lock()
+
+
+def _stamp():
+    stamp = _version_cache.get("version")
+    if stamp is None:
+        stamp = (
+            CatalogVersion.objects.using("default")
+            .filter(pk=1)
+            .values_list("version", "token")
+            .first()
+        ) or (0, "")
+        _version_cache.set("version", stamp)
+    return stamp
+
+
+def current_version():
+    return _stamp()[0]
+
+
+def current_stamp():
+    """
+    (version, token) of the catalog, identifying its contents across
+    databases and rollbacks where the version number alone does not
+    """
+    stamp = _stamp()
+    if not stamp[1]:
+        # Never bumped: create the row so this catalog has a token too
+        CatalogVersion.objects.using("default").get_or_create(pk=1)
+        _version_cache.delete("version")
+        stamp = _stamp()
+    return stamp
+
+
+def bump_version(using="default"):
+    """Invalidate rendered catalog fragments in every process"""
+    updated = (
+        CatalogVersion.objects.using(using)
+        .filter(pk=1)
+        .update(version=F("version") + 1, token=new_catalog_token())
+    )
+    if not updated:
+        CatalogVersion.objects.using(using).get_or_create(pk=1, defaults={"version": 1})
+    transaction.on_commit(lambda: _version_cache.delete("version"), using=using)
+
+
+def _build(stamp):
+    from .serializers import DiseaseSerializer, SymptomSerializer
+
+    symptoms = {
+        symptom.pk: SymptomSerializer(symptom).data
+        for symptom in Symptom.objects.using("default")
+    }
+    diseases = {}
+    for disease in Disease.objects.using("default").prefetch_related("symptoms"):
+        data = DiseaseSerializer(disease).data
+        # Share the symptom fragments instead of holding a copy per disease
+        data["symptoms"] = [symptoms[symptom.pk] for symptom in disease.symptoms.all()]
+        diseases[disease.pk] = data
+    return {
+        "stamp": stamp,
+        "diseases": diseases,
+        "symptoms": symptoms,
+        # Encoded list responses, filled in lazily by encoded_list()
+        "payloads": {},
+    }
+
+
+def fragments():
+    """
+    Rendered DiseaseSerializer and SymptomSerializer output for the whole
+    catalog, by primary key, for the current catalog stamp (the same key as
+    the catalog snapshot's).
+
+    The fragments are shared between responses and must not be modified.
+    """
+    global _fragments
+    stamp = current_stamp()
+    if _fragments["stamp"] != stamp:
+        with _build_lock:
+            if _fragments["stamp"] != stamp:
+                _fragments = _build(stamp)
+    return _fragments
+
+
+def _lookup(kind, pk):
+    found = fragments()[kind].get(pk)
+    if found is None:
+        # Possibly added by another process within the version TTL
+        _version_cache.delete("version")
+        found = fragments()[kind].get(pk)
+    return found
+
+
+def disease_fragment(pk):
+    return _lookup("diseases", pk)
+
+
+def symptom_fragment(pk):
+    return _lookup("symptoms", pk)
+
+
+def encoded_list(kind, encoding=None):
+    """
+    JSON body of the whole "diseases" or "symptoms" list endpoint, compressed
+    with encoding (None for identity). Bodies are cached with the fragments,
+    so each catalog stamp is serialized and compressed once per process.
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .compression import compress
+
+    current = fragments()
+    payloads = current["payloads"]
+    body = payloads.get((kind, encoding))
+    if body is None:
+        raw = payloads.get((kind, None))
+        if raw is None:
+            raw = payloads[(kind, None)] = JSONRenderer().render(
+                list(current[kind].values())
+            )
+        body = compress(raw, encoding, precompressed=True) if encoding else raw
+        payloads[(kind, encoding)] = body
+    return body
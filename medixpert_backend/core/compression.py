@@ -0,0 +1,134 @@
+import functools
+import zlib
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+
+def _gzip(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+    return compressor.compress(data) + compressor.flush()
+
+
+def _codecs():
+    """Content codings this process can produce; brotli and zstd are optional"""
+    codecs = {"gzip": _gzip}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        codecs["br"] = lambda data, level: brotli.compress(data, quality=level)
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        codecs["zstd"] = lambda data, level: zstandard.ZstdCompressor(
+            level=level
+        ).compress(data)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def _config(name, default):
+    return getattr(settings, "COMPRESSION", {}).get(name, default)
+
+
+def available_encodings():
+    """Configured codings in server preference order, if installed"""
+    return [e for e in _config("ENCODINGS", ["zstd", "br", "gzip"]) if e in CODECS]
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate(accept_encoding, encodings=None):
+    """
+    The coding to answer an Accept-Encoding header with, or None, out of
+    encodings (a tuple; default every available one)
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    # Ties go to the server's preference
+    for coding in encodings or available_encodings():
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data, encoding, precompressed=False):
+    """
+    Compress with one of CODECS. Bodies compressed once and cached use the
+    slow, dense PRECOMPRESSED_LEVELS; per-response compression uses LEVELS.
+    """
+    if precompressed:
+        levels = _config("PRECOMPRESSED_LEVELS", {"gzip": 9, "br": 11, "zstd": 19})
+    else:
+        levels = _config("LEVELS", {"gzip": 6, "br": 4, "zstd": 3})
+    return CODECS[encoding](data, levels[encoding])
+
+
+def precompressed_response(body, encoding, content_type="application/json"):
+    """A response around bytes already compressed with encoding (or None)"""
+    response = HttpResponse(body, content_type=content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+class CompressionMiddleware:
+    """
+    Compress responses of at least MIN_SIZE bytes with the best coding the
+    client accepts (zstd, brotli, gzip).
+
+    Streaming responses (exports compress themselves) and responses that
+    already carry a Content-Encoding, such as the pre-compressed catalog,
+    are passed through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < _config("MIN_SIZE", 1024):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The body changed, so a strong validator no longer applies
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
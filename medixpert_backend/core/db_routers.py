@@ -0,0 +1,118 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .sharding import CATALOG_MODELS, SHARDED_MODELS, shard_aliases, shard_for_user
+
+# Set for the duration of a request that must see the primary only
+_use_primary = contextvars.ContextVar("use_primary", default=False)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def pin_to_primary():
+    """Route every read for the rest of the current request to the primary"""
+    _use_primary.set(True)
+
+
+def record_write(user_id):
+    """
+    Remember that a user just wrote, so their next reads see the write. This
+    lives in the shared cache: the next request may reach any worker.
+    """
+    if not replica_aliases():
+        return
+    cache.set(
+        f"primary-pin:{user_id}", True, getattr(settings, "REPLICA_STICKINESS", 5)
+    )
+
+
+def pin_if_recent_writer(user_id):
+    if replica_aliases() and cache.get(f"primary-pin:{user_id}"):
+        pin_to_primary()
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to "default" and reads to a random replica.
+
+    Reads stay on the primary for unsafe requests (see
+    ReplicaRoutingMiddleware) and for a short window after the requesting user
+    wrote, so users always read their own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or _use_primary.get():
+            return "default"
+        if model._meta.app_label == "django_cache":
+            # The database cache holds the stickiness itself
+            return "default"
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Follow relations on the database the instance came from
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {"default", *replica_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+
+class ShardRouter:
+    """
+    Place per-user rows (predictions, health records) on the user's shard.
+
+    Querysets are normally bound explicitly with core.sharding.user_queryset;
+    the router covers related-object access and relation checks, where the
+    instance being followed tells us the shard. It returns None for anything
+    it does not own so PrimaryReplicaRouter decides.
+    """
+
+    def _db_for_instance(self, model, hints):
+        if not shard_aliases():
+            return None
+        instance = hints.get("instance")
+        if instance is None:
+            return None
+        if instance._state.db in shard_aliases():
+            return instance._state.db
+        if model._meta.model_name in SHARDED_MODELS:
+            user_id = getattr(instance, "user_id", None)
+            if user_id is None and instance._meta.model_name == "user":
+                user_id = instance.pk
+            if user_id is not None:
+                return shard_for_user(user_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_instance(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_instance(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = shard_aliases()
+        if shards and (obj1._state.db in shards or obj2._state.db in shards):
+            # Users and the catalog are replicated to every shard
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in shard_aliases():
+            return None
+        if app_label in ("auth", "contenttypes"):
+            # Shards keep a copy of each user row as the foreign key target
+            return True
+        if app_label == "core" and model_name is not None:
+            return model_name in SHARDED_MODELS | CATALOG_MODELS
+        return False
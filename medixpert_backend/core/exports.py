@@ -0,0 +1,199 @@
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from . import catalog
+from .compression import negotiate
+
+CHUNK_SIZE = 1000
+
+PREDICTION_FIELDS = [
+    "id",
+    "timestamp",
+    "predicted_disease",
+    "severity",
+    "confidence_score",
+    "symptoms",
+    "additional_symptoms",
+    "notes",
+]
+
+HEALTH_RECORD_FIELDS = [
+    "id",
+    "prediction_id",
+    "predicted_disease",
+    "symptoms",
+    "status",
+    "doctor_notes",
+    "prescription",
+    "follow_up_date",
+    "created_at",
+    "updated_at",
+]
+
+
+def prediction_rows(queryset):
+    """Flat export rows; symptoms are prefetched once per iterator chunk"""
+    queryset = (
+        queryset.select_related("predicted_disease")
+        .prefetch_related("symptoms")
+        .order_by("pk")
+    )
+    for prediction in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            "id": prediction.pk,
+            "timestamp": prediction.timestamp,
+            "predicted_disease": prediction.predicted_disease.name,
+            "severity": prediction.predicted_disease.severity,
+            "confidence_score": prediction.confidence_score,
+            "symptoms": [s.name for s in prediction.symptoms.all()],
+            "additional_symptoms": prediction.additional_symptoms,
+            "notes": prediction.notes,
+        }
+
+
+def health_record_rows(queryset):
+    queryset = (
+        queryset.select_related("prediction__predicted_disease")
+        .prefetch_related("prediction__symptoms")
+        .order_by("pk")
+    )
+    for record in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            "id": record.pk,
+            "prediction_id": record.prediction_id,
+            "predicted_disease": record.prediction.predicted_disease.name,
+            "symptoms": [s.name for s in record.prediction.symptoms.all()],
+            "status": record.status,
+            "doctor_notes": record.doctor_notes,
+            "prescription": record.prescription,
+            "follow_up_date": record.follow_up_date,
+            "created_at": record.created_at,
+            "updated_at": record.updated_at,
+        }
+
+
+def _names(prediction):
+    """Disease and symptom names of an archived prediction, from the catalog"""
+    disease = catalog.disease_fragment(prediction.predicted_disease_id) or {}
+    symptoms = [catalog.symptom_fragment(s.pk) for s in prediction.symptoms.all()]
+    return disease, [symptom["name"] for symptom in symptoms if symptom]
+
+
+def archived_prediction_rows(predictions):
+    for prediction in predictions:
+        disease, symptoms = _names(prediction)
+        yield {
+            "id": prediction.pk,
+            "timestamp": prediction.timestamp,
+            "predicted_disease": disease.get("name"),
+            "severity": disease.get("severity"),
+            "confidence_score": prediction.confidence_score,
+            "symptoms": symptoms,
+            "additional_symptoms": prediction.additional_symptoms,
+            "notes": prediction.notes,
+        }
+
+
+def archived_health_record_rows(records):
+    for record in records:
+        disease, symptoms = _names(record.prediction)
+        yield {
+            "id": record.pk,
+            "prediction_id": record.prediction_id,
+            "predicted_disease": disease.get("name"),
+            "symptoms": symptoms,
+            "status": record.status,
+            "doctor_notes": record.doctor_notes,
+            "prescription": record.prescription,
+            "follow_up_date": record.follow_up_date,
+            "created_at": record.created_at,
+            "updated_at": record.updated_at,
+        }
+
+
+def _ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + "\n"
+
+
+def _csv(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    # The header goes out before the first query runs
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        if isinstance(row.get("symptoms"), list):
+            row["symptoms"] = ";".join(row["symptoms"])
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _batched(lines, size=100):
+    """
+    Join small lines so each yielded chunk is a reasonable network write. The
+    first line is sent on its own, so the client gets bytes straight away.
+    """
+    lines = iter(lines)
+    for line in lines:
+        yield line.encode()
+        break
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch).encode()
+            batch = []
+    if batch:
+        yield "".join(batch).encode()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+    for chunk in chunks:
+        # A sync flush sends each chunk now rather than once zlib's buffer fills
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def wants_gzip(request):
+    if request.query_params.get("compress") == "gzip":
+        return True
+    # Exports are gzipped as they stream, whatever else the client accepts
+    return negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""), ("gzip",)) == "gzip"
+
+
+def export_response(request, rows, fields, filename):
+    """
+    Stream rows as NDJSON (default) or CSV (?export_format=csv), gzipped on
+    the fly when the client accepts it.
+    """
+    export_format = request.query_params.get("export_format", "ndjson")
+    if export_format == "csv":
+        lines, content_type = _csv(rows, fields), "text/csv"
+    else:
+        export_format = "ndjson"
+        lines, content_type = _ndjson(rows), "application/x-ndjson"
+
+    chunks = _batched(lines)
+    compressed = wants_gzip(request)
+    if compressed:
+        chunks = _gzip(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    if compressed:
+        response["Content-Encoding"] = "gzip"
+    response["Vary"] = "Accept-Encoding"
+    return response
@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import json
+import time
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = "Idempotency-Key"
+
+
+def _config(name, default):
+    return getattr(settings, "IDEMPOTENCY", {}).get(name, default)
+
+
+def _request_hash(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}\n{payload}".encode()).hexdigest()
+
+
+def _replay(record):
+    response = Response(
+        json.loads(zlib.decompress(record.response_body)), status=record.status_code
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _claim(user_id, key, request_hash):
+    """Create the in-flight record; returns None if the key already exists"""
+    now = timezone.now()
+    try:
+        return IdempotencyRecord.objects.using("default").create(
+            user_id=user_id,
+            key=key,
+            request_hash=request_hash,
+            lock_token=uuid.uuid4().hex,
+            expires_at=now + timedelta(seconds=_config("TTL", 24 * 60 * 60)),
+        )
+    except IntegrityError:
+        return None
+
+
+def _existing(user_id, key):
+    return (
+        IdempotencyRecord.objects.using("default")
+        .filter(user_id=user_id, key=key)
+        .first()
+    )
+
+
+def _held(record):
+    """The record, as long as the request that created it still holds it"""
+    return IdempotencyRecord.objects.using("default").filter(
+        pk=record.pk, lock_token=record.lock_token
+    )
+
+
+def idempotent(view):
+    """
+    Honour the Idempotency-Key header on a view.
+
+    The first request with a key runs the view and stores its response
+    (compressed, for IDEMPOTENCY["TTL"] seconds). Retries with the same key
+    and body get that response back without running the view. Retries that
+    arrive while the first request is still running wait for it, up to
+    IDEMPOTENCY["WAIT"] seconds, then get 409 with Retry-After. Server errors
+    are not stored, so retrying them runs the view again.
+    """
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response(
+                {"error": f"{HEADER} must be at most 255 characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user_id = request.user.pk
+        request_hash = _request_hash(request)
+        deadline = time.monotonic() + _config("WAIT", 10)
+        delay = 0.02
+        while True:
+            record = _claim(user_id, key, request_hash)
+            if record is not None:
+                break
+            # None if deleted (expired or failed) since the claim; claim again
+            existing = _existing(user_id, key)
+            if existing is not None:
+                if existing.request_hash != request_hash:
+                    return Response(
+                        {"error": f"{HEADER} was already used for a different request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                now = timezone.now()
+                stale = existing.created_at + timedelta(
+                    seconds=_config("LOCK_TIMEOUT", 60)
+                )
+                if existing.expires_at <= now or (
+                    existing.status_code is None and stale <= now
+                ):
+                    # Expired, or the first request died without finishing
+                    _held(existing).delete()
+                elif existing.status_code is not None:
+                    return _replay(existing)
+            if time.monotonic() >= deadline:
+                response = Response(
+                    {"error": "A request with this key is still being processed"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+                response["Retry-After"] = "1"
+                return response
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            _held(record).delete()
+            raise
+
+        # If the record was taken over meanwhile, the response is not stored;
+        # the request that took it over stores its own
+        if response.status_code >= 500 or not hasattr(response, "data"):
+            _held(record).delete()
+        else:
+            _held(record).update(
+                status_code=response.status_code,
+                response_body=zlib.compress(JSONRenderer().render(response.data)),
+            )
+        return response
+
+    return wrapped
@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from . import catalog
+
+logger = logging.getLogger(__name__)
+
+_predictors = {}  # artifact path -> (mtime, DiseasePredictor)
+_load_lock = threading.Lock()
+
+
+def get_predictor(path=None):
+    """
+    The process-wide predictor for a model artifact, or None if it is missing.
+
+    The artifact is loaded once per process and reloaded when its mtime
+    changes, so a retrained model published in place is picked up without
+    a restart.
+    """
+    path = str(path or settings.MODEL_PATH)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    cached = _predictors.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _load_lock:
+        cached = _predictors.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        from ml_model import DiseasePredictor
+
+        predictor = DiseasePredictor()
+        if not predictor.load_model(path):
+            return None
+        _predictors[path] = (mtime, predictor)
+        return predictor
+
+
+# Shadow scoring runs on a single background thread with a bounded backlog;
+# when the backlog is full new work is dropped rather than queued, so a slow
+# candidate can never build up memory or delay live requests.
+_shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_shadow_slots = threading.BoundedSemaphore(getattr(settings, "SHADOW_BACKLOG", 100))
+
+
+def shadow_model_path():
+    return getattr(settings, "SHADOW_MODEL_PATH", None)
+
+
+def submit_shadow(prediction, symptoms):
+    """Score a committed live prediction with the shadow model, off-thread"""
+    if not shadow_model_path():
+        return
+    if not _shadow_slots.acquire(blocking=False):
+        return
+    job = (
+        prediction.pk,
+        prediction.user_id,
+        (catalog.disease_fragment(prediction.predicted_disease_id) or {}).get("name"),
+        prediction.confidence_score / 100,
+        list(symptoms),
+    )
+    try:
+        _shadow_executor.submit(_score_shadow, *job)
+    except RuntimeError:
+        # Executor shut down at interpreter exit
+        _shadow_slots.release()
+
+
+def _score_shadow(prediction_id, user_id, live_disease, live_confidence, symptoms):
+    from .models import ShadowDisagreement
+
+    try:
+        path = shadow_model_path()
+        candidate = get_predictor(path)
+        if candidate is None:
+            return
+        start = time.perf_counter()
+        disease, confidence = candidate.predict_many([symptoms])[0]
+        latency_ms = (time.perf_counter() - start) * 1000
+        if disease != live_disease:
+            ShadowDisagreement.objects.using("default").create(
+                prediction_id=prediction_id,
+                user_id=user_id,
+                model_path=path,
+                live_disease=live_disease,
+                live_confidence=live_confidence,
+                candidate_disease=disease or "",
+                candidate_confidence=confidence,
+                candidate_latency_ms=latency_ms,
+            )
+    except Exception:
+        logger.exception("Shadow scoring failed")
+    finally:
+        _shadow_slots.release()
+        connections.close_all()
@@ -0,0 +1,371 @@
+import csv
+import io
+import json
+import zlib
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .analytics import apply_deltas, count_predictions, rollup_mode
+from .models import IntakeChunk, IntakeJob, IntakeResult, Prediction
+from .sharding import shard_for_user, user_data_aliases
+
+REQUIRED_COLUMNS = ("username", "symptoms")
+
+RESULT_FIELDS = [
+    "row",
+    "username",
+    "status",
+    "prediction_id",
+    "predicted_disease",
+    "severity",
+    "confidence_score",
+    "error",
+]
+
+
+def _config(name, default):
+    return getattr(settings, "INTAKE", {}).get(name, default)
+
+
+def encode(data):
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+
+
+def decode(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+def _parse(row):
+    return {
+        "username": (row.get("username") or "").strip(),
+        # Same separator as the CSV exports
+        "symptoms": [
+            name.strip()
+            for name in (row.get("symptoms") or "").split(";")
+            if name.strip()
+        ],
+        "additional_symptoms": row.get("additional_symptoms") or "",
+        "notes": row.get("notes") or "",
+    }
+
+
+def create_job(owner, upload, filename=""):
+    """
+    Split an uploaded CSV (username, symptoms, and optionally
+    additional_symptoms and notes) into chunks and queue it for the intake
+    workers. Raises ValueError for a file that cannot be queued.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""))
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+
+    chunk_size = _config("CHUNK_SIZE", 1000)
+    max_rows = _config("MAX_ROWS", 500000)
+    # Chunks are inserted outside one long transaction; workers only claim
+    # chunks of queued jobs, so a partly uploaded job is never screened
+    job = IntakeJob.objects.using("default").create(owner=owner, filename=filename)
+    total = index = 0
+    try:
+        while True:
+            chunks = []
+            for _ in range(20):
+                rows = [_parse(row) for row in islice(reader, chunk_size)]
+                if not rows:
+                    break
+                chunks.append(
+                    IntakeChunk(
+                        job=job,
+                        index=index,
+                        first_row=total,
+                        row_count=len(rows),
+                        rows=encode(rows),
+                    )
+                )
+                index += 1
+                total += len(rows)
+            if total > max_rows:
+                raise ValueError(f"At most {max_rows} rows per intake job")
+            if not chunks:
+                break
+            IntakeChunk.objects.using("default").bulk_create(chunks)
+    except (ValueError, csv.Error, UnicodeDecodeError) as exc:
+        job.delete()
+        raise ValueError(str(exc)) from exc
+    if not total:
+        job.delete()
+        raise ValueError("The file has no rows")
+
+    job.status = "queued"
+    job.total_rows = total
+    job.save(update_fields=["status", "total_rows"])
+    return job
+
+
+def _claimable(now, kinds):
+    chunks = (
+        IntakeChunk.objects.using("default")
+        .filter(status="pending", job__status__in=("queued", "running"))
+        .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+        .order_by("job_id", "index")
+    )
+    return chunks.filter(job__kind__in=kinds) if kinds is not None else chunks
+
+
+def claim_chunk(worker, lease_seconds=None, kinds=None):
+    """
+    Lease the oldest pending chunk (of jobs of the given kinds, default any)
+    to a worker, or None if there is none
+    """
+    if lease_seconds is None:
+        lease_seconds = _config("LEASE_SECONDS", 300)
+    now = timezone.now()
+    # The UPDATE repeats the claimable condition, so of two workers reading
+    # the same candidate only one gets it; the other tries the next one
+    for _ in range(5):
+        candidate = _claimable(now, kinds).values_list("pk", flat=True).first()
+        if candidate is None:
+            return None
+        claimed = (
+            _claimable(now, kinds)
+            .filter(pk=candidate)
+            .update(
+                worker=worker,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=F("attempts") + 1,
+            )
+        )
+        if claimed:
+            chunk = IntakeChunk.objects.using("default").get(pk=candidate)
+            IntakeJob.objects.using("default").filter(
+                pk=chunk.job_id, status="queued"
+            ).update(status="running", started_at=now)
+            return chunk
+    return None
+
+
+def _commit(chunk, alias, entries):
+    """
+    Insert one alias's predictions with their IntakeResult in a single
+    transaction. Returns False if an earlier attempt already committed them.
+    """
+    results = IntakeResult.objects.using(alias)
+    if results.filter(chunk_id=chunk.pk).exists():
+        return False
+    through = Prediction.symptoms.through
+    try:
+        with transaction.atomic(using=alias):
+            screened = [entry for entry in entries if entry[1] is not None]
+            predictions = Prediction.objects.using(alias).bulk_create(
+                [prediction for _, prediction, _ in screened]
+            )
+            through.objects.using(alias).bulk_create(
+                [
+                    through(prediction_id=prediction.pk, symptom_id=symptom_id)
+                    for prediction, (_, _, symptom_ids) in zip(predictions, screened)
+                    for symptom_id in symptom_ids
+                ]
+            )
+            for prediction, (result, _, _) in zip(predictions, screened):
+                result["prediction_id"] = prediction.pk
+            results.create(
+                chunk_id=chunk.pk,
+                job_id=chunk.job_id,
+                results=encode([result for result, _, _ in entries]),
+            )
+            if rollup_mode() == "incremental" and predictions:
+                # bulk_create sends no post_save, so count them here
+                rows = [
+                    (p.timestamp, p.predicted_disease_id, p.user_id)
+                    for p in predictions
+                ]
+                transaction.on_commit(
+                    lambda: apply_deltas(count_predictions(rows)), using=alias
+                )
+    except IntegrityError:
+        # A worker whose lease on this chunk ran out committed it meanwhile
+        if results.filter(chunk_id=chunk.pk).exists():
+            return False
+        raise
+    return True
+
+
+def screen_chunk(chunk, predictor):
+    """
+    Predict every row of a chunk in one batch and store the predictions on
+    each patient's database. Rows whose patient is unknown are recorded on
+    the chunk itself.
+    """
+    from . import snapshot
+
+    rows = decode(chunk.rows)
+    catalog_snapshot = snapshot.current()
+    users = dict(
+        User.objects.using("default")
+        .filter(username__in={row["username"] for row in rows})
+        .values_list("username", "pk")
+    )
+    known = [(i, row) for i, row in enumerate(rows) if row["username"] in users]
+    outcomes = predictor.predict_many([row["symptoms"] for _, row in known])
+
+    by_alias = {}
+    for (i, row), (disease, confidence) in zip(known, outcomes):
+        user_id = users[row["username"]]
+        result = {"row": chunk.first_row + i, "username": row["username"]}
+        prediction = symptom_ids = None
+        disease_row = catalog_snapshot.disease_row(disease)
+        if disease_row is None:
+            result["status"] = "no_prediction"
+        else:
+            result.update(
+                status="created",
+                predicted_disease=disease,
+                severity=catalog_snapshot.disease_severity(disease_row),
+                confidence_score=confidence * 100,  # Convert to percentage
+            )
+            prediction = Prediction(
+                user_id=user_id,
+                predicted_disease_id=int(catalog_snapshot.disease_ids[disease_row]),
+                confidence_score=confidence * 100,
+                additional_symptoms=row["additional_symptoms"],
+                notes=row["notes"],
+            )
+            symptom_ids = catalog_snapshot.symptom_ids_for(row["symptoms"])
+        alias = shard_for_user(user_id) or "default"
+        by_alias.setdefault(alias, []).append((result, prediction, symptom_ids))
+
+    for alias, entries in by_alias.items():
+        _commit(chunk, alias, entries)
+
+    unplaced = [
+        {
+            "row": chunk.first_row + i,
+            "username": row["username"],
+            "status": "unknown_patient",
+        }
+        for i, row in enumerate(rows)
+        if row["username"] not in users
+    ]
+    finish_chunk(chunk, "done", unplaced)
+
+
+def process_chunk(chunk, predictor, pool=None):
+    """
+    Process a claimed chunk, giving up on it after MAX_ATTEMPTS claims.
+    Provisioning chunks hash their passwords in pool (a
+    provisioning.hashing_pool()) if given.
+    """
+    if chunk.attempts > _config("MAX_ATTEMPTS", 3):
+        finish_chunk(chunk, "failed", [])
+        return
+    try:
+        if chunk.job.kind == "provisioning":
+            from .provisioning import provision_chunk
+
+            provision_chunk(chunk, pool)
+        else:
+            screen_chunk(chunk, predictor)
+    except Exception:
+        # Hand it back now rather than when the lease runs out
+        IntakeChunk.objects.using("default").filter(
+            pk=chunk.pk, status="pending", worker=chunk.worker
+        ).update(lease_expires_at=None)
+        raise
+
+
+def result_aliases(job):
+    """Databases holding the IntakeResults of a job's chunks"""
+    # Provisioning results are committed with the accounts, on "default"
+    return ["default"] if job.kind == "provisioning" else user_data_aliases()
+
+
+def chunk_results(chunk_ids, aliases):
+    """Results stored on the given databases, by chunk id"""
+    found = {}
+    for alias in aliases:
+        for chunk_id, payload in (
+            IntakeResult.objects.using(alias)
+            .filter(chunk_id__in=chunk_ids)
+            .values_list("chunk_id", "results")
+        ):
+            found.setdefault(chunk_id, []).extend(decode(payload))
+    return found
+
+
+def finish_chunk(chunk, status, unplaced, error="Processing failed repeatedly"):
+    """
+    Mark a chunk done or failed and add its rows to the job's progress. The
+    rows of a failed chunk without a result get error.
+    """
+    placed = chunk_results([chunk.pk], result_aliases(chunk.job)).get(chunk.pk, [])
+    if status == "failed":
+        # Rows not committed anywhere before the chunk gave up
+        covered = {result["row"] for result in placed}
+        unplaced = [
+            {
+                "row": chunk.first_row + i,
+                # Provisioning rows are kept as posted, even if not objects
+                "username": row.get("username") if isinstance(row, dict) else None,
+                "status": "error",
+                "error": error,
+            }
+            for i, row in enumerate(decode(chunk.rows))
+            if chunk.first_row + i not in covered
+        ]
+    created = sum(result["status"] == "created" for result in placed)
+    now = timezone.now()
+    with transaction.atomic(using="default"):
+        finished = (
+            IntakeChunk.objects.using("default")
+            .filter(pk=chunk.pk, status="pending")
+            .update(
+                status=status,
+                unplaced_results=encode(unplaced),
+                secrets=None,
+                lease_expires_at=None,
+                processed_at=now,
+            )
+        )
+        if not finished:
+            return
+        IntakeJob.objects.using("default").filter(pk=chunk.job_id).update(
+            processed_rows=F("processed_rows") + chunk.row_count,
+            created_predictions=F("created_predictions") + created,
+            failed_rows=F("failed_rows") + chunk.row_count - created,
+        )
+    if (
+        not IntakeChunk.objects.using("default")
+        .filter(job_id=chunk.job_id, status="pending")
+        .exists()
+    ):
+        # A job can also be failed before any chunk was claimed
+        IntakeJob.objects.using("default").filter(
+            pk=chunk.job_id, status__in=("queued", "running")
+        ).update(status="completed", finished_at=now)
+
+
+def result_rows(job, fields=RESULT_FIELDS, batch_size=50):
+    """Per-row results of the job's finished chunks, in upload order"""
+    chunks = (
+        IntakeChunk.objects.using("default")
+        .filter(job=job, status__in=("done", "failed"))
+        .order_by("index")
+        .values_list("pk", "index", "unplaced_results")
+    )
+    last_index = -1
+    while True:
+        batch = list(chunks.filter(index__gt=last_index)[:batch_size])
+        if not batch:
+            return
+        placed = chunk_results([pk for pk, _, _ in batch], result_aliases(job))
+        for pk, _, unplaced in batch:
+            results = placed.get(pk, []) + decode(unplaced)
+            for result in sorted(results, key=lambda result: result["row"]):
+                yield {field: result.get(field) for field in fields}
+        last_index = batch[-1][1]
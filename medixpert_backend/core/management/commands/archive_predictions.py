@@ -0,0 +1,61 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from core.archive import archive_old_predictions, hot_cutoff
+from core.models import PredictionArchiveSegment
+from core.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old predictions and their health records into compressed "
+        "per-user monthly archive segments, in short batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            help="archive predictions older than this (default: ARCHIVE AFTER_DAYS)",
+        )
+        parser.add_argument("--batch-size", type=int, help="predictions per batch")
+        parser.add_argument("--pause", type=float, help="seconds between batches")
+        parser.add_argument(
+            "--loop", action="store_true", help="keep archiving as a worker"
+        )
+        parser.add_argument("--interval", type=int, default=3600, help="seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            if options["older_than_days"] is not None:
+                cutoff = timezone.now() - timedelta(days=options["older_than_days"])
+            else:
+                cutoff = hot_cutoff()
+            for alias in user_data_aliases():
+                started = time.perf_counter()
+                totals = archive_old_predictions(
+                    alias,
+                    cutoff,
+                    batch_size=options["batch_size"],
+                    pause=options["pause"],
+                )
+                size = PredictionArchiveSegment.objects.using(alias).aggregate(
+                    predictions=Sum("prediction_count"),
+                    payload=Sum(Length("payload")),
+                )
+                self.stdout.write(
+                    f"{alias}: archived {totals['predictions']} predictions and "
+                    f"{totals['health_records']} health records older than "
+                    f"{cutoff:%Y-%m-%d} in {totals['batches']} batches "
+                    f"({time.perf_counter() - started:.1f}s); archive holds "
+                    f"{size['predictions'] or 0} predictions in "
+                    f"{(size['payload'] or 0) / 1024:.0f} KiB"
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
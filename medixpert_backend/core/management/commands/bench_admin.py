@@ -0,0 +1,168 @@
+import random
+import time
+import types
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+
+from core.models import Disease, HealthRecord, Prediction, Symptom
+from core.sharding import user_manager
+
+STATUSES = ["pending", "reviewed", "treated", "follow_up"]
+
+
+def naive_urlconf():
+    """The admin as a plain registration would build it"""
+    site = admin.AdminSite(name="admin")
+    site.register(User)
+    site.register(Prediction)
+    site.register(HealthRecord)
+    urlconf = types.ModuleType("naive_admin_urls")
+    urlconf.urlpatterns = [path("admin/", site.urls)]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        "Time admin changelists for predictions and health records against a "
+        "plain ModelAdmin registration. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--years", type=int, default=3)
+
+    def seed(self, patient, rows, years):
+        rng = random.Random(0)
+        diseases = list(Disease.objects.values_list("pk", flat=True))
+        symptoms = list(Symptom.objects.values_list("pk", flat=True))
+        now = timezone.now()
+        manager = user_manager(Prediction, patient)
+        alias = manager.db
+        through = Prediction.symptoms.through
+        timestamp = Prediction._meta.get_field("timestamp")
+        # Let bulk_create keep the spread-out timestamps
+        timestamp.auto_now_add = False
+        try:
+            for offset in range(0, rows, 10000):
+                predictions = Prediction.objects.using(alias).bulk_create(
+                    [
+                        Prediction(
+                            user=patient,
+                            predicted_disease_id=rng.choice(diseases),
+                            confidence_score=rng.random(),
+                            timestamp=now
+                            - timedelta(seconds=rng.randint(0, years * 365 * 86400)),
+                        )
+                        for _ in range(min(10000, rows - offset))
+                    ]
+                )
+                through.objects.using(alias).bulk_create(
+                    [
+                        through(prediction_id=p.pk, symptom_id=s)
+                        for p in predictions
+                        for s in rng.sample(symptoms, 2)
+                    ]
+                )
+                HealthRecord.objects.using(alias).bulk_create(
+                    [
+                        HealthRecord(
+                            user=patient, prediction=p, status=rng.choice(STATUSES)
+                        )
+                        for p in predictions[::3]
+                    ]
+                )
+        finally:
+            timestamp.auto_now_add = True
+        with connections[alias].cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return alias
+
+    def measure(self, client, url, label, alias):
+        with CaptureQueriesContext(connections["default"]) as default:
+            with CaptureQueriesContext(connections[alias]) as shard:
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - started
+        assert response.status_code == 200, (url, response.status_code)
+        queries = len(default) + (len(shard) if alias != "default" else 0)
+        self.stdout.write(
+            f"  {label:<34} {elapsed * 1000:8.0f} ms {queries:5d} queries"
+        )
+
+    def handle(self, *args, **options):
+        patient, _ = User.objects.get_or_create(username="bench_admin_patient")
+        staff, _ = User.objects.get_or_create(
+            username="bench_admin_staff",
+            defaults={"is_staff": True, "is_superuser": True},
+        )
+        started = time.perf_counter()
+        alias = self.seed(patient, options["rows"], options["years"])
+        self.stdout.write(
+            f"seeded {options['rows']} predictions on {alias} in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+        year = timezone.localdate().year - 1
+        pages = [
+            ("/admin/core/prediction/", "predictions"),
+            (
+                f"/admin/core/prediction/?timestamp__year={year}",
+                "predictions, one year",
+            ),
+            ("/admin/core/healthrecord/", "health records"),
+            (
+                "/admin/core/healthrecord/?status__exact=pending",
+                "health records, pending",
+            ),
+        ]
+        client = Client(SERVER_NAME="localhost")
+        client.force_login(staff)
+        try:
+            for name, urlconf in (
+                ("plain ModelAdmin", naive_urlconf()),
+                ("core.admin", None),
+            ):
+                self.stdout.write(name)
+                settings = {"ROOT_URLCONF": urlconf} if urlconf else {}
+                with override_settings(**settings):
+                    for url, label in pages:
+                        client.get(url)  # warm templates and caches
+                        self.measure(client, url, label, alias)
+
+            pending = HealthRecord.objects.using(alias).filter(
+                user=patient, status="pending"
+            )
+            count = pending.count()
+            started = time.perf_counter()
+            response = client.post(
+                "/admin/core/healthrecord/?status__exact=pending",
+                {
+                    "action": "mark_reviewed",
+                    "select_across": "1",
+                    "index": "0",
+                    "_selected_action": [pending.values_list("pk", flat=True)[0]],
+                },
+            )
+            elapsed = time.perf_counter() - started
+            left = pending.count()
+            self.stdout.write(
+                f"mark {count} pending records reviewed (select all): "
+                f"{elapsed:.2f}s, status {response.status_code}, {left} left pending"
+            )
+        finally:
+            through = Prediction.symptoms.through
+            ids = Prediction.objects.using(alias).filter(user=patient)
+            HealthRecord.objects.using(alias).filter(user=patient)._raw_delete(alias)
+            through.objects.using(alias).filter(prediction__in=ids)._raw_delete(alias)
+            ids._raw_delete(alias)
+            patient.delete()
+            staff.delete()
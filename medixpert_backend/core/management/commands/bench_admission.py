@@ -0,0 +1,164 @@
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.authentication import get_tokens_for_user
+from core.models import Prediction
+from core.sharding import user_queryset
+
+SYMPTOMS = ["fever", "cough", "fatigue", "headache"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test /api/predict/ on a local server: well-behaved users at a "
+        "steady pace while one abusive user floods it, with admission control "
+        "off and on. Run against a scratch database (MEDIXPERT_DB_NAME); the "
+        "predictions are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=8)
+        parser.add_argument("--interval", type=float, default=2.5)
+        parser.add_argument("--abusers", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=15)
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        users = [
+            User.objects.get_or_create(username=f"bench_admission_{i}")[0]
+            for i in range(options["users"])
+        ]
+        abuser = User.objects.get_or_create(username="bench_admission_abuser")[0]
+        tokens = {
+            user.pk: str(get_tokens_for_user(user).access_token)
+            for user in [*users, abuser]
+        }
+
+        phases = [
+            ("baseline", 0, "on"),
+            ("abuse, no limits", options["abusers"], "off"),
+            ("abuse, limits on", options["abusers"], "on"),
+        ]
+        try:
+            for name, abusers, admission_control in phases:
+                with self.server(options["port"], admission_control):
+                    good, bad = self.run_phase(users, abuser, tokens, abusers, options)
+                good_ms = sorted(ms for ms, _ in good)
+                self.stdout.write(
+                    f"{name:<18} well-behaved p50 {statistics.median(good_ms):6.1f} ms"
+                    f"  p95 {good_ms[int(len(good_ms) * 0.95) - 1]:6.1f} ms"
+                    f"  max {good_ms[-1]:6.1f} ms"
+                    f"  statuses {dict(Counter(code for _, code in good))}"
+                    f"  abuser statuses {dict(bad)}"
+                )
+        finally:
+            for user in [*users, abuser]:
+                user_queryset(Prediction, user).delete()
+
+    def server(self, port, admission_control):
+        command = self
+
+        class Server:
+            def __enter__(self):
+                env = {
+                    **os.environ,
+                    "MEDIXPERT_ADMISSION_CONTROL": admission_control,
+                    "MEDIXPERT_WARMUP": "background",
+                }
+                self.process = subprocess.Popen(
+                    [sys.executable, "manage.py", "runserver", "--noreload", str(port)],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                # Wait for warm-up so cold starts don't skew the phase
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    try:
+                        if command.request(port, "GET", "/api/health/ready/")[0] == 200:
+                            return self
+                    except OSError:
+                        pass
+                    time.sleep(0.2)
+                self.process.terminate()
+                raise CommandError("Server did not become ready")
+
+            def __exit__(self, *exc_info):
+                self.process.terminate()
+                self.process.wait()
+
+        return Server()
+
+    def request(self, port, method, path, body=None, token=None, source="127.0.0.1"):
+        connection = http.client.HTTPConnection(
+            "127.0.0.1", port, timeout=30, source_address=(source, 0)
+        )
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        try:
+            connection.request(
+                method, path, json.dumps(body) if body else None, headers
+            )
+            response = connection.getresponse()
+            response.read()
+            return response.status, response.getheader("Retry-After")
+        finally:
+            connection.close()
+
+    def run_phase(self, users, abuser, tokens, abusers, options):
+        port = options["port"]
+        stop = time.monotonic() + options["duration"]
+        good = []
+        bad = Counter()
+
+        def behave(index, user):
+            # Spread the users over the interval
+            time.sleep(options["interval"] * index / len(users))
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                status, _ = self.request(
+                    port,
+                    "POST",
+                    "/api/predict/",
+                    {"symptoms": SYMPTOMS[: 2 + index % 3]},
+                    tokens[user.pk],
+                    f"127.0.1.{index + 1}",
+                )
+                good.append(((time.perf_counter() - start) * 1000, status))
+                time.sleep(max(0, options["interval"] - (time.perf_counter() - start)))
+
+        def abuse():
+            while time.monotonic() < stop:
+                status, _ = self.request(
+                    port,
+                    "POST",
+                    "/api/predict/",
+                    {"symptoms": SYMPTOMS},
+                    tokens[abuser.pk],
+                    "127.0.2.1",
+                )
+                bad[status] += 1
+
+        threads = [
+            threading.Thread(target=behave, args=(i, user))
+            for i, user in enumerate(users)
+        ]
+        threads += [threading.Thread(target=abuse) for _ in range(abusers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return good, bad
@@ -0,0 +1,76 @@
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+
+from ml_model import BACKENDS, DiseasePredictor
+
+
+class Command(BaseCommand):
+    help = (
+        "Train every model backend on the same catalog split and compare "
+        "accuracy, training time, artifact size and prediction latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", action="append", choices=sorted(BACKENDS))
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Same augmented data and split for every backend
+        np.random.seed(options["seed"])
+        X, y = DiseasePredictor().prepare_data()
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.3, random_state=options["seed"]
+        )
+        rng = np.random.default_rng(options["seed"])
+        batch = X_test[rng.integers(len(X_test), size=options["batch_size"])]
+
+        self.stdout.write(
+            f"{len(X_train)} training rows, {len(X_test)} test rows, "
+            f"{X.shape[1]} symptoms, {len(set(y))} diseases"
+        )
+        self.stdout.write(
+            f"{'backend':<14}{'accuracy':>9}{'train s':>9}{'size KB':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'rows/s':>11}"
+        )
+        for backend in options["backend"] or list(BACKENDS):
+            predictor = DiseasePredictor(backend)
+            predictor.symptom_names = [str(i) for i in range(X.shape[1])]
+            predictor.fit(X_train, y_train)
+            accuracy = accuracy_score(y_test, predictor.model.predict(X_test))
+
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "model.pkl")
+                predictor.save_model(path)
+                size_kb = os.path.getsize(path) / 1024
+                # Time the loaded artifact, as served
+                predictor = DiseasePredictor()
+                predictor.load_model(path)
+
+            # Single-request latency including the explanation contributions
+            latencies = []
+            for i in range(options["requests"]):
+                row = X_test[i % len(X_test)][None, :]
+                start = time.perf_counter()
+                predictor.predict_batch(row)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+
+            start = time.perf_counter()
+            predictor.predict_batch(batch)
+            rows_per_second = len(batch) / (time.perf_counter() - start)
+
+            self.stdout.write(
+                f"{backend:<14}{accuracy:>9.3f}{predictor.training_seconds or 0:>9.3f}"
+                f"{size_kb:>9.1f}{statistics.median(latencies):>9.3f}"
+                f"{latencies[int(len(latencies) * 0.95) - 1]:>9.3f}"
+                f"{rows_per_second:>11.0f}"
+            )
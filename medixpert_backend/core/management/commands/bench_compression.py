@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from core import catalog
+from core.compression import available_encodings, compress
+from core.models import Disease, HealthRecord, Prediction, Symptom
+from core.sharding import user_manager
+
+ENDPOINTS = [
+    "/api/symptoms/",
+    "/api/diseases/",
+    "/api/predictions/",
+    "/api/health-records/",
+    "/api/dashboard/",
+]
+CATALOG_ENDPOINTS = {"/api/symptoms/", "/api/diseases/"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Report bytes on the wire and CPU time per request for each content "
+        "coding on the main API endpoints. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic patient is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--predictions", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def seed(self, patient, count):
+        rng = random.Random(0)
+        diseases = list(Disease.objects.all())
+        symptoms = list(Symptom.objects.all())
+        for _ in range(count):
+            prediction = user_manager(Prediction, patient).create(
+                user=patient,
+                predicted_disease=rng.choice(diseases),
+                confidence_score=rng.random(),
+            )
+            prediction.symptoms.set(rng.sample(symptoms, 4))
+            user_manager(HealthRecord, patient).create(
+                user=patient, prediction=prediction
+            )
+
+    def measure(self, client, url, encoding, repeat):
+        """(response, median CPU ms of the whole request)"""
+        header = {"HTTP_ACCEPT_ENCODING": encoding} if encoding else {}
+        client.get(url, **header)  # warm caches
+        cpu = []
+        for _ in range(repeat):
+            started = time.process_time()
+            response = client.get(url, **header)
+            cpu.append(time.process_time() - started)
+        assert response.status_code == 200, (url, response.status_code)
+        assert response.get("Content-Encoding") == encoding, (url, encoding)
+        return response, statistics.median(cpu) * 1000
+
+    def compression_ms(self, body, encoding, repeat):
+        started = time.process_time()
+        for _ in range(repeat):
+            compress(body, encoding)
+        return (time.process_time() - started) / repeat * 1000
+
+    def handle(self, *args, **options):
+        patient, _ = User.objects.get_or_create(username="bench_compression_patient")
+        self.seed(patient, options["predictions"])
+        client = APIClient(SERVER_NAME="localhost")
+        client.force_authenticate(patient)
+        encodings = [None, *available_encodings()]
+        try:
+            self.stdout.write(
+                f"{'endpoint':<22}{'coding':>9}{'bytes':>9}{'ratio':>7}"
+                f"{'request ms':>12}{'compress ms':>13}"
+            )
+            for url in ENDPOINTS:
+                identity = None
+                for encoding in encodings:
+                    response, cpu = self.measure(
+                        client, url, encoding, options["repeat"]
+                    )
+                    if identity is None:
+                        identity = response.content
+                        spent = "-"
+                    elif url in CATALOG_ENDPOINTS:
+                        spent = "cached"
+                    else:
+                        ms = self.compression_ms(identity, encoding, options["repeat"])
+                        spent = f"{ms:.2f}"
+                    self.stdout.write(
+                        f"{url:<22}{encoding or 'identity':>9}"
+                        f"{len(response.content):>9}"
+                        f"{len(identity) / len(response.content):>7.1f}"
+                        f"{cpu:>12.2f}{spent:>13}"
+                    )
+
+            self.stdout.write("catalog bodies if compressed per request instead:")
+            for kind in ("symptoms", "diseases"):
+                raw = catalog.encoded_list(kind)
+                for encoding in encodings[1:]:
+                    size = len(compress(raw, encoding))
+                    ms = self.compression_ms(raw, encoding, options["repeat"])
+                    self.stdout.write(
+                        f"  /api/{kind + '/':<16}{encoding:>9}{size:>9}"
+                        f"{len(raw) / size:>7.1f}{'':>12}{ms:>13.2f}"
+                    )
+        finally:
+            patient.delete()
@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request throughput on mixed predict/dashboard traffic for the "
+        "development and production database profiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=50, help="per thread")
+        parser.add_argument(
+            "--predict-ratio",
+            type=float,
+            default=0.3,
+            help="fraction of requests that are predictions (writes)",
+        )
+        parser.add_argument(
+            "--profiles", default="development,production", help="comma separated"
+        )
+        # Internal: run one profile in this process and print JSON results
+        parser.add_argument("--worker", action="store_true", help="internal")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            self.stdout.write(json.dumps(self.run_workload(options)))
+            return
+
+        results = {}
+        for profile in options["profiles"].split(","):
+            results[profile] = self.run_profile(profile, options)
+
+        self.stdout.write(
+            f"{'profile':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+        )
+        for profile, stats in results.items():
+            self.stdout.write(
+                f"{profile:<14}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['errors']:>8}"
+            )
+
+    def run_profile(self, profile, options):
+        """Run the workload in a fresh process against a copy of the database"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db_name = os.path.join(tmp, "bench.sqlite3")
+            shutil.copy(settings.DATABASES["default"]["NAME"], db_name)
+            env = dict(
+                os.environ, MEDIXPERT_DB_PROFILE=profile, MEDIXPERT_DB_NAME=db_name
+            )
+            cmd = [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, "manage.py"),
+                "bench_db",
+                "--worker",
+                f"--threads={options['threads']}",
+                f"--requests={options['requests']}",
+                f"--predict-ratio={options['predict_ratio']}",
+            ]
+            output = subprocess.run(
+                cmd, env=env, check=True, capture_output=True, text=True
+            ).stdout
+        # Views print debug output; the results are the last line
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run_workload(self, options):
+        from django.contrib.auth.models import User
+
+        from core.authentication import get_tokens_for_user
+        from core.models import Symptom
+
+        call_command("migrate", verbosity=0)
+        symptoms = list(Symptom.objects.values_list("name", flat=True)[:5])
+        tokens = []
+        for i in range(options["threads"]):
+            user, _ = User.objects.get_or_create(username=f"bench_db_{i}")
+            tokens.append(str(get_tokens_for_user(user).access_token))
+        connections.close_all()
+
+        latencies = []
+        errors = []
+        every = max(1, round(1 / options["predict_ratio"]))
+
+        def worker(token):
+            client = Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Bearer {token}")
+            for i in range(options["requests"]):
+                start = time.perf_counter()
+                if i % every == 0:
+                    response = client.post(
+                        "/api/predict/",
+                        {"symptoms": symptoms},
+                        content_type="application/json",
+                    )
+                else:
+                    response = client.get("/api/dashboard/")
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in tokens]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "errors": len(errors),
+        }
@@ -0,0 +1,96 @@
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from core.authentication import get_tokens_for_user
+from core.models import IdempotencyRecord, Prediction
+from core.sharding import user_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent retries of POST /api/predict/ with one Idempotency-Key "
+        "and check that each key creates exactly one prediction and every retry "
+        "gets the same response. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--retries", type=int, default=8)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username="bench_idempotency_patient")
+        token = str(get_tokens_for_user(user).access_token)
+        before = user_queryset(Prediction, user).count()
+        connections.close_all()
+
+        statuses = Counter()
+        mismatches = 0
+        start = time.perf_counter()
+        # Rate limits would reject the retries before they reach the key check
+        with override_settings(THROTTLE_RATES={}):
+            for _ in range(options["rounds"]):
+                key = str(uuid.uuid4())
+                bodies = []
+
+                def retry():
+                    client = Client(
+                        raise_request_exception=False,
+                        HTTP_HOST="localhost",
+                        HTTP_AUTHORIZATION=f"Bearer {token}",
+                        HTTP_IDEMPOTENCY_KEY=key,
+                    )
+                    response = client.post(
+                        "/api/predict/",
+                        {"symptoms": ["fever", "cough", "fatigue"]},
+                        content_type="application/json",
+                    )
+                    statuses[
+                        (response.status_code, response.get("Idempotent-Replayed"))
+                    ] += 1
+                    bodies.append(response.content)
+                    connections.close_all()
+
+                threads = [
+                    threading.Thread(target=retry) for _ in range(options["retries"])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                mismatches += len(set(bodies)) != 1
+
+            reuse = Client(
+                HTTP_HOST="localhost",
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+                HTTP_IDEMPOTENCY_KEY=key,
+            ).post(
+                "/api/predict/",
+                {"symptoms": ["headache"]},
+                content_type="application/json",
+            )
+        elapsed = time.perf_counter() - start
+
+        created = user_queryset(Prediction, user).count() - before
+        self.stdout.write(
+            f"{options['rounds']} keys x {options['retries']} concurrent retries "
+            f"in {elapsed:.1f}s"
+        )
+        self.stdout.write(f"responses (status, replayed): {dict(statuses)}")
+        self.stdout.write(f"predictions created: {created}")
+        self.stdout.write(f"keys with differing responses: {mismatches}")
+        self.stdout.write(f"key reused with another body: {reuse.status_code}")
+
+        user_queryset(Prediction, user).delete()
+        IdempotencyRecord.objects.filter(user_id=user.pk).delete()
+        if created != options["rounds"] or mismatches or reuse.status_code != 422:
+            raise CommandError("Idempotency check failed")
+        self.stdout.write(self.style.SUCCESS("Each key created exactly one prediction"))
@@ -0,0 +1,105 @@
+import csv
+import io
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from core.models import IntakeChunk, IntakeJob, IntakeResult, Prediction, Symptom
+from core.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare screening intake forms one POST /api/predict/ at a time with "
+        "intake jobs processed by 1..N workers. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000)
+        parser.add_argument("--patients", type=int, default=200)
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+        parser.add_argument(
+            "--single", type=int, default=200, help="rows posted one at a time"
+        )
+
+    def upload(self, client, patients, rows):
+        rng = random.Random(0)
+        names = list(Symptom.objects.values_list("name", flat=True))
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["username", "symptoms"])
+        for _ in range(rows):
+            writer.writerow(
+                [rng.choice(patients).username, ";".join(rng.sample(names, 3))]
+            )
+        started = time.perf_counter()
+        response = client.post(
+            "/api/intake-jobs/",
+            {"file": SimpleUploadedFile("bench.csv", buffer.getvalue().encode())},
+            format="multipart",
+        )
+        assert response.status_code == 202, response.content
+        return response.json()["id"], time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        staff, _ = User.objects.get_or_create(
+            username="bench_intake_staff", defaults={"is_staff": True}
+        )
+        patients = [
+            User.objects.get_or_create(username=f"bench_intake_patient_{i}")[0]
+            for i in range(options["patients"])
+        ]
+        client = APIClient(SERVER_NAME="localhost")
+        try:
+            names = list(Symptom.objects.values_list("name", flat=True))
+            rng = random.Random(1)
+            patient_client = APIClient(SERVER_NAME="localhost")
+            patient_client.force_authenticate(patients[0])
+            started = time.perf_counter()
+            for _ in range(options["single"]):
+                response = patient_client.post(
+                    "/api/predict/", {"symptoms": rng.sample(names, 3)}, format="json"
+                )
+                assert response.status_code == 200, response.content
+            rate = options["single"] / (time.perf_counter() - started)
+            self.stdout.write(f"one request per row: {rate:8.0f} rows/s")
+
+            client.force_authenticate(staff)
+            for workers in options["workers"]:
+                job_id, upload_seconds = self.upload(client, patients, options["rows"])
+                started = time.perf_counter()
+                call_command(
+                    "process_intake_jobs", workers=workers, stdout=io.StringIO()
+                )
+                elapsed = time.perf_counter() - started
+                job = IntakeJob.objects.get(pk=job_id)
+                assert job.status == "completed", job.status
+                self.stdout.write(
+                    f"intake job, {workers} worker(s): "
+                    f"{job.total_rows / elapsed:8.0f} rows/s "
+                    f"(upload {upload_seconds:.1f}s, "
+                    f"{job.created_predictions} predictions)"
+                )
+        finally:
+            jobs = IntakeJob.objects.filter(owner=staff)
+            chunk_ids = list(
+                IntakeChunk.objects.filter(job__in=jobs).values_list("pk", flat=True)
+            )
+            for alias in user_data_aliases():
+                IntakeResult.objects.using(alias).filter(
+                    chunk_id__in=chunk_ids
+                ).delete()
+                predictions = Prediction.objects.using(alias).filter(user__in=patients)
+                Prediction.symptoms.through.objects.using(alias).filter(
+                    prediction__in=predictions
+                )._raw_delete(alias)
+                predictions._raw_delete(alias)
+            staff.delete()
+            for patient in patients:
+                patient.delete()
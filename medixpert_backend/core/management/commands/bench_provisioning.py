@@ -0,0 +1,89 @@
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core import provisioning
+from core.serializers import UserRegistrationSerializer
+
+
+def patients(prefix, count):
+    return [
+        {
+            "username": f"{prefix}{i}",
+            "email": f"{prefix}{i}@clinic.example",
+            "first_name": "Bench",
+            "last_name": f"Patient {i}",
+            # Unrelated to the username, so the password validators accept it
+            "password": f"Clinic-{uuid.uuid4().hex[:12]}",
+            "age": 20 + i % 60,
+            "gender": ("male", "female", "other")[i % 3],
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare one-at-a-time registration with bulk provisioning. Password "
+        "hashing is timed separately; --fast-hasher swaps in MD5 so large "
+        "batches measure everything else. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--serial-rows", type=int, default=200)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--fast-hasher", action="store_true")
+
+    def handle(self, *args, **options):
+        prefix = f"bench_{uuid.uuid4().hex[:6]}_"
+        hashers = (
+            ["django.contrib.auth.hashers.MD5PasswordHasher"]
+            if options["fast_hasher"]
+            else None
+        )
+        overrides = {"PASSWORD_HASHERS": hashers} if hashers else {}
+
+        try:
+            with override_settings(**overrides):
+                start = time.perf_counter()
+                for _ in range(3):
+                    make_password("benchmark")
+                hash_seconds = (time.perf_counter() - start) / 3
+
+                serial = patients(f"{prefix}s", options["serial_rows"])
+                start = time.perf_counter()
+                for patient in serial:
+                    serializer = UserRegistrationSerializer(
+                        data={**patient, "password_confirm": patient["password"]}
+                    )
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save()
+                serial_rate = len(serial) / (time.perf_counter() - start)
+
+                bulk = patients(f"{prefix}b", options["rows"])
+                with provisioning.hashing_pool() as pool:
+                    # Start the workers outside the timing
+                    list(pool.map(abs, range(provisioning.hashing_workers())))
+                    start = time.perf_counter()
+                    results = provisioning.provision(bulk, options["chunk_size"], pool)
+                    bulk_seconds = time.perf_counter() - start
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+
+        created = sum(result["status"] == "created" for result in results)
+        workers = provisioning.hashing_workers()
+        self.stdout.write(
+            f"hasher: {'MD5 (fast)' if hashers else 'configured'}, "
+            f"{hash_seconds * 1000:.1f} ms per hash, {workers} hashing workers"
+        )
+        self.stdout.write(f"register one at a time: {serial_rate:8.1f} rows/s")
+        self.stdout.write(
+            f"bulk provisioning:      {created / bulk_seconds:8.1f} rows/s "
+            f"({created} rows in {bulk_seconds:.1f}s)"
+        )
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from core import review_queue
+from core.models import Disease, HealthRecord, Prediction
+from core.sharding import user_manager
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain synthetic pending health records with concurrent reviewers and "
+        "check no record is claimed twice. Run against a scratch database "
+        "(MEDIXPERT_DB_NAME); the synthetic rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=2000)
+        parser.add_argument("--reviewers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        patient, _ = User.objects.get_or_create(username="bench_review_patient")
+        reviewers = [
+            User.objects.get_or_create(
+                username=f"bench_reviewer_{i}", defaults={"is_staff": True}
+            )[0]
+            for i in range(options["reviewers"])
+        ]
+        prediction = user_manager(Prediction, patient).create(
+            user=patient, predicted_disease=Disease.objects.first(), confidence_score=0
+        )
+        HealthRecord.objects.using(prediction._state.db).bulk_create(
+            [
+                HealthRecord(user=patient, prediction=prediction)
+                for _ in range(options["records"])
+            ],
+            batch_size=1000,
+        )
+        connections.close_all()
+
+        completed = Counter()
+        lock_errors = []
+
+        def work(reviewer):
+            while True:
+                try:
+                    records = review_queue.claim(reviewer, options["batch_size"])
+                except OperationalError:
+                    lock_errors.append(reviewer.pk)
+                    continue
+                if not records:
+                    break
+                for record in records:
+                    if review_queue.complete(reviewer, record.pk, status="reviewed"):
+                        completed[record.pk] += 1
+            connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(r,)) for r in reviewers]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        duplicates = sum(1 for count in completed.values() if count > 1)
+        self.stdout.write(
+            f"{len(completed)} records reviewed by {len(reviewers)} reviewers in "
+            f"{elapsed:.2f}s ({len(completed) / elapsed:.0f} records/s), "
+            f"{duplicates} reviewed twice, {len(lock_errors)} lock timeouts"
+        )
+
+        patient.delete()
+        User.objects.filter(pk__in=[r.pk for r in reviewers]).delete()
@@ -0,0 +1,141 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Prefetch
+
+from core import catalog
+from core.models import Disease, HealthRecord, Prediction, Symptom
+from core.serializers import (
+    DiseaseSerializer,
+    HealthRecordSerializer,
+    PredictionSerializer,
+    SymptomSerializer,
+)
+from core.sharding import user_manager, user_queryset
+
+
+class NestedPredictionSerializer(PredictionSerializer):
+    """PredictionSerializer as it was before the fragment cache"""
+
+    symptoms = SymptomSerializer(many=True, read_only=True)
+    predicted_disease = DiseaseSerializer(read_only=True)
+
+
+class NestedHealthRecordSerializer(HealthRecordSerializer):
+    prediction = NestedPredictionSerializer(read_only=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serialize large prediction and health record history pages with the "
+        "nested catalog serializers and with the fragment cache, and compare. "
+        "Run against a scratch database (MEDIXPERT_DB_NAME); the synthetic "
+        "rows are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username="bench_serializer_patient")
+        diseases = list(Disease.objects.all())
+        symptoms = list(Symptom.objects.all())
+        predictions = user_manager(Prediction, user).bulk_create(
+            [
+                Prediction(
+                    user=user,
+                    predicted_disease=diseases[i % len(diseases)],
+                    confidence_score=50,
+                )
+                for i in range(options["rows"])
+            ]
+        )
+        alias = user_queryset(Prediction, user).db
+        Prediction.symptoms.through.objects.using(alias).bulk_create(
+            [
+                Prediction.symptoms.through(
+                    prediction_id=prediction.pk,
+                    symptom_id=symptoms[(i + j) % len(symptoms)].pk,
+                )
+                for i, prediction in enumerate(predictions)
+                for j in range(4)
+            ]
+        )
+        HealthRecord.objects.using(alias).bulk_create(
+            [HealthRecord(user=user, prediction=p) for p in predictions]
+        )
+
+        try:
+            self.compare(
+                "predictions",
+                user_queryset(Prediction, user),
+                NestedPredictionSerializer,
+                PredictionSerializer,
+                "symptoms",
+                options["runs"],
+            )
+            self.compare(
+                "health records",
+                user_queryset(HealthRecord, user).select_related("prediction__user"),
+                NestedHealthRecordSerializer,
+                HealthRecordSerializer,
+                "prediction__symptoms",
+                options["runs"],
+            )
+        finally:
+            HealthRecord.objects.using(alias).filter(user=user).delete()
+            user_queryset(Prediction, user).delete()
+
+    def compare(self, label, queryset, nested, cached, symptoms_path, runs):
+        queryset = queryset.select_related("user")
+        variants = [
+            # What the views did before: nested catalog objects, no prefetching
+            ("nested", nested, queryset),
+            # Best case for nesting: catalog objects prefetched per page
+            (
+                "nested+prefetch",
+                nested,
+                queryset.prefetch_related(
+                    symptoms_path,
+                    symptoms_path.replace("symptoms", "predicted_disease__symptoms"),
+                ),
+            ),
+            (
+                "fragments",
+                cached,
+                queryset.prefetch_related(
+                    Prefetch(symptoms_path, Symptom.objects.only("id"))
+                ),
+            ),
+        ]
+        catalog.fragments()  # built once per catalog version, not per request
+
+        outputs = {}
+        self.stdout.write(f"{label}, {queryset.count()} rows per page")
+        for name, serializer_class, page in variants:
+            timings = []
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            for _ in range(runs):
+                queries.clear()
+                with connections[page.db].execute_wrapper(count):
+                    start = time.perf_counter()
+                    data = serializer_class(list(page.all()), many=True).data
+                    timings.append((time.perf_counter() - start) * 1000)
+            outputs[name] = json.dumps(data, sort_keys=True, default=str)
+            self.stdout.write(
+                f"  {name:<16}{statistics.median(timings):>9.1f} ms"
+                f"{len(queries):>7} queries"
+            )
+
+        same = len(set(outputs.values())) == 1
+        self.stdout.write(f"  identical output: {same}")
@@ -0,0 +1,77 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import catalog, snapshot
+
+
+def private_kb():
+    """Memory private to this process (not shared with other workers), in kB"""
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def touch(arrays):
+    # Fault every page in, as serving requests eventually would
+    return sum(int(array.view("u1").sum()) for array in arrays)
+
+
+def measure(mode, path, results):
+    before = private_kb()
+    started = time.perf_counter()
+    if mode == "build":
+        arrays = list(snapshot._arrays().values())
+    else:
+        loaded = snapshot.CatalogSnapshot(path)
+        arrays = [value for value in vars(loaded).values() if hasattr(value, "view")]
+    touch(arrays)
+    results.put(((time.perf_counter() - started) * 1000, private_kb() - before))
+    # Stay alive until every worker has measured
+    time.sleep(1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare every worker building its own catalog tables with workers "
+        "attaching to the shared catalog snapshot: per-worker setup time and "
+        "private memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+
+    def handle(self, *args, **options):
+        stamp = catalog.current_stamp()
+        started = time.perf_counter()
+        snapshot.publish(stamp)
+        self.stdout.write(
+            f"publish version {stamp[0]}: "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        path = snapshot.snapshot_path(stamp)
+        connections.close_all()
+        for workers in options["workers"]:
+            for mode in ("build", "attach"):
+                results = multiprocessing.Queue()
+                processes = [
+                    multiprocessing.Process(target=measure, args=(mode, path, results))
+                    for _ in range(workers)
+                ]
+                for process in processes:
+                    process.start()
+                measured = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                setup_ms = sum(ms for ms, _ in measured) / workers
+                private = sum(kb for _, kb in measured)
+                self.stdout.write(
+                    f"{workers} worker(s), {mode:6}: "
+                    f"{setup_ms:8.1f} ms per worker, "
+                    f"{private:8d} kB private in total"
+                )
@@ -0,0 +1,78 @@
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Packages that should only load behind the inference/training boundary
+HEAVY_PACKAGES = ("numpy", "scipy", "sklearn", "pandas", "joblib")
+
+SETUP = (
+    "import os, django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medixpert.settings'); "
+)
+
+SCENARIOS = {
+    # A web worker booting and resolving its URLconf (which imports views)
+    "wsgi worker": ["-c", SETUP + "import medixpert.wsgi, core.urls"],
+    "manage.py help": ["manage.py", "help"],
+    "manage.py check": ["manage.py", "check"],
+    "manage.py showmigrations": ["manage.py", "showmigrations", "core"],
+    # For comparison: the first prediction pays for the model stack
+    "worker + model load": [
+        "-c",
+        SETUP + "import medixpert.wsgi; "
+        "from core.inference import get_predictor; get_predictor()",
+    ],
+}
+
+
+def parse_importtime(stderr):
+    """Cumulative import milliseconds of each heavy package that was loaded"""
+    loaded = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.strip() in HEAVY_PACKAGES and cumulative.strip().isdigit():
+            loaded[name.strip()] = int(cumulative) / 1000
+    return loaded
+
+
+class Command(BaseCommand):
+    help = (
+        "Time fresh interpreter startup for a web worker and common management "
+        "commands, and report which heavy packages each one imports"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'scenario':<28}{'p50 ms':>9}{'min ms':>9}  heavy imports")
+        for name in options["scenario"] or list(SCENARIOS):
+            timings = []
+            for _ in range(options["runs"]):
+                start = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, "-X", "importtime", *SCENARIOS[name]],
+                    cwd=settings.BASE_DIR,
+                    capture_output=True,
+                    text=True,
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+                if result.returncode:
+                    self.stderr.write(result.stderr[-2000:])
+                    break
+
+            heavy = ", ".join(
+                f"{package} {ms:.0f}ms"
+                for package, ms in parse_importtime(result.stderr).items()
+            )
+            self.stdout.write(
+                f"{name:<28}{statistics.median(timings):>9.0f}"
+                f"{min(timings):>9.0f}  {heavy or '-'}"
+            )
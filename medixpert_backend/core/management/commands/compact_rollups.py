@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import compact
+from core.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold predictions created since the last run into the incidence "
+        "rollups (for ANALYTICS_ROLLUP_MODE = 'compaction')"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for alias in user_data_aliases():
+            folded = compact(alias, batch_size=options["batch_size"])
+            self.stdout.write(f"{alias}: folded {folded} predictions")
@@ -0,0 +1,94 @@
+import logging
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, OutputWrapper
+from django.db import connections
+
+from core.inference import get_predictor
+from core.intake import claim_chunk, process_chunk
+from core.provisioning import expire_jobs, hashing_pool
+
+logger = logging.getLogger(__name__)
+
+
+def work(loop, interval, stdout=None, stderr=None):
+    """
+    Claim and process chunks until there are none left, or for ever with
+    loop. A module-level function, so worker processes started with any
+    start method can run it.
+    """
+    stdout = stdout or OutputWrapper(sys.stdout)
+    stderr = stderr or OutputWrapper(sys.stderr)
+    # Processes start only once a provisioning chunk needs them
+    with hashing_pool() as pool:
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        expire_jobs()
+        while True:
+            predictor = get_predictor()
+            # Without a model only provisioning chunks can be processed
+            kinds = None if predictor is not None else ["provisioning"]
+            chunk = claim_chunk(worker, kinds=kinds)
+            if chunk is None:
+                if not loop:
+                    break
+                time.sleep(interval)
+                expire_jobs()
+                continue
+            started = time.perf_counter()
+            try:
+                process_chunk(chunk, predictor, pool)
+            except Exception:
+                logger.exception("Intake chunk %s failed", chunk.pk)
+                continue
+            processed += chunk.row_count
+            stdout.write(
+                f"{worker}: job {chunk.job_id} chunk {chunk.index} "
+                f"({chunk.row_count} rows) in {time.perf_counter() - started:.2f}s"
+            )
+    if get_predictor() is None:
+        stderr.write(f"{worker}: no model artifact, nothing screened")
+    stdout.write(f"{worker}: processed {processed} rows")
+    return processed
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued intake job chunks: one batched inference and bulk "
+        "insert per screening chunk, or the accounts of a provisioning chunk. "
+        "Chunks are leased, so any number of these workers "
+        "can run side by side, and a crashed worker's chunk is picked up again "
+        "once its lease runs out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1, help="worker processes to start"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="keep waiting for new jobs"
+        )
+        parser.add_argument("--interval", type=int, default=5, help="seconds idle")
+
+    def handle(self, *args, **options):
+        if options["workers"] <= 1:
+            work(options["loop"], options["interval"], self.stdout, self.stderr)
+            return
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        # Spawned workers (macOS, and the default from Python 3.14) start
+        # without Django set up
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=django.setup
+        ) as pool:
+            workers = [
+                pool.submit(work, options["loop"], options["interval"])
+                for _ in range(options["workers"])
+            ]
+            for future in workers:
+                future.result()
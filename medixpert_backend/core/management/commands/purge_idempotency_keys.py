@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyRecord
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses past their TTL"
+
+    def handle(self, *args, **options):
+        deleted, _ = (
+            IdempotencyRecord.objects.using("default")
+            .filter(expires_at__lte=timezone.now())
+            .delete()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} idempotency keys"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.authentication import purge_user_changes
+from core.revocation import revocation_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete revoked refresh tokens whose expiry bucket has fully passed, "
+        "and user changes older than any access token"
+    )
+
+    def handle(self, *args, **options):
+        deleted = revocation_store.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} revoked tokens"))
+        deleted = purge_user_changes()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} user changes"))
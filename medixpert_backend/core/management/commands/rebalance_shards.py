@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ShardAssignment
+from core.sharding import (
+    copy_user_rows,
+    delete_user_rows,
+    forget_assignment,
+    shard_aliases,
+    shard_for_user,
+)
+
+
+class Command(BaseCommand):
+    help = "Move users' predictions and health records between shards"
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group(required=True)
+        mode.add_argument(
+            "--from-default",
+            action="store_true",
+            help="move rows written before sharding was enabled out of default",
+        )
+        mode.add_argument(
+            "--spread",
+            action="store_true",
+            help="re-place every user by user id across the current shards",
+        )
+        mode.add_argument("--user", type=int, action="append", help="user id")
+        parser.add_argument("--to", help="target shard alias for --user")
+        parser.add_argument(
+            "--settle",
+            type=float,
+            default=getattr(settings, "SHARD_MAP_CACHE_TTL", 30),
+            help="seconds to wait for workers to drop cached shard lookups",
+        )
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        if not shards:
+            raise CommandError("Sharding is not enabled (MEDIXPERT_DB_SHARDS)")
+
+        moves = []  # (user_id, source, target)
+        if options["from_default"]:
+            for user_id in User.objects.using("default").values_list("pk", flat=True):
+                moves.append((user_id, "default", shard_for_user(user_id)))
+        elif options["spread"]:
+            for user_id in User.objects.using("default").values_list("pk", flat=True):
+                source = shard_for_user(user_id)
+                target = shards[user_id % len(shards)]
+                if source != target:
+                    moves.append((user_id, source, target))
+        else:
+            if options["to"] not in shards:
+                raise CommandError(f"--to must be one of {', '.join(shards)}")
+            for user_id in options["user"]:
+                source = shard_for_user(user_id)
+                if source != options["to"]:
+                    moves.append((user_id, source, options["to"]))
+
+        if not moves:
+            self.stdout.write("Nothing to move")
+            return
+
+        # First pass copies while the user is still served from the source
+        for user_id, source, target in moves:
+            copied = copy_user_rows(user_id, source, target)
+            if source != "default":
+                ShardAssignment.objects.using("default").update_or_create(
+                    user_id=user_id, defaults={"shard": target}
+                )
+            forget_assignment(user_id)
+            self.stdout.write(f"user {user_id}: {source} -> {target} ({copied} rows)")
+
+        # Workers may still write to the source until their cached lookup
+        # expires; copy anything that arrived meanwhile, then drop the source
+        if options["settle"] and any(source != "default" for _, source, _ in moves):
+            time.sleep(options["settle"])
+        for user_id, source, target in moves:
+            copy_user_rows(user_id, source, target)
+            delete_user_rows(user_id, source)
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(moves)} users"))
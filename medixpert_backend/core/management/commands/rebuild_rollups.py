@@ -0,0 +1,86 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+from core import archive
+from core.analytics import ROLLUP_KEY, count_predictions, prediction_rows
+from core.models import DiseaseIncidenceRollup, Prediction, RollupWatermark
+from core.sharding import user_data_aliases
+
+
+def _count_chunk(args):
+    alias, low, high = args
+    rows = prediction_rows(
+        Prediction.objects.using(alias).filter(pk__gte=low, pk__lt=high)
+    )
+    deltas = count_predictions(rows.iterator(chunk_size=5000))
+    connections.close_all()
+    return deltas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the disease incidence rollups from all predictions, archived "
+        "ones included, counting id-range chunks in parallel. Run it while "
+        "prediction traffic is quiet: incremental updates made during the "
+        "rebuild are overwritten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=50000)
+
+    def handle(self, *args, **options):
+        chunks = []
+        watermarks = {}
+        for alias in user_data_aliases():
+            bounds = Prediction.objects.using(alias).aggregate(
+                low=Min("pk"), high=Max("pk")
+            )
+            watermarks[alias] = bounds["high"] or 0
+            if bounds["low"] is None:
+                continue
+            for low in range(bounds["low"], bounds["high"] + 1, options["chunk_size"]):
+                chunks.append(
+                    (alias, low, min(low + options["chunk_size"], bounds["high"] + 1))
+                )
+
+        # Forked workers must open their own connections
+        connections.close_all()
+        totals = Counter()
+        # Spawned workers (macOS, and the default from Python 3.14) start
+        # without Django set up
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=django.setup
+        ) as pool:
+            for deltas in pool.map(_count_chunk, chunks):
+                totals.update(deltas)
+        # Archived predictions keep counting towards disease incidence
+        for alias in user_data_aliases():
+            for rows in archive.rollup_rows(alias):
+                totals.update(count_predictions(rows))
+
+        with transaction.atomic(using="default"):
+            DiseaseIncidenceRollup.objects.using("default").all().delete()
+            DiseaseIncidenceRollup.objects.using("default").bulk_create(
+                [
+                    DiseaseIncidenceRollup(count=count, **dict(zip(ROLLUP_KEY, key)))
+                    for key, count in totals.items()
+                    if count
+                ],
+                batch_size=1000,
+            )
+            for alias, last_id in watermarks.items():
+                RollupWatermark.objects.using("default").update_or_create(
+                    name=alias, defaults={"last_prediction_id": last_id}
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(totals)} rollup rows from {len(chunks)} chunks"
+            )
+        )
@@ -0,0 +1,191 @@
+import functools
+import json
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.inference import get_predictor
+from core.models import HealthRecord, Prediction
+from core.sharding import user_data_aliases
+
+
+def _score_chunk(path, rows):
+    """
+    Score (symptoms, recorded disease, confirmed) rows with the candidate
+    model at path, loaded once per worker
+    """
+    candidate = get_predictor(path)
+    start = time.perf_counter()
+    results = candidate.predict_many([symptoms for symptoms, _, _ in rows])
+    batch_seconds = time.perf_counter() - start
+
+    # Single-request latency, sampled on a few rows of the chunk
+    latencies = []
+    for symptoms, _, _ in rows[:20]:
+        start = time.perf_counter()
+        candidate.predict_many([symptoms])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return (
+        [
+            (recorded, confirmed, disease)
+            for (_, recorded, confirmed), (disease, _) in zip(rows, results)
+        ],
+        batch_seconds,
+        latencies,
+    )
+
+
+def bounded_map(pool, fn, iterable, window):
+    """
+    fn over iterable on pool, in completion order, with at most window calls
+    submitted but not yet collected. Executor.map would read the whole
+    iterable up front.
+    """
+    pending = set()
+    for item in iterable:
+        pending.add(pool.submit(fn, item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in as_completed(pending):
+        yield future.result()
+
+
+def _history(chunk_size, limit):
+    """Yield chunks of (symptom names, recorded disease, confirmed) rows"""
+    through = Prediction.symptoms.through
+    remaining = limit
+    for alias in user_data_aliases():
+        last_pk = 0
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            batch = list(
+                Prediction.objects.using(alias)
+                .filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "predicted_disease__name")[:size]
+            )
+            if not batch:
+                break
+            ids = [pk for pk, _ in batch]
+            symptoms = {pk: [] for pk in ids}
+            for pk, name in (
+                through.objects.using(alias)
+                .filter(prediction_id__in=ids)
+                .values_list("prediction_id", "symptom__name")
+            ):
+                symptoms[pk].append(name)
+            confirmed = set(
+                HealthRecord.objects.using(alias)
+                .filter(prediction_id__in=ids, diagnosis_confirmed=True)
+                .values_list("prediction_id", flat=True)
+            )
+            yield [(symptoms[pk], disease, pk in confirmed) for pk, disease in batch]
+            last_pk = ids[-1]
+            if remaining is not None:
+                remaining -= len(batch)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay historical predictions through a candidate model and report "
+        "agreement, accuracy and latency before it replaces the live model"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("candidate", help="path to the candidate model artifact")
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--limit", type=int, help="replay at most this many rows")
+        parser.add_argument("--output", help="also write the report as JSON here")
+
+    def handle(self, *args, **options):
+        if get_predictor(options["candidate"]) is None:
+            raise CommandError(f"Cannot load candidate model {options['candidate']}")
+
+        total = agreed = confirmed = confirmed_correct = 0
+        disagreements = Counter()
+        batch_seconds = 0.0
+        latencies = []
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        start = time.perf_counter()
+        # Spawned workers start without Django set up, and must set it up
+        # before the tasks' module (which imports the models) is unpickled
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=django.setup
+        ) as pool:
+            chunks = _history(options["chunk_size"], options["limit"])
+            results = bounded_map(
+                pool,
+                functools.partial(_score_chunk, options["candidate"]),
+                chunks,
+                options["workers"] * 2,
+            )
+            for scored, seconds, chunk_latencies in results:
+                batch_seconds += seconds
+                latencies += chunk_latencies
+                for recorded, is_confirmed, predicted in scored:
+                    total += 1
+                    if predicted == recorded:
+                        agreed += 1
+                    else:
+                        disagreements[(recorded, predicted or "(none)")] += 1
+                    if is_confirmed:
+                        confirmed += 1
+                        confirmed_correct += predicted == recorded
+        elapsed = time.perf_counter() - start
+
+        if not total:
+            self.stdout.write("No predictions to replay")
+            return
+
+        latencies.sort()
+        report = {
+            "candidate": options["candidate"],
+            "live_model": str(settings.MODEL_PATH),
+            "predictions": total,
+            "agreement": agreed / total,
+            # Predictions a clinician confirmed are the closest thing to labels
+            "confirmed_predictions": confirmed,
+            "accuracy_on_confirmed": (
+                confirmed_correct / confirmed if confirmed else None
+            ),
+            "rows_per_second": total / elapsed,
+            "batch_ms_per_row": batch_seconds / total * 1000,
+            "single_latency_p50_ms": statistics.median(latencies),
+            "single_latency_p95_ms": (
+                latencies[int(len(latencies) * 0.95) - 1]
+                if len(latencies) >= 20
+                else latencies[-1]
+            ),
+            "top_disagreements": [
+                {"recorded": recorded, "candidate": predicted, "count": count}
+                for (recorded, predicted), count in disagreements.most_common(10)
+            ],
+        }
+
+        for key, value in report.items():
+            if key != "top_disagreements":
+                self.stdout.write(f"{key}: {value}")
+        for row in report["top_disagreements"]:
+            self.stdout.write(
+                f"  {row['recorded']} -> {row['candidate']}: {row['count']}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
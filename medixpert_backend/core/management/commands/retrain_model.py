@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import catalog
+from core.retraining import retrain, settle_seconds
+
+
+class Command(BaseCommand):
+    help = (
+        "Retrain the disease model when the symptom/disease catalog no longer "
+        "matches the one it was trained on, and publish it for the web "
+        "workers to reload. Run with --loop as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="model artifact (default: MODEL_PATH)")
+        parser.add_argument("--backend", help="estimator (default: MODEL_BACKEND)")
+        parser.add_argument(
+            "--force", action="store_true", help="retrain from scratch regardless"
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="keep watching the catalog as a worker"
+        )
+        parser.add_argument("--interval", type=int, default=10, help="seconds")
+
+    def retrain(self, options, force=False):
+        outcome, seconds = retrain(options["path"], options["backend"], force=force)
+        self.stdout.write(f"model {outcome} ({seconds:.1f}s)")
+
+    def handle(self, *args, **options):
+        self.retrain(options, force=options["force"])
+        if not options["loop"]:
+            return
+        # Catalog edits bump the catalog version; checking it is one query.
+        # Wait for a burst of edits (populate_data.py) to settle first.
+        checked = changed = catalog.current_version()
+        changed_at = time.monotonic()
+        while True:
+            time.sleep(options["interval"])
+            version = catalog.current_version()
+            if version != changed:
+                changed, changed_at = version, time.monotonic()
+            elif (
+                version != checked and time.monotonic() - changed_at >= settle_seconds()
+            ):
+                checked = version
+                self.retrain(options)
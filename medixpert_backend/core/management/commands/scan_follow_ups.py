@@ -0,0 +1,46 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.reminders import get_sink, scan_due
+from core.sharding import user_data_aliases
+
+
+class Command(BaseCommand):
+    help = "Send reminder events for health records whose follow-up date is due"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookahead-days",
+            type=int,
+            default=1,
+            help="also remind about follow-ups due within this many days",
+        )
+        parser.add_argument(
+            "--since",
+            help="ignore follow-up dates before this one (default: remind about "
+            "every due record not reminded yet)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--loop", action="store_true", help="keep scanning as a worker"
+        )
+        parser.add_argument("--interval", type=int, default=300, help="seconds")
+
+    def handle(self, *args, **options):
+        sink = get_sink()
+        since = parse_date(options["since"]) if options["since"] else None
+        while True:
+            today = timezone.localdate()
+            horizon = today + timedelta(days=options["lookahead_days"])
+            for alias in user_data_aliases():
+                sent = scan_due(
+                    alias, sink, horizon, since, batch_size=options["batch_size"]
+                )
+                self.stdout.write(f"{alias}: sent {sent} reminders up to {horizon}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Disease, Symptom
+from core.sharding import (
+    replicate_disease_symptoms,
+    seed_id_ranges,
+    shard_aliases,
+    shard_for_user,
+)
+
+
+def _upsert(model, alias, objs):
+    fields = [
+        f.name
+        for f in model._meta.concrete_fields
+        if not f.primary_key and not f.many_to_many
+    ]
+    model.objects.using(alias).bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=fields,
+        batch_size=500,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the disease/symptom catalog and user rows to every shard and "
+        "seed each shard's id range"
+    )
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        if not shards:
+            raise CommandError("Sharding is not enabled (MEDIXPERT_DB_SHARDS)")
+
+        symptoms = list(Symptom.objects.using("default"))
+        diseases = list(Disease.objects.using("default"))
+        users_by_shard = {alias: [] for alias in shards}
+        for user in User.objects.using("default").iterator(chunk_size=2000):
+            users_by_shard[shard_for_user(user.pk)].append(user)
+
+        for index, alias in enumerate(shards, start=1):
+            seed_id_ranges(alias, index)
+            _upsert(Symptom, alias, symptoms)
+            _upsert(Disease, alias, diseases)
+            for disease in diseases:
+                replicate_disease_symptoms(disease, [alias])
+            _upsert(User, alias, users_by_shard[alias])
+            self.stdout.write(
+                f"{alias}: {len(symptoms)} symptoms, {len(diseases)} diseases, "
+                f"{len(users_by_shard[alias])} users"
+            )
+        self.stdout.write(self.style.SUCCESS("Shard catalog in sync"))
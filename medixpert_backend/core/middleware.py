@@ -0,0 +1,37 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from . import warmup
+from .db_routers import _use_primary, record_write
+
+
+class WarmupMiddleware:
+    """Warm up each worker process on its first request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        warmup.start()
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Keep unsafe requests on the primary and start stickiness after writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        is_write = request.method not in SAFE_METHODS
+        token = _use_primary.set(is_write)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_primary.reset(token)
+
+        # DRF copies the authenticated user back onto the Django request
+        user = getattr(request, "user", None)
+        if is_write and response.status_code < 400 and user is not None:
+            if user.is_authenticated:
+                record_write(user.pk)
+        return response
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_shardassignment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("last_prediction_id", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DiseaseIncidenceRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "Day"), ("week", "Week")], max_length=10
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("severity", models.CharField(max_length=20)),
+                ("age_band", models.CharField(blank=True, max_length=10)),
+                ("gender", models.CharField(blank=True, max_length=10)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "disease",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="core.disease"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "period",
+                            "period_start",
+                            "disease",
+                            "age_band",
+                            "gender",
+                        ),
+                        name="unique_incidence_rollup",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_follow_up_scanner"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShadowDisagreement",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("prediction_id", models.BigIntegerField()),
+                ("user_id", models.BigIntegerField()),
+                ("model_path", models.CharField(max_length=255)),
+                ("live_disease", models.CharField(max_length=100)),
+                ("live_confidence", models.FloatField()),
+                ("candidate_disease", models.CharField(blank=True, max_length=100)),
+                ("candidate_confidence", models.FloatField()),
+                ("candidate_latency_ms", models.FloatField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
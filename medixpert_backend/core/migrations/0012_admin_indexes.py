@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_prediction_archive_segment"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="healthrecord",
+            index=models.Index(
+                fields=["created_at", "id"], name="healthrecord_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="prediction",
+            index=models.Index(fields=["timestamp", "id"], name="prediction_timestamp"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_intake_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user_id", models.BigIntegerField(unique=True)),
+                ("changed_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
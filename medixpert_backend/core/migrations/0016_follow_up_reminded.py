@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:16
+
+from django.conf import settings
+from django.db import connections, migrations, models
+
+
+def mark_scanned(apps, schema_editor):
+    """Records the keyset scanner already passed were reminded about"""
+    alias = schema_editor.connection.alias
+    ScanCheckpoint = apps.get_model("core", "ScanCheckpoint")
+    # Gone once default is migrated past 0023, before a shard may get here
+    if (
+        ScanCheckpoint._meta.db_table
+        not in connections["default"].introspection.table_names()
+    ):
+        return
+    HealthRecord = apps.get_model("core", "HealthRecord")
+    checkpoint = (
+        ScanCheckpoint.objects.using("default")
+        .filter(name=f"follow_up:{alias}")
+        .first()
+    )
+    if checkpoint is None:
+        return
+    HealthRecord.objects.using(alias).filter(
+        models.Q(follow_up_date__lt=checkpoint.last_date)
+        | models.Q(follow_up_date=checkpoint.last_date, id__lte=checkpoint.last_id)
+    ).update(reminded_for=models.F("follow_up_date"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_revoked_token_created_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthrecord",
+            name="reminded_for",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="healthrecord",
+            index=models.Index(
+                condition=models.Q(
+                    ("follow_up_date__isnull", False),
+                    models.Q(("status", "treated"), _negated=True),
+                    models.Q(
+                        ("reminded_for__isnull", True),
+                        ("reminded_for__lt", models.F("follow_up_date")),
+                        ("reminded_for__gt", models.F("follow_up_date")),
+                        _connector="OR",
+                    ),
+                ),
+                fields=["follow_up_date", "id"],
+                name="healthrecord_follow_up_due",
+            ),
+        ),
+        # Shards hold health records too
+        migrations.RunPython(
+            mark_scanned,
+            migrations.RunPython.noop,
+            hints={"model_name": "healthrecord"},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_follow_up_reminded"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthrecord",
+            name="diagnosis_confirmed",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
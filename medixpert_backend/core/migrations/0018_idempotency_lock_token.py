@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_health_record_diagnosis_confirmed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencyrecord",
+            name="lock_token",
+            field=models.CharField(default="", max_length=32),
+        ),
+    ]
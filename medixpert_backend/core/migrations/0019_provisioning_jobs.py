@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_idempotency_lock_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="intakechunk",
+            name="secrets",
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name="intakejob",
+            name="kind",
+            field=models.CharField(
+                choices=[("screening", "Screening"), ("provisioning", "Provisioning")],
+                default="screening",
+                max_length=20,
+            ),
+        ),
+    ]
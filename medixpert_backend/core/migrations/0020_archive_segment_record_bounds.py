@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:30
+
+import json
+import zlib
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+def record_bounds(apps, schema_editor):
+    """Fill in the health record bounds of existing segments"""
+    alias = schema_editor.connection.alias
+    Segment = apps.get_model("core", "PredictionArchiveSegment")
+    segments = Segment.objects.using(alias).filter(health_record_count__gt=0)
+    for segment in segments.iterator(chunk_size=100):
+        records = json.loads(zlib.decompress(segment.payload))["health_records"]
+        segment.min_health_record_id = min(records["id"])
+        segment.max_health_record_id = max(records["id"])
+        segment.last_health_record_at = max(map(parse_datetime, records["created_at"]))
+        segment.save(
+            using=alias,
+            update_fields=[
+                "min_health_record_id",
+                "max_health_record_id",
+                "last_health_record_at",
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_provisioning_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="predictionarchivesegment",
+            name="last_health_record_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="predictionarchivesegment",
+            name="max_health_record_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="predictionarchivesegment",
+            name="min_health_record_id",
+            field=models.BigIntegerField(null=True),
+        ),
+        # Shards hold archive segments too
+        migrations.RunPython(
+            record_bounds,
+            migrations.RunPython.noop,
+            hints={"model_name": "predictionarchivesegment"},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:34
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_archive_segment_record_bounds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="catalogversion",
+            name="token",
+            field=models.CharField(
+                default=core.models.new_catalog_token, max_length=32
+            ),
+        ),
+    ]
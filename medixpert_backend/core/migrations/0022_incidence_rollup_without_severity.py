@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_catalog_version_token"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="diseaseincidencerollup",
+            name="severity",
+        ),
+    ]
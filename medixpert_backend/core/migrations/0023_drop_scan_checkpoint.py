@@ -0,0 +1,16 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_incidence_rollup_without_severity"),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name="ScanCheckpoint",
+        ),
+    ]
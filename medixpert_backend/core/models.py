@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -61,11 +63,26 @@ class Prediction(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # Default ordering, admin date hierarchy and the archiver's cutoff
+            models.Index(fields=["timestamp", "id"], name="prediction_timestamp")
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.predicted_disease.name} ({self.confidence_score:.2f})"
 
 
+# Untreated health records with a follow-up date they have not been reminded
+# about
+REMINDER_DUE = (
+    models.Q(follow_up_date__isnull=False) & ~models.Q(status="treated")
+) & (
+    models.Q(reminded_for__isnull=True)
+    | models.Q(reminded_for__lt=models.F("follow_up_date"))
+    | models.Q(reminded_for__gt=models.F("follow_up_date"))
+)
+
+
 class HealthRecord(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     prediction = models.ForeignKey(Prediction, on_delete=models.CASCADE)
@@ -84,6 +101,302 @@ class HealthRecord(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Review queue lease; reviewers may live on another shard, hence no FK
+    # constraint
+    reviewer = models.ForeignKey(
+        User,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        related_name="claimed_health_records",
+    )
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Follow-up date a reminder was last sent for
+    reminded_for = models.DateField(null=True, blank=True)
+    # Whether the reviewing clinician agreed with the predicted disease;
+    # unknown until a review says so
+    diagnosis_confirmed = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="healthrecord_status_created"
+            ),
+            # Upcoming follow-ups, which keep their prediction out of the archive
+            models.Index(
+                fields=["follow_up_date", "id"], name="healthrecord_follow_up"
+            ),
+            # The follow-up scanner's queue: records not yet reminded about
+            # their current follow-up date
+            models.Index(
+                fields=["follow_up_date", "id"],
+                name="healthrecord_follow_up_due",
+                condition=REMINDER_DUE,
+            ),
+            # Admin ordering and date hierarchy
+            models.Index(fields=["created_at", "id"], name="healthrecord_created"),
+        ]
 
     def __str__(self):
         return f"Health Record - {self.user.username} - {self.prediction.predicted_disease.name}"
+
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    # Expiry bucket (token exp // bucket size); whole buckets are purged at once
+    bucket = models.IntegerField(db_index=True)
+    expires_at = models.DateTimeField()
+    # Processes sync revocations made since their last sync by this
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class UserChange(models.Model):
+    """When a user was last changed or deleted; older token claims are stale"""
+
+    # Plain id: the row must outlive a deleted user
+    user_id = models.BigIntegerField(unique=True)
+    changed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} changed at {self.changed_at}"
+
+
+class ShardAssignment(models.Model):
+    """Explicit shard for a user; users without a row use the hash placement"""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    shard = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.shard}"
+
+
+class DiseaseIncidenceRollup(models.Model):
+    """Prediction counts per period, disease and patient demographic"""
+
+    period = models.CharField(max_length=10, choices=[("day", "Day"), ("week", "Week")])
+    period_start = models.DateField()
+    disease = models.ForeignKey(Disease, on_delete=models.CASCADE)
+    age_band = models.CharField(max_length=10, blank=True)
+    gender = models.CharField(max_length=10, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "period_start", "disease", "age_band", "gender"],
+                name="unique_incidence_rollup",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start} - {self.disease_id}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """Last prediction id folded into the rollups, per database alias"""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_prediction_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_prediction_id}"
+
+
+class ShadowDisagreement(models.Model):
+    """A live prediction the shadow (candidate) model disagreed with"""
+
+    # Plain ids: predictions may live on a user's shard
+    prediction_id = models.BigIntegerField()
+    user_id = models.BigIntegerField()
+    model_path = models.CharField(max_length=255)
+    live_disease = models.CharField(max_length=100)
+    live_confidence = models.FloatField()
+    candidate_disease = models.CharField(max_length=100, blank=True)
+    candidate_confidence = models.FloatField()
+    candidate_latency_ms = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.prediction_id}: {self.live_disease} vs {self.candidate_disease}"
+
+
+def new_catalog_token():
+    return uuid.uuid4().hex
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped whenever the symptom/disease catalog changes"""
+
+    version = models.BigIntegerField(default=0)
+    # Redrawn on every bump: tells apart catalogs that reached the same
+    # version on different databases, or again after a rollback
+    token = models.CharField(max_length=32, default=new_catalog_token)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"catalog v{self.version}"
+
+
+class IdempotencyRecord(models.Model):
+    """A request made with an Idempotency-Key and, once finished, its response"""
+
+    # Plain id: the user row may live on a shard as well
+    user_id = models.BigIntegerField()
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Identifies the request holding the record, so one whose record was
+    # taken over as stale cannot overwrite or delete its successor's
+    lock_token = models.CharField(max_length=32, default="")
+    # Null while the first request is still being processed
+    status_code = models.SmallIntegerField(null=True)
+    response_body = models.BinaryField(null=True)  # zlib-compressed JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user_id", "key"], name="unique_idempotency_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+
+class PredictionArchiveSegment(models.Model):
+    """A user's archived predictions and health records for one month"""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()  # first day of the month, local time
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    min_prediction_id = models.BigIntegerField()
+    max_prediction_id = models.BigIntegerField()
+    prediction_count = models.IntegerField(default=0)
+    health_record_count = models.IntegerField(default=0)
+    # Bounds of the segment's health records, null when it has none, so
+    # lookups skip segments that cannot hold a record
+    min_health_record_id = models.BigIntegerField(null=True)
+    max_health_record_id = models.BigIntegerField(null=True)
+    last_health_record_at = models.DateTimeField(null=True)
+    payload = models.BinaryField()  # zlib-compressed columnar JSON
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "month"], name="unique_archive_segment"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m}: {self.prediction_count}"
+
+
+class IntakeJob(models.Model):
+    """
+    A batch processed in chunks by intake workers: an uploaded CSV of intake
+    forms to screen, or a large bulk provisioning request
+    """
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="intake_jobs"
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=[("screening", "Screening"), ("provisioning", "Provisioning")],
+        default="screening",
+    )
+    filename = models.CharField(max_length=255, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("uploading", "Uploading"),
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("completed", "Completed"),
+        ],
+        default="uploading",
+    )
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    # Predictions created, or patient accounts for a provisioning job
+    created_predictions = models.IntegerField(default=0)
+    failed_rows = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+
+    def __str__(self):
+        return f"Intake job {self.pk} ({self.status})"
+
+
+class IntakeChunk(models.Model):
+    """A slice of an intake job's rows; the unit a worker leases"""
+
+    job = models.ForeignKey(IntakeJob, on_delete=models.CASCADE, related_name="chunks")
+    index = models.IntegerField()
+    first_row = models.IntegerField()
+    row_count = models.IntegerField()
+    rows = models.BinaryField()  # zlib-compressed JSON
+    # Passwords of a provisioning chunk's rows, kept apart from them and
+    # cleared once the chunk is finished (zlib-compressed JSON)
+    secrets = models.BinaryField(null=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[("pending", "Pending"), ("done", "Done"), ("failed", "Failed")],
+        default="pending",
+    )
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    # Results of rows whose patient was not found (or of every row not
+    # screened when the chunk failed), as zlib-compressed JSON
+    unplaced_results = models.BinaryField(null=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["job", "index"], name="unique_intake_chunk")
+        ]
+        indexes = [
+            # Workers claim the oldest pending chunk
+            models.Index(fields=["status", "job", "index"], name="intakechunk_claim")
+        ]
+
+    def __str__(self):
+        return f"Intake job {self.job_id} chunk {self.index} ({self.status})"
+
+
+class IntakeResult(models.Model):
+    """
+    Outcome of an intake chunk's rows whose patients live on this database
+    (for a provisioning chunk: every row, on "default").
+
+    It is written in the same transaction as the predictions or accounts it
+    lists, so its presence marks the chunk committed here and a retried
+    chunk never creates them twice.
+    """
+
+    chunk_id = models.BigIntegerField(unique=True)  # IntakeChunk on "default"
+    job_id = models.BigIntegerField(db_index=True)
+    results = models.BinaryField()  # zlib-compressed JSON
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Intake chunk {self.chunk_id} results"
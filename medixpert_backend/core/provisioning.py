@@ -0,0 +1,401 @@
+import base64
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from rest_framework import serializers
+
+from . import intake
+from .models import IntakeChunk, IntakeJob, IntakeResult, ShardAssignment, UserProfile
+from .sharding import shard_aliases
+
+PROFILE_FIELDS = ["age", "gender", "phone", "emergency_contact", "medical_history"]
+
+# Per-row results of a provisioning job
+RESULT_FIELDS = ["row", "username", "status", "id", "error"]
+
+
+class PatientSerializer(serializers.Serializer):
+    """One row of a bulk provisioning batch"""
+
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField(required=False, allow_blank=True, default="")
+    first_name = serializers.CharField(
+        max_length=150, required=False, allow_blank=True, default=""
+    )
+    last_name = serializers.CharField(
+        max_length=150, required=False, allow_blank=True, default=""
+    )
+    password = serializers.CharField(write_only=True)
+    age = serializers.IntegerField(
+        min_value=0, max_value=150, required=False, allow_null=True, default=None
+    )
+    gender = serializers.ChoiceField(
+        choices=UserProfile._meta.get_field("gender").choices,
+        required=False,
+        allow_blank=True,
+        default="",
+    )
+    phone = serializers.CharField(
+        max_length=15, required=False, allow_blank=True, default=""
+    )
+    emergency_contact = serializers.CharField(
+        max_length=15, required=False, allow_blank=True, default=""
+    )
+    medical_history = serializers.CharField(
+        required=False, allow_blank=True, default=""
+    )
+
+    def validate_username(self, value):
+        # Same rules as the User model field; uniqueness is checked per chunk
+        for validator in User._meta.get_field("username").validators:
+            validator(value)
+        return value
+
+    def validate(self, attrs):
+        # The account as it will be created, for the similarity validator
+        user = User(
+            username=attrs["username"],
+            email=attrs["email"],
+            first_name=attrs["first_name"],
+            last_name=attrs["last_name"],
+        )
+        try:
+            validate_password(attrs["password"], user)
+        except ValidationError as exc:
+            raise serializers.ValidationError({"password": list(exc.messages)})
+        return attrs
+
+
+def hashing_workers():
+    return getattr(settings, "PROVISIONING_WORKERS", None) or os.cpu_count() or 1
+
+
+def hashing_pool():
+    """
+    A process pool of PROVISIONING_WORKERS for provision(), to be shut down
+    by the caller. Meant for offline commands: web workers hash small
+    batches inline and queue larger ones as jobs.
+    """
+    return ProcessPoolExecutor(max_workers=hashing_workers(), initializer=django.setup)
+
+
+def secrets_ttl():
+    return getattr(settings, "PROVISIONING_SECRETS_TTL", 24 * 60 * 60)
+
+
+def _fernet():
+    """
+    Encryption for the passwords of queued jobs, keyed by SECRET_KEY (and
+    SECRET_KEY_FALLBACKS while it is rotated)
+    """
+    from cryptography.fernet import Fernet, MultiFernet
+
+    return MultiFernet(
+        [
+            Fernet(
+                base64.urlsafe_b64encode(
+                    salted_hmac(
+                        "core.provisioning.secrets",
+                        "",
+                        secret=secret,
+                        algorithm="sha256",
+                    ).digest()
+                )
+            )
+            for secret in [settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+        ]
+    )
+
+
+def encrypt_secrets(passwords):
+    return _fernet().encrypt(intake.encode(passwords))
+
+
+def decrypt_secrets(token):
+    """Passwords stored by encrypt_secrets, or None once secrets_ttl() passed"""
+    from cryptography.fernet import InvalidToken
+
+    try:
+        return intake.decode(_fernet().decrypt(bytes(token), ttl=secrets_ttl()))
+    except InvalidToken:
+        return None
+
+
+def _replicate_to_shards(users):
+    """Bulk version of the per-user shard placement done by signals"""
+    shards = shard_aliases()
+    if not shards:
+        return
+    placements = {user.pk: shards[user.pk % len(shards)] for user in users}
+    ShardAssignment.objects.using("default").bulk_create(
+        [ShardAssignment(user_id=pk, shard=alias) for pk, alias in placements.items()]
+    )
+    for alias in shards:
+        User.objects.using(alias).bulk_create(
+            [copy.copy(user) for user in users if placements[user.pk] == alias]
+        )
+
+
+def _insert_chunk(rows, hashes, before_commit=None):
+    """
+    Insert valid rows in one transaction; returns {username: user id}.
+    before_commit(created) runs last inside the transaction.
+    """
+    with transaction.atomic(using="default"):
+        users = User.objects.using("default").bulk_create(
+            [
+                User(
+                    username=row["username"],
+                    email=row["email"],
+                    first_name=row["first_name"],
+                    last_name=row["last_name"],
+                    password=password,
+                )
+                for row, password in zip(rows, hashes)
+            ]
+        )
+        UserProfile.objects.using("default").bulk_create(
+            [
+                UserProfile(user=user, **{f: row[f] for f in PROFILE_FIELDS})
+                for user, row in zip(users, rows)
+            ]
+        )
+        _replicate_to_shards(users)
+        created = {user.username: user.pk for user in users}
+        if before_commit is not None:
+            before_commit(created)
+    return created
+
+
+def _existing(usernames):
+    return set(
+        User.objects.using("default")
+        .filter(username__in=usernames)
+        .values_list("username", flat=True)
+    )
+
+
+def _create(rows, pool=None, before_commit=None):
+    """Hash and insert validated rows whose username is free; {username: id}"""
+    existing = _existing([row["username"] for row in rows])
+    fresh = [row for row in rows if row["username"] not in existing]
+    passwords = [row["password"] for row in fresh]
+    if pool is None:
+        hashes = map(make_password, passwords)
+    else:
+        hashes = pool.map(
+            make_password,
+            passwords,
+            chunksize=max(1, len(fresh) // (hashing_workers() * 4)),
+        )
+    hashed = dict(zip([row["username"] for row in fresh], hashes))
+    try:
+        return _insert_chunk(
+            fresh, [hashed[row["username"]] for row in fresh], before_commit
+        )
+    except IntegrityError:
+        # A concurrent batch took some usernames since the check
+        existing = _existing([row["username"] for row in fresh])
+        fresh = [row for row in fresh if row["username"] not in existing]
+        return _insert_chunk(
+            fresh, [hashed[row["username"]] for row in fresh], before_commit
+        )
+
+
+def validate(patients):
+    """
+    (results, valid): results holds an "invalid" or "duplicate" result for
+    each rejected row and None for the rest, valid the (index, row) pairs of
+    the rest
+    """
+    results = [None] * len(patients)
+    seen = set()
+    valid = []
+    # One serializer for every row, as ListSerializer does, so its fields are
+    # built once instead of deep-copied per row
+    serializer = PatientSerializer()
+    for index, patient in enumerate(patients):
+        try:
+            row = serializer.run_validation(patient)
+        except serializers.ValidationError as exc:
+            results[index] = {
+                "row": index,
+                "username": (
+                    patient.get("username") if isinstance(patient, dict) else None
+                ),
+                "status": "invalid",
+                "errors": exc.detail,
+            }
+            continue
+        if row["username"] in seen:
+            results[index] = {
+                "row": index,
+                "username": row["username"],
+                "status": "duplicate",
+            }
+        else:
+            seen.add(row["username"])
+            valid.append((index, row))
+    return results, valid
+
+
+def _outcomes(results, valid, created):
+    """Fill in the results of valid rows from {username: id} of those created"""
+    for index, row in valid:
+        results[index] = (
+            {
+                "row": index,
+                "username": row["username"],
+                "status": "created",
+                "id": created[row["username"]],
+            }
+            if row["username"] in created
+            else {"row": index, "username": row["username"], "status": "duplicate"}
+        )
+    return results
+
+
+def provision(patients, chunk_size=500, pool=None):
+    """
+    Validate and create patients with their profiles.
+
+    Returns one result per input row, in order: "created" with the new
+    user id, "duplicate" if the username exists (or repeats in the
+    batch), or "invalid" with field errors. Passwords are hashed in pool
+    (a hashing_pool()) if given, else inline; each chunk is inserted in its
+    own transaction.
+    """
+    results, valid = validate(patients)
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start : start + chunk_size]
+        _outcomes(results, chunk, _create([row for _, row in chunk], pool))
+    return results
+
+
+def create_job(owner, patients, chunk_size):
+    """
+    Queue a batch as a provisioning job for the intake workers, in chunks
+    of chunk_size rows. Passwords are stored encrypted, apart from the
+    rows, and dropped as each chunk finishes or expire_jobs() gives up on it.
+    """
+    chunks = []
+    for index, first_row in enumerate(range(0, len(patients), chunk_size)):
+        rows = patients[first_row : first_row + chunk_size]
+        chunks.append(
+            IntakeChunk(
+                index=index,
+                first_row=first_row,
+                row_count=len(rows),
+                rows=intake.encode(
+                    [
+                        (
+                            {k: v for k, v in row.items() if k != "password"}
+                            if isinstance(row, dict)
+                            else row
+                        )
+                        for row in rows
+                    ]
+                ),
+                secrets=encrypt_secrets(
+                    [
+                        row.get("password") if isinstance(row, dict) else None
+                        for row in rows
+                    ]
+                ),
+            )
+        )
+    with transaction.atomic(using="default"):
+        job = IntakeJob.objects.using("default").create(
+            owner=owner, kind="provisioning", status="queued", total_rows=len(patients)
+        )
+        for chunk in chunks:
+            chunk.job = job
+        IntakeChunk.objects.using("default").bulk_create(chunks)
+    return job
+
+
+def _error(errors):
+    """Field errors as one line, for the CSV and NDJSON job results"""
+    if not isinstance(errors, dict):
+        return " ".join(map(str, errors))
+    return "; ".join(
+        f"{field}: {' '.join(map(str, messages))}" for field, messages in errors.items()
+    )
+
+
+EXPIRED = "Passwords expired before the job was processed"
+
+
+def expire_jobs():
+    """
+    Fail the provisioning chunks still pending secrets_ttl() after their job
+    was queued, dropping their passwords. Returns the number of chunks.
+    """
+    now = timezone.now()
+    stale = (
+        IntakeChunk.objects.using("default")
+        .filter(
+            status="pending",
+            job__kind="provisioning",
+            job__created_at__lt=now - timedelta(seconds=secrets_ttl()),
+        )
+        # Leave chunks a worker is processing right now to that worker
+        .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+        .select_related("job")
+    )
+    expired = 0
+    for chunk in stale:
+        intake.finish_chunk(chunk, "failed", [], error=EXPIRED)
+        expired += 1
+    return expired
+
+
+def provision_chunk(chunk, pool=None):
+    """
+    Create the patients of a claimed provisioning job chunk, hashing in pool
+    if given. Its results are stored in the same transaction as the
+    accounts, so a chunk retried after its lease ran out never creates them
+    twice.
+    """
+    results = IntakeResult.objects.using("default").filter(chunk_id=chunk.pk)
+    if not results.exists():
+        rows = intake.decode(chunk.rows)
+        secrets = decrypt_secrets(chunk.secrets) if chunk.secrets else []
+        if secrets is None:
+            intake.finish_chunk(chunk, "failed", [], error=EXPIRED)
+            return
+        for row, password in zip(rows, secrets):
+            if isinstance(row, dict) and password is not None:
+                row["password"] = password
+        outcomes, valid = validate(rows)
+
+        def store(created):
+            stored = []
+            for result in _outcomes(outcomes, valid, created):
+                result = {**result, "row": chunk.first_row + result["row"]}
+                if "errors" in result:
+                    result["error"] = _error(result.pop("errors"))
+                stored.append(result)
+            results.create(
+                chunk_id=chunk.pk, job_id=chunk.job_id, results=intake.encode(stored)
+            )
+
+        try:
+            _create([row for _, row in valid], pool, before_commit=store)
+        except IntegrityError:
+            # A worker whose lease on this chunk ran out committed it meanwhile
+            if not results.exists():
+                raise
+    intake.finish_chunk(chunk, "done", [])
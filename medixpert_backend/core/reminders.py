@@ -0,0 +1,97 @@
+import json
+import os
+import queue
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .models import REMINDER_DUE, HealthRecord
+
+
+class FileSink:
+    """Append reminder events as NDJSON lines to a local file"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, "a") as handle:
+            for event in events:
+                handle.write(json.dumps(event, cls=DjangoJSONEncoder) + "\n")
+            handle.flush()
+            # Records are marked reminded after send(); make sure events hit
+            # disk first
+            os.fsync(handle.fileno())
+
+
+class QueueSink:
+    """Put reminder events on an in-process queue (stand-in for a broker)"""
+
+    def __init__(self, maxsize=0):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def send(self, events):
+        for event in events:
+            self.queue.put(event)
+
+
+def get_sink():
+    config = getattr(
+        settings,
+        "FOLLOW_UP_SINK",
+        {"BACKEND": "core.reminders.FileSink", "OPTIONS": {"path": "reminders.ndjson"}},
+    )
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+def scan_due(alias, sink, horizon, since=None, batch_size=1000):
+    """
+    Emit an event for every untreated record due on or before horizon (and
+    on or after since, if given) that has not been reminded about its
+    current follow-up date, then mark it.
+
+    Records are marked after each batch has been sent, so a crash resends at
+    most that batch (events are delivered at least once). Records created
+    late, moved to an earlier date or rescheduled are all reminded; the
+    partial index on due records keeps the scan to those.
+    """
+    due = HealthRecord.objects.using(alias).filter(
+        REMINDER_DUE, follow_up_date__lte=horizon
+    )
+    if since is not None:
+        due = due.filter(follow_up_date__gte=since)
+    sent = 0
+    while True:
+        batch = list(
+            due.order_by("follow_up_date", "id").values(
+                "id",
+                "user_id",
+                "follow_up_date",
+                "prediction__predicted_disease__name",
+            )[:batch_size]
+        )
+        if not batch:
+            return sent
+        sink.send(
+            [
+                {
+                    "type": "follow_up_due",
+                    "health_record_id": row["id"],
+                    "user_id": row["user_id"],
+                    "follow_up_date": row["follow_up_date"],
+                    "disease": row["prediction__predicted_disease__name"],
+                }
+                for row in batch
+            ]
+        )
+        reminded = defaultdict(list)
+        for row in batch:
+            reminded[row["follow_up_date"]].append(row["id"])
+        for follow_up_date, ids in reminded.items():
+            # A record rescheduled meanwhile stays due for its new date
+            HealthRecord.objects.using(alias).filter(
+                pk__in=ids, follow_up_date=follow_up_date
+            ).update(reminded_for=follow_up_date)
+        sent += len(batch)
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+
+from .models import Disease, Symptom
+
+
+def _config(name, default):
+    return getattr(settings, "RETRAINING", {}).get(name, default)
+
+
+def settle_seconds():
+    """How long the catalog must stay unchanged before the worker retrains"""
+    return _config("SETTLE_SECONDS", 30)
+
+
+def current_fingerprint():
+    """catalog_fingerprint() of the catalog as it is in the database now"""
+    from ml_model import catalog_fingerprint
+
+    catalog = {
+        name: []
+        for name in Disease.objects.using("default").values_list("name", flat=True)
+    }
+    links = Disease.symptoms.through.objects.using("default").values_list(
+        "disease__name", "symptom__name"
+    )
+    for disease, symptom in links:
+        catalog[disease].append(symptom)
+    symptoms = Symptom.objects.using("default").values_list("name", flat=True)
+    return catalog_fingerprint(symptoms, catalog)
+
+
+def retrain(path=None, backend=None, force=False):
+    """
+    Retrain the model artifact at path if the catalog changed since it was
+    trained, and publish the new one in place for workers to reload.
+
+    A random forest trained on the same symptoms and diseases is grown by
+    WARM_START_TREES trees instead of retrained, until it reaches MAX_TREES.
+    Returns (outcome, seconds) with outcome "unchanged", "extended",
+    "trained" or "failed".
+    """
+    from ml_model import DiseasePredictor
+
+    started = time.perf_counter()
+    path = str(path or settings.MODEL_PATH)
+    previous = DiseasePredictor()
+    if not previous.load_model(path):
+        previous = None
+    elif not force and previous.catalog_fingerprint == current_fingerprint():
+        return "unchanged", time.perf_counter() - started
+
+    predictor = DiseasePredictor(backend or settings.MODEL_BACKEND)
+    extra_trees = _config("WARM_START_TREES", 25)
+    if previous is not None and (
+        force
+        or not hasattr(previous.model, "estimators_")
+        or len(previous.model.estimators_) + extra_trees > _config("MAX_TREES", 200)
+    ):
+        previous = None
+    if not predictor.train_model(previous=previous, extra_trees=extra_trees):
+        return "failed", time.perf_counter() - started
+    predictor.save_model(path)
+    outcome = "extended" if predictor.warm_started else "trained"
+    return outcome, time.perf_counter() - started
@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import HealthRecord
+from .sharding import user_data_aliases
+
+
+def _claimable(alias, now):
+    """Pending records nobody holds an unexpired lease on, oldest first"""
+    return (
+        HealthRecord.objects.using(alias)
+        .filter(status="pending")
+        .filter(Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+        .order_by("created_at", "pk")
+    )
+
+
+def _claim_on(alias, reviewer, count, now, expires_at):
+    if connections[alias].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=alias):
+            ids = list(
+                _claimable(alias, now)
+                .select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)[:count]
+            )
+            HealthRecord.objects.using(alias).filter(pk__in=ids).update(
+                reviewer=reviewer, lease_expires_at=expires_at
+            )
+        return ids
+
+    # No row locks (SQLite): the UPDATE repeats the claimable condition, so a
+    # row another reviewer took since we read it is skipped. Retry a few times
+    # to top the batch up after losing such races.
+    claimed = []
+    for _ in range(3):
+        candidates = list(
+            _claimable(alias, now)
+            .exclude(pk__in=claimed)
+            .values_list("pk", flat=True)[: count - len(claimed)]
+        )
+        if not candidates:
+            break
+        _claimable(alias, now).filter(pk__in=candidates).update(
+            reviewer=reviewer, lease_expires_at=expires_at
+        )
+        claimed += (
+            HealthRecord.objects.using(alias)
+            .filter(pk__in=candidates, reviewer=reviewer, lease_expires_at=expires_at)
+            .values_list("pk", flat=True)
+        )
+        if len(claimed) >= count:
+            break
+    return claimed
+
+
+def claim(reviewer, batch_size, lease_seconds=None):
+    """Lease up to batch_size pending records to a reviewer"""
+    if lease_seconds is None:
+        lease_seconds = getattr(settings, "REVIEW_LEASE_SECONDS", 900)
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    records = []
+    for alias in user_data_aliases():
+        remaining = batch_size - len(records)
+        if remaining <= 0:
+            break
+        ids = _claim_on(alias, reviewer, remaining, now, expires_at)
+        records += HealthRecord.objects.using(alias).filter(pk__in=ids)
+    return records
+
+
+def claimed_by(reviewer):
+    now = timezone.now()
+    records = []
+    for alias in user_data_aliases():
+        records += HealthRecord.objects.using(alias).filter(
+            reviewer=reviewer, lease_expires_at__gte=now, status="pending"
+        )
+    return records
+
+
+def _update_leased(holder, record_id, **changes):
+    """
+    Apply changes only while the holder still has the lease, so a reviewer
+    whose lease expired cannot overwrite the next reviewer's work.
+    """
+    now = timezone.now()
+    for alias in user_data_aliases():
+        updated = HealthRecord.objects.using(alias).filter(
+            pk=record_id, reviewer=holder, lease_expires_at__gte=now
+        ).update(**changes)
+        if updated:
+            return HealthRecord.objects.using(alias).get(pk=record_id)
+    return None
+
+
+def complete(reviewer, record_id, **changes):
+    """Record the review outcome and end the lease; None if not leased"""
+    return _update_leased(
+        reviewer,
+        record_id,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+        **changes,
+    )
+
+
+def release(reviewer, record_id):
+    """Hand a leased record back to the queue; None if not leased"""
+    return _update_leased(reviewer, record_id, reviewer=None, lease_expires_at=None)
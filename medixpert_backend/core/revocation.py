@@ -0,0 +1,156 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone as django_timezone
+
+from .models import RevokedToken
+
+DEFAULTS = {
+    "BUCKET_SECONDS": 6 * 60 * 60,
+    "BUCKET_CAPACITY": 250_000,
+    "ERROR_RATE": 0.001,
+    "SYNC_INTERVAL": 5,
+    "SYNC_OVERLAP": 60,
+}
+
+
+def _get_setting(name):
+    return getattr(settings, "TOKEN_REVOCATION", {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for a capacity and false positive rate"""
+
+    def __init__(self, capacity, error_rate):
+        # Standard optimal sizing: m = -n ln p / (ln 2)^2, k = m/n ln 2
+        ln2 = math.log(2)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (ln2 * ln2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * ln2))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+
+class RevocationStore:
+    """
+    Revoked refresh-token JTIs.
+
+    The durable record is the RevokedToken table. Each process keeps one Bloom
+    filter per expiry bucket so that checking a token that was never revoked
+    (the common case) costs no query. Filters are dropped with their bucket
+    once every token in it has expired, so memory is bounded by the refresh
+    token lifetime rather than by the number of revocations.
+    """
+
+    def __init__(self):
+        self.bucket_seconds = _get_setting("BUCKET_SECONDS")
+        self.capacity = _get_setting("BUCKET_CAPACITY")
+        self.error_rate = _get_setting("ERROR_RATE")
+        self.sync_interval = _get_setting("SYNC_INTERVAL")
+        self.sync_overlap = _get_setting("SYNC_OVERLAP")
+        self._filters = {}
+        self._watermark = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def bucket_for(self, exp):
+        return int(exp) // self.bucket_seconds
+
+    def current_bucket(self):
+        return self.bucket_for(time.time())
+
+    def _add_to_filter(self, jti, bucket):
+        bloom = self._filters.get(bucket)
+        if bloom is None:
+            bloom = self._filters[bucket] = BloomFilter(self.capacity, self.error_rate)
+        bloom.add(jti)
+
+    def sync(self, force=False):
+        """Pull revocations made by other processes since the last sync"""
+        now = time.monotonic()
+        if not force and self._synced_at is not None:
+            if now - self._synced_at < self.sync_interval:
+                return
+        with self._lock:
+            current = self.current_bucket()
+            started = django_timezone.now()
+            rows = RevokedToken.objects.filter(bucket__gte=current)
+            if self._watermark is not None:
+                # Rows are stamped before they commit, and concurrent logouts
+                # commit out of order, so re-read an overlap before the last
+                # sync; adding a token twice changes nothing
+                rows = rows.filter(
+                    created_at__gte=self._watermark
+                    - timedelta(seconds=self.sync_overlap)
+                )
+            for jti, bucket in rows.values_list("jti", "bucket").iterator(
+                chunk_size=10000
+            ):
+                self._add_to_filter(jti, bucket)
+            self._watermark = started
+            for bucket in [b for b in self._filters if b < current]:
+                del self._filters[bucket]
+            self._synced_at = now
+
+    def revoke(self, jti, exp):
+        """Revoke a token; returns False if it was already revoked"""
+        bucket = self.bucket_for(exp)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(
+                    jti=jti,
+                    bucket=bucket,
+                    expires_at=datetime.fromtimestamp(exp, tz=timezone.utc),
+                )
+            created = True
+        except IntegrityError:
+            created = False
+        with self._lock:
+            self._add_to_filter(jti, bucket)
+        return created
+
+    def is_revoked(self, jti, exp):
+        bucket = self.bucket_for(exp)
+        if bucket < self.current_bucket():
+            # The whole bucket has expired, so the token is rejected anyway
+            return False
+        self.sync()
+        bloom = self._filters.get(bucket)
+        if bloom is None or jti not in bloom:
+            return False
+        # Possible false positive; confirm against the durable table
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def purge_expired(self):
+        """Delete durable rows whose bucket has fully expired"""
+        deleted, _ = RevokedToken.objects.filter(
+            bucket__lt=self.current_bucket()
+        ).delete()
+        with self._lock:
+            for bucket in [b for b in self._filters if b < self.current_bucket()]:
+                del self._filters[bucket]
+        return deleted
+
+    def memory_usage(self):
+        return sum(len(bloom.bits) for bloom in self._filters.values())
+
+
+revocation_store = RevocationStore()
@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Symptom, Disease, UserProfile, Prediction, HealthRecord
+from django.conf import settings
+from django.db import transaction
+from .models import Symptom, Disease, UserProfile, Prediction, HealthRecord, IntakeJob
+from . import catalog
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,6 +26,33 @@ class DiseaseSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "description", "symptoms", "severity", "created_at"]
 
 
+class CachedDiseaseField(serializers.Field):
+    """DiseaseSerializer output for a disease id, from the catalog fragment cache"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return catalog.disease_fragment(value)
+
+
+class CachedSymptomsField(serializers.Field):
+    """SymptomSerializer output for a many-to-many, from the catalog fragment cache"""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, manager):
+        prefetched = getattr(manager.instance, "_prefetched_objects_cache", {})
+        if manager.prefetch_cache_name in prefetched:
+            ids = [symptom.pk for symptom in manager.all()]
+        else:
+            ids = manager.values_list("pk", flat=True)
+        return [catalog.symptom_fragment(pk) for pk in ids]
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -42,8 +72,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
 class PredictionSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    symptoms = SymptomSerializer(many=True, read_only=True)
-    predicted_disease = DiseaseSerializer(read_only=True)
+    symptoms = CachedSymptomsField()
+    predicted_disease = CachedDiseaseField(source="predicted_disease_id")
 
     class Meta:
         model = Prediction
@@ -73,9 +103,32 @@ class HealthRecordSerializer(serializers.ModelSerializer):
             "prescription",
             "follow_up_date",
             "status",
+            "diagnosis_confirmed",
             "created_at",
             "updated_at",
         ]
+        # The label replays score candidate models against: set by reviewers
+        # through the review queue only, never by the record's owner
+        read_only_fields = ["diagnosis_confirmed"]
+
+
+class ReviewClaimSerializer(serializers.Serializer):
+    batch_size = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    lease_seconds = serializers.IntegerField(min_value=30, required=False)
+
+
+class ReviewCompletionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(
+        choices=[
+            choice
+            for choice in HealthRecord._meta.get_field("status").choices
+            if choice[0] != "pending"
+        ]
+    )
+    doctor_notes = serializers.CharField(required=False, allow_blank=True)
+    prescription = serializers.CharField(required=False, allow_blank=True)
+    follow_up_date = serializers.DateField(required=False, allow_null=True)
+    diagnosis_confirmed = serializers.BooleanField(required=False, allow_null=True)
 
 
 class PredictionCreateSerializer(serializers.Serializer):
@@ -84,6 +137,58 @@ class PredictionCreateSerializer(serializers.Serializer):
     notes = serializers.CharField(required=False, allow_blank=True)
 
 
+class SymptomSuggestionSerializer(serializers.Serializer):
+    symptoms = serializers.ListField(child=serializers.CharField(), allow_empty=True)
+    absent_symptoms = serializers.ListField(
+        child=serializers.CharField(), required=False, default=list
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=5)
+
+
+class BulkProvisionSerializer(serializers.Serializer):
+    # Rows are validated one by one by core.provisioning.PatientSerializer
+    patients = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+    # Rows per job chunk; at about half a second per password hash, a chunk
+    # must finish well within the intake lease
+    chunk_size = serializers.IntegerField(min_value=1, max_value=250, default=100)
+
+    def validate_patients(self, value):
+        limit = getattr(settings, "PROVISIONING_MAX_ROWS", 10000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} patients per request")
+        return value
+
+
+class IntakeUploadSerializer(serializers.Serializer):
+    # CSV with username and symptoms (";"-separated) columns, optionally
+    # additional_symptoms and notes
+    file = serializers.FileField()
+
+
+class IntakeJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = IntakeJob
+        fields = [
+            "id",
+            "kind",
+            "filename",
+            "status",
+            "total_rows",
+            "processed_rows",
+            "created_predictions",
+            "failed_rows",
+            "progress",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def get_progress(self, obj):
+        return round(obj.processed_rows / obj.total_rows, 4) if obj.total_rows else 0.0
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
@@ -106,6 +211,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop("password_confirm")
-        user = User.objects.create_user(**validated_data)
-        UserProfile.objects.create(user=user)
+        # Never leave a user behind without their profile
+        with transaction.atomic():
+            user = User.objects.create_user(**validated_data)
+            UserProfile.objects.create(user=user)
         return user
@@ -0,0 +1,175 @@
+import copy
+
+from django.conf import settings
+
+from .cache import TTLCache
+
+# Models whose rows belong to exactly one user and live on that user's shard,
+# plus intake results, which sit next to the predictions they list
+SHARDED_MODELS = {
+    "prediction",
+    "healthrecord",
+    "prediction_symptoms",
+    "predictionarchivesegment",
+    "intakeresult",
+}
+# Shared catalog tables copied to every shard
+CATALOG_MODELS = {"symptom", "disease", "disease_symptoms"}
+
+_assignments = TTLCache(ttl=getattr(settings, "SHARD_MAP_CACHE_TTL", 30))
+
+
+def shard_aliases():
+    return getattr(settings, "DATABASE_SHARDS", [])
+
+
+def user_data_aliases():
+    """Every database that can hold per-user rows"""
+    return shard_aliases() or ["default"]
+
+
+def shard_for_user(user_id):
+    """Database alias holding a user's predictions, or None when unsharded"""
+    shards = shard_aliases()
+    if not shards:
+        return None
+    alias = _assignments.get(user_id)
+    if alias is None:
+        from .models import ShardAssignment
+
+        # Placement is persisted on first use, so adding shards later never
+        # silently moves existing users; rebalance_shards moves them.
+        assignment, _ = ShardAssignment.objects.using("default").get_or_create(
+            user_id=user_id, defaults={"shard": shards[user_id % len(shards)]}
+        )
+        alias = assignment.shard
+        _assignments.set(user_id, alias)
+    return alias
+
+
+def forget_assignment(user_id):
+    _assignments.delete(user_id)
+
+
+def user_queryset(model, user):
+    """A model's rows for one user, read from that user's shard when sharded"""
+    alias = shard_for_user(user.pk)
+    manager = model.objects.using(alias) if alias else model.objects
+    return manager.filter(user=user)
+
+
+def user_manager(model, user):
+    """Manager to create a user's rows with, bound to their shard if sharded"""
+    alias = shard_for_user(user.pk)
+    return model.objects.db_manager(alias) if alias else model.objects
+
+
+def replicate_instance(instance, aliases):
+    """Upsert a copy of a default-database row into other databases"""
+    for alias in aliases:
+        # Saving a copy keeps the caller's instance bound to "default"
+        copy.copy(instance).save(using=alias)
+
+
+def replicate_disease_symptoms(disease, aliases):
+    through = disease.symptoms.through
+    symptom_ids = list(
+        through.objects.using("default")
+        .filter(disease_id=disease.pk)
+        .values_list("symptom_id", flat=True)
+    )
+    for alias in aliases:
+        through.objects.using(alias).filter(disease_id=disease.pk).delete()
+        through.objects.using(alias).bulk_create(
+            [through(disease_id=disease.pk, symptom_id=sid) for sid in symptom_ids]
+        )
+
+
+def seed_id_ranges(alias, index):
+    """
+    Start a shard's per-user id sequences in their own range.
+
+    Shard N allocates ids from N * 10**12, so ids stay unique across shards
+    and rows can move between shards without renumbering.
+    """
+    from django.db import connections
+
+    from .models import HealthRecord, Prediction
+
+    start = index * 10**12
+    tables = [
+        Prediction._meta.db_table,
+        HealthRecord._meta.db_table,
+        Prediction.symptoms.through._meta.db_table,
+    ]
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for table in tables:
+            if connection.vendor == "sqlite":
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", [table])
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) "
+                    "SELECT %s, MAX(COALESCE((SELECT MAX(id) FROM "
+                    + connection.ops.quote_name(table)
+                    + "), 0), %s)",
+                    [table, start],
+                )
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    "GREATEST((SELECT COALESCE(MAX(id), 0) FROM "
+                    + connection.ops.quote_name(table)
+                    + "), %s))",
+                    [table, start],
+                )
+
+
+def copy_user_rows(user_id, source, target, batch_size=1000):
+    """Copy a user's predictions, health records and archive between databases"""
+    from django.contrib.auth.models import User
+    from django.db import transaction
+
+    from .models import HealthRecord, Prediction, PredictionArchiveSegment
+
+    replicate_instance(User.objects.using(source).get(pk=user_id), [target])
+    through = Prediction.symptoms.through
+    copied = 0
+    for model in (Prediction, HealthRecord, PredictionArchiveSegment):
+        last_pk = 0
+        while True:
+            batch = list(
+                model.objects.using(source)
+                .filter(user_id=user_id, pk__gt=last_pk)
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic(using=target):
+                for obj in batch:
+                    # raw saves keep the original timestamps and primary keys
+                    obj.save_base(raw=True, using=target)
+                if model is Prediction:
+                    links = through.objects.using(source).filter(
+                        prediction_id__in=[obj.pk for obj in batch]
+                    )
+                    through.objects.using(target).bulk_create(
+                        [
+                            through(prediction_id=p, symptom_id=s)
+                            for p, s in links.values_list("prediction_id", "symptom_id")
+                        ],
+                        ignore_conflicts=True,
+                    )
+            copied += len(batch)
+            last_pk = batch[-1].pk
+    return copied
+
+
+def delete_user_rows(user_id, alias):
+    from .analytics import suspend_rollups
+    from .models import Prediction, PredictionArchiveSegment
+
+    # Health records cascade from their prediction; the rows still exist on
+    # the target shard, so incidence counts stay as they are
+    with suspend_rollups():
+        Prediction.objects.using(alias).filter(user_id=user_id).delete()
+    PredictionArchiveSegment.objects.using(alias).filter(user_id=user_id).delete()
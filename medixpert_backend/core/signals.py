@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .analytics import record_prediction, rollup_mode, rollups_suspended
+from .authentication import invalidate_user
+from .catalog import bump_version
+from .models import Disease, Prediction, Symptom
+from .sharding import (
+    replicate_disease_symptoms,
+    replicate_instance,
+    shard_aliases,
+    shard_for_user,
+)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, using, created=False, **kwargs):
+    """Keep cached users and token claims in step with the User table"""
+    # A new user has no earlier tokens to distrust; shard copies follow the
+    # change already recorded for the default database
+    if not created and using == "default":
+        invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def replicate_user(sender, instance, using, **kwargs):
+    """Copy the user row to their shard so per-user foreign keys resolve"""
+    if using != "default":
+        return
+    alias = shard_for_user(instance.pk)
+    if alias:
+        replicate_instance(instance, [alias])
+
+
+@receiver(post_delete, sender=User)
+def delete_sharded_user(sender, instance, using, **kwargs):
+    if using != "default":
+        return
+    alias = shard_for_user(instance.pk)
+    if alias:
+        User.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Symptom)
+@receiver(post_save, sender=Disease)
+def replicate_catalog_row(sender, instance, using, **kwargs):
+    if using == "default" and shard_aliases():
+        replicate_instance(instance, shard_aliases())
+
+
+@receiver(post_delete, sender=Symptom)
+@receiver(post_delete, sender=Disease)
+def delete_catalog_row(sender, instance, using, **kwargs):
+    if using != "default":
+        return
+    for alias in shard_aliases():
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(m2m_changed, sender=Disease.symptoms.through)
+def replicate_catalog_links(sender, instance, action, using, **kwargs):
+    if using != "default" or not action.startswith("post_") or not shard_aliases():
+        return
+    if isinstance(instance, Disease):
+        diseases = [instance]
+    else:
+        # Changed from the symptom side; the catalog is small, resync it all
+        diseases = Disease.objects.using("default")
+    for disease in diseases:
+        replicate_disease_symptoms(disease, shard_aliases())
+
+
+@receiver(post_save, sender=Symptom)
+@receiver(post_save, sender=Disease)
+@receiver(post_delete, sender=Symptom)
+@receiver(post_delete, sender=Disease)
+@receiver(m2m_changed, sender=Disease.symptoms.through)
+def invalidate_catalog_fragments(sender, using, action="post_", raw=False, **kwargs):
+    """Bump the catalog version so serializers re-render cached fragments"""
+    if using == "default" and not raw and action.startswith("post_"):
+        bump_version()
+
+
+@receiver(post_save, sender=Prediction)
+def count_created_prediction(sender, instance, created, raw, **kwargs):
+    # raw saves are fixture loads and shard moves of already counted rows
+    if created and not raw and rollup_mode() == "incremental":
+        record_prediction(instance, +1)
+
+
+@receiver(post_delete, sender=Prediction)
+def count_deleted_prediction(sender, instance, **kwargs):
+    if rollup_mode() == "incremental" and not rollups_suspended():
+        record_prediction(instance, -1)
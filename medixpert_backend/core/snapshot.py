@@ -0,0 +1,243 @@
+import glob
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from . import catalog
+from .models import Disease, Symptom
+
+MAGIC = b"MXCATSNP"
+ALIGN = 64
+
+# Chance a patient reports a symptom their disease lists, and one it doesn't
+P_LISTED = 0.9
+P_UNLISTED = 0.02
+
+_current = None
+_lock = threading.Lock()
+
+
+def snapshot_dir():
+    configured = getattr(settings, "CATALOG_SNAPSHOT_DIR", None)
+    if configured:
+        return str(configured)
+    # On tmpfs the mapped pages are plain shared memory
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "medixpert-catalog")
+
+
+def _prefix():
+    # Deployments and scratch databases on one host may share the directory
+    name = str(settings.DATABASES["default"]["NAME"])
+    return hashlib.sha256(name.encode()).hexdigest()[:12]
+
+
+def snapshot_path(stamp):
+    # The token keeps a recreated or rolled-back database, whose version
+    # number repeats, from attaching to a file of another catalog
+    version, token = stamp
+    return os.path.join(snapshot_dir(), f"{_prefix()}-{version}-{token}.snap")
+
+
+def _strings(values):
+    encoded = [value.encode("utf-8") for value in values]
+    return np.array(encoded, dtype=f"S{max(map(len, encoded), default=0) or 1}")
+
+
+def _arrays():
+    """Every array of a snapshot, built from the database"""
+    symptoms = list(
+        Symptom.objects.using("default").order_by("name").values_list("pk", "name")
+    )
+    diseases = list(
+        Disease.objects.using("default")
+        .order_by("name")
+        .values_list("pk", "name", "severity")
+    )
+    column = {pk: i for i, (pk, _) in enumerate(symptoms)}
+    row = {pk: i for i, (pk, _, _) in enumerate(diseases)}
+
+    incidence = np.zeros((len(diseases), len(symptoms)), dtype=bool)
+    for disease_id, symptom_id in Disease.symptoms.through.objects.using(
+        "default"
+    ).values_list("disease_id", "symptom_id"):
+        incidence[row[disease_id], column[symptom_id]] = True
+    likelihood = np.where(incidence, P_LISTED, P_UNLISTED)
+
+    arrays = {
+        "symptom_ids": np.array([pk for pk, _ in symptoms], dtype=np.int64),
+        "symptom_names": _strings(name for _, name in symptoms),
+        "symptom_keys": _strings(name.lower().strip() for _, name in symptoms),
+        "disease_ids": np.array([pk for pk, _, _ in diseases], dtype=np.int64),
+        "disease_names": _strings(name for _, name, _ in diseases),
+        "disease_severities": _strings(severity for _, _, severity in diseases),
+        "incidence": incidence,
+        # Symptoms each disease lists, and symptoms no disease lists (which
+        # carry no information)
+        "listed": incidence.sum(axis=1),
+        "informative": incidence.any(axis=0),
+        # log P(reported | disease) and log P(not reported | disease)
+        "log_yes": np.log(likelihood),
+        "log_no": np.log1p(-likelihood),
+    }
+    # Sorted copies and their positions, for binary-searched name lookups
+    for name in ("symptom_names", "symptom_keys", "disease_names"):
+        order = np.argsort(arrays[name], kind="stable")
+        arrays[f"{name}_sorted"] = arrays[name][order]
+        arrays[f"{name}_order"] = order.astype(np.int32)
+    return arrays
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def publish(stamp):
+    """
+    Build the snapshot of a catalog stamp (see catalog.current_stamp) and
+    move it into place.
+
+    Workers racing to publish the same version write identical files, and
+    the rename makes whichever lands last visible whole.
+    """
+    arrays = {name: np.ascontiguousarray(a) for name, a in _arrays().items()}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += array.nbytes
+    version, token = stamp
+    header = json.dumps({"version": version, "token": token, "arrays": layout}).encode()
+    start = _aligned(len(MAGIC) + 8 + len(header))
+
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+            for name, array in arrays.items():
+                f.seek(start + layout[name][2])
+                f.write(array.tobytes())
+            # Empty arrays still need their (aligned) offsets inside the file
+            f.truncate(start + _aligned(offset))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, snapshot_path(stamp))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    # Keep the previous version for workers still within their version TTL
+    # and drop everything else, including files left behind by a rollback;
+    # files that are still mapped stay readable after the unlink
+    current = snapshot_path(stamp)
+    for path in glob.glob(os.path.join(directory, f"{_prefix()}-*.snap")):
+        old = os.path.basename(path)[len(_prefix()) + 1 : -len(".snap")]
+        old_version = old.split("-")[0]
+        if path != current and old_version != str(version - 1):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class CatalogSnapshot:
+    """
+    One catalog version, memory-mapped read-only from a snapshot file.
+
+    Every array is a zero-copy view of the mapping, so all workers on a host
+    share one copy in the page cache. Columns are symptoms and rows are
+    diseases, both in name order: symptom_ids, symptom_names, symptom_keys
+    (lowercased, stripped), disease_ids, disease_names, disease_severities,
+    incidence (diseases x symptoms), listed, informative, log_yes, log_no.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a catalog snapshot: {path}")
+        size = int.from_bytes(self._map[len(MAGIC) : len(MAGIC) + 8], "little")
+        header = json.loads(self._map[len(MAGIC) + 8 : len(MAGIC) + 8 + size])
+        start = _aligned(len(MAGIC) + 8 + size)
+        self.version = header["version"]
+        self.token = header.get("token", "")
+        self.stamp = (self.version, self.token)
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            array = np.frombuffer(
+                self._map,
+                dtype=dtype,
+                count=int(np.prod(shape)),
+                offset=start + offset,
+            )
+            setattr(self, name, array.reshape(shape))
+
+    def _positions(self, name, value):
+        """Positions of the entries of array name equal to value"""
+        keys = getattr(self, f"{name}_sorted")
+        value = value.encode("utf-8")
+        low = np.searchsorted(keys, value, "left")
+        high = np.searchsorted(keys, value, "right")
+        return getattr(self, f"{name}_order")[low:high].tolist()
+
+    def columns(self, names):
+        """Symptom columns for names, ignoring case and surrounding spaces"""
+        return [
+            i
+            for name in names
+            for i in self._positions("symptom_keys", name.lower().strip())
+        ]
+
+    def exact_columns(self, names):
+        """Symptom columns for names spelled exactly as in the catalog"""
+        return [
+            i
+            for name in dict.fromkeys(names)
+            for i in self._positions("symptom_names", name)
+        ]
+
+    def symptom_ids_for(self, names):
+        return self.symptom_ids[self.exact_columns(names)].tolist()
+
+    def disease_row(self, name):
+        rows = self._positions("disease_names", name) if name is not None else []
+        return rows[0] if rows else None
+
+    def symptom_name(self, column):
+        return self.symptom_names[column].decode("utf-8")
+
+    def disease_name(self, row):
+        return self.disease_names[row].decode("utf-8")
+
+    def disease_severity(self, row):
+        return self.disease_severities[row].decode("utf-8")
+
+
+def current():
+    """
+    The snapshot of the current catalog. The first worker to need a catalog
+    stamp builds and publishes it; the rest attach to the file. Callers
+    holding the previous snapshot keep a consistent view of it.
+    """
+    global _current
+    stamp = catalog.current_stamp()
+    snapshot = _current
+    if snapshot is not None and snapshot.stamp == stamp:
+        return snapshot
+    with _lock:
+        snapshot = _current
+        if snapshot is None or snapshot.stamp != stamp:
+            path = snapshot_path(stamp)
+            try:
+                snapshot = CatalogSnapshot(path)
+            except (FileNotFoundError, ValueError):
+                publish(stamp)
+                snapshot = CatalogSnapshot(path)
+            _current = snapshot
+    return snapshot
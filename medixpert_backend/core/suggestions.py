@@ -0,0 +1,75 @@
+import numpy as np
+
+from . import snapshot
+
+
+def _entropy(p, axis=0):
+    return -(p * np.log2(np.where(p > 0, p, 1))).sum(axis=axis)
+
+
+def suggest_symptoms(present, absent=(), limit=5):
+    """
+    Rank unasked symptoms by expected information gain about the disease.
+
+    The posterior over diseases given the reported and denied symptoms is a
+    sum of precomputed log likelihoods. For every candidate symptom at once,
+    the expected posterior entropy after asking about it is
+    P(yes) H(posterior | yes) + P(no) H(posterior | no).
+    """
+    t = snapshot.current()
+    # Repeating a symptom, in any spelling, must not count it twice; one both
+    # reported and denied counts as reported
+    present_columns = list(dict.fromkeys(t.columns(present)))
+    absent_columns = [
+        i for i in dict.fromkeys(t.columns(absent)) if i not in present_columns
+    ]
+    unknown = [
+        name for name in dict.fromkeys([*present, *absent]) if not t.columns([name])
+    ]
+    if not len(t.disease_ids):
+        return {
+            "suggestions": [],
+            "entropy": 0.0,
+            "likely_diseases": [],
+            "unknown_symptoms": unknown,
+        }
+
+    log_posterior = t.log_yes[:, present_columns].sum(axis=1)
+    log_posterior += t.log_no[:, absent_columns].sum(axis=1)
+    posterior = np.exp(log_posterior - log_posterior.max())
+    posterior /= posterior.sum()
+
+    # diseases x candidates: joint probability of each disease and answer
+    joint_yes = posterior[:, None] * np.exp(t.log_yes)
+    joint_no = posterior[:, None] - joint_yes
+    p_yes = joint_yes.sum(axis=0)
+    p_no = 1 - p_yes
+    expected = p_yes * _entropy(joint_yes / p_yes) + p_no * _entropy(joint_no / p_no)
+    entropy = _entropy(posterior)
+    gain = entropy - expected
+
+    candidates = t.informative.copy()
+    candidates[present_columns + absent_columns] = False
+    order = np.flatnonzero(candidates)
+    order = order[np.argsort(-gain[order], kind="stable")][:limit]
+
+    top = np.argsort(-posterior)[:3]
+    return {
+        "suggestions": [
+            {
+                "symptom": t.symptom_name(i),
+                "information_gain": round(float(gain[i]), 4),
+                "probability": round(float(p_yes[i]), 4),
+            }
+            for i in order
+        ],
+        "entropy": round(float(entropy), 4),
+        "likely_diseases": [
+            {
+                "disease": t.disease_name(i),
+                "probability": round(float(posterior[i]), 4),
+            }
+            for i in top
+        ],
+        "unknown_symptoms": unknown,
+    }
@@ -0,0 +1,1382 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from ml_model import (
+    BernoulliNBBackend,
+    DiseasePredictor,
+    JaccardNeighborBackend,
+    catalog_fingerprint,
+)
+
+from . import admin as core_admin
+from . import (
+    archive,
+    authentication,
+    catalog,
+    idempotency,
+    intake,
+    provisioning,
+    review_queue,
+    sharding,
+    snapshot,
+    throttling,
+    warmup,
+)
+from .management.commands.replay_predictions import _history, bounded_map
+from .reminders import QueueSink, scan_due
+from .authentication import get_tokens_for_user
+from .compression import CompressionMiddleware, negotiate
+from .db_routers import _use_primary, pin_if_recent_writer, record_write
+from .idempotency import idempotent
+from .models import (
+    CatalogVersion,
+    Disease,
+    DiseaseIncidenceRollup,
+    HealthRecord,
+    IntakeChunk,
+    IntakeJob,
+    Prediction,
+    RevokedToken,
+    Symptom,
+    UserProfile,
+)
+from .retraining import current_fingerprint, retrain
+from .serializers import DiseaseSerializer, PredictionSerializer, SymptomSerializer
+from .revocation import BloomFilter, RevocationStore
+from .suggestions import suggest_symptoms
+
+
+def as_another_process():
+    """Forget what this process learned locally, like a different worker"""
+    authentication._invalidated.clear()
+    authentication._user_cache.clear()
+    authentication._sync.update(at=None, watermark=None)
+
+
+class ClaimInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            "clinician", password="unused-password", is_staff=True
+        )
+        access = get_tokens_for_user(self.user).access_token
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_unchanged_user_is_built_from_claims(self):
+        with self.assertNumQueries(1):
+            # Only the sync of user changes; no User lookup
+            authentication.sync_invalidations(force=True)
+        response = self.client.get("/api/dashboard/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_reaches_other_processes(self):
+        self.assertEqual(self.client.get("/api/dashboard/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        as_another_process()
+        self.assertEqual(self.client.get("/api/dashboard/").status_code, 401)
+
+    def test_revoked_staff_flag_reaches_other_processes(self):
+        self.assertEqual(self.client.get("/api/analytics/").status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        as_another_process()
+        self.assertEqual(self.client.get("/api/analytics/").status_code, 403)
+
+    def test_deleted_user_claims_are_not_trusted(self):
+        self.user.delete()
+        as_another_process()
+        self.assertEqual(self.client.get("/api/dashboard/").status_code, 401)
+
+    def test_new_tokens_are_trusted_again(self):
+        self.user.first_name = "Ada"
+        self.user.save()
+        access = get_tokens_for_user(self.user).access_token
+        # iat has one second resolution
+        access["iat"] += 1
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        as_another_process()
+        authentication.sync_invalidations(force=True)
+        with self.assertNumQueries(0):
+            user = authentication.CachedJWTAuthentication().get_user_from_claims(access)
+        self.assertEqual(user.first_name, "Ada")
+
+
+class RevocationStoreTests(TestCase):
+    def setUp(self):
+        self.store = RevocationStore()
+        self.exp = time.time() + 3600
+
+    def test_unrevoked_token_check_runs_no_query(self):
+        self.store.revoke("revoked", self.exp)
+        self.store.sync(force=True)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.store.is_revoked("never-revoked", self.exp))
+        self.assertTrue(self.store.is_revoked("revoked", self.exp))
+
+    def test_filter_size_and_probes_are_fixed_at_millions_of_revocations(self):
+        bloom = BloomFilter(capacity=2_000_000, error_rate=0.001)
+        size = len(bloom.bits)
+        probes = len(list(bloom._positions("sample")))
+        for i in range(2_000_000):
+            bloom.add(f"jti-{i}")
+        self.assertEqual(len(bloom.bits), size)
+        self.assertLess(size, 4 * 1024 * 1024)
+        # A check hashes once and probes the same bits however full it is
+        self.assertEqual(len(list(bloom._positions("sample"))), probes)
+        self.assertTrue(all(f"jti-{i}" in bloom for i in range(0, 2_000_000, 997)))
+        false_positives = sum(f"other-{i}" in bloom for i in range(100_000))
+        self.assertLess(false_positives / 100_000, 0.002)
+
+    def test_memory_is_released_with_expired_buckets(self):
+        self.store.revoke("live", self.exp)
+        live = self.store.memory_usage()
+        self.store.revoke("expired", time.time() - 2 * self.store.bucket_seconds)
+        self.assertEqual(self.store.memory_usage(), 2 * live)
+        self.store.sync(force=True)
+        self.assertEqual(self.store.memory_usage(), live)
+
+    def test_revocation_committed_out_of_id_order_is_synced(self):
+        later = RevokedToken.objects.create(
+            id=100,
+            jti="later",
+            bucket=self.store.bucket_for(self.exp),
+            expires_at=datetime.fromtimestamp(self.exp, tz=timezone.utc),
+        )
+        self.store.sync(force=True)
+        # Another process's logout took a lower id but committed afterwards
+        RevokedToken.objects.create(
+            id=later.id - 1,
+            jti="earlier",
+            bucket=later.bucket,
+            expires_at=later.expires_at,
+        )
+        self.store.sync(force=True)
+        self.assertTrue(self.store.is_revoked("earlier", self.exp))
+
+
+@override_settings(DATABASE_REPLICAS=["default"])
+class ReplicaStickinessTests(TestCase):
+    def test_recent_write_is_seen_by_every_worker(self):
+        record_write(42)
+        # Stored in the shared cache table, not in this process
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT cache_key FROM medixpert_cache")
+            self.assertIn(":1:primary-pin:42", [key for key, in cursor.fetchall()])
+        token = _use_primary.set(False)
+        try:
+            pin_if_recent_writer(42)
+            self.assertTrue(_use_primary.get())
+            _use_primary.set(False)
+            pin_if_recent_writer(7)
+            self.assertFalse(_use_primary.get())
+        finally:
+            _use_primary.reset(token)
+
+
+SHARDS = ["shard1", "shard2"]
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TransactionTestCase):
+    """Against two SQLite shards set up for these tests alone"""
+
+    # Resolved once the shards are registered in setUpClass; the test runner
+    # would reject aliases it does not know yet
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        for alias in SHARDS:
+            connections.settings[alias] = connections.configure_settings(
+                {
+                    "default": {},
+                    alias: {
+                        "ENGINE": "django.db.backends.sqlite3",
+                        "NAME": os.path.join(directory.name, f"{alias}.sqlite3"),
+                    },
+                }
+            )[alias]
+            cls.addClassCleanup(cls.remove_alias, alias)
+        super().setUpClass()
+        for alias in SHARDS:
+            call_command("migrate", database=alias, verbosity=0)
+
+    @classmethod
+    def remove_alias(cls, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def setUp(self):
+        sharding._assignments.clear()
+        self.addCleanup(sharding._assignments.clear)
+        self.disease = Disease.objects.create(name="flu", description="")
+
+    def predict(self, user):
+        return sharding.user_manager(Prediction, user).create(
+            user=user, predicted_disease=self.disease, confidence_score=50
+        )
+
+    def test_users_and_catalog_are_replicated(self):
+        first, second = (User.objects.create_user(f"patient{i}") for i in (1, 2))
+        home = {user: sharding.shard_for_user(user.pk) for user in (first, second)}
+        self.assertEqual(set(home.values()), set(SHARDS))
+        for user, alias in home.items():
+            self.assertTrue(User.objects.using(alias).filter(pk=user.pk).exists())
+            other = next(a for a in SHARDS if a != alias)
+            self.assertFalse(User.objects.using(other).filter(pk=user.pk).exists())
+        for alias in SHARDS:
+            self.assertTrue(Disease.objects.using(alias).filter(name="flu").exists())
+
+    def test_user_rows_are_written_and_read_on_their_shard(self):
+        user = User.objects.create_user("patient")
+        alias = sharding.shard_for_user(user.pk)
+        sharding.seed_id_ranges(alias, SHARDS.index(alias) + 1)
+        prediction = self.predict(user)
+        self.assertEqual(prediction._state.db, alias)
+        self.assertGreaterEqual(prediction.pk, (SHARDS.index(alias) + 1) * 10**12)
+        HealthRecord.objects.using(alias).create(user=user, prediction=prediction)
+
+        predictions = sharding.user_queryset(Prediction, user)
+        self.assertEqual(predictions.db, alias)
+        self.assertEqual(list(predictions), [prediction])
+        self.assertFalse(Prediction.objects.using("default").exists())
+        # Related objects are followed on the shard the instance came from
+        record = sharding.user_queryset(HealthRecord, user).get()
+        self.assertEqual(record.prediction.pk, prediction.pk)
+        self.assertEqual(record.prediction.predicted_disease.name, "flu")
+
+    def test_rebalance_moves_a_users_rows(self):
+        user = User.objects.create_user("patient")
+        source = sharding.shard_for_user(user.pk)
+        target = next(alias for alias in SHARDS if alias != source)
+        prediction = self.predict(user)
+        # Created on default, so replicated to every shard
+        prediction.symptoms.set([Symptom.objects.create(name="Night sweats")])
+        HealthRecord.objects.using(source).create(user=user, prediction=prediction)
+
+        call_command(
+            "rebalance_shards",
+            user=[user.pk],
+            to=target,
+            settle=0,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(sharding.shard_for_user(user.pk), target)
+        self.assertFalse(Prediction.objects.using(source).exists())
+        self.assertFalse(HealthRecord.objects.using(source).exists())
+        moved = sharding.user_queryset(Prediction, user).get()
+        self.assertEqual(moved.pk, prediction.pk)
+        self.assertEqual([s.name for s in moved.symptoms.all()], ["Night sweats"])
+        self.assertTrue(
+            sharding.user_queryset(HealthRecord, user)
+            .filter(prediction_id=prediction.pk)
+            .exists()
+        )
+
+
+class IncidenceRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("patient")
+        self.disease = Disease.objects.create(name="flu", description="")
+
+    def predict(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Prediction.objects.create(
+                user=self.user, predicted_disease=self.disease, confidence_score=50
+            )
+
+    def day_counts(self):
+        return dict(
+            DiseaseIncidenceRollup.objects.filter(period="day").values_list(
+                "age_band", "count"
+            )
+        )
+
+    def test_profile_changes_count_at_once(self):
+        self.predict()
+        # Bulk writes, as another worker or a provisioning batch would make
+        UserProfile.objects.bulk_create([UserProfile(user=self.user, age=35)])
+        self.predict()
+        self.assertEqual(self.day_counts(), {"": 1, "30-44": 1})
+        UserProfile.objects.filter(user=self.user).update(age=70)
+        self.predict()
+        UserProfile.objects.filter(user=self.user).delete()
+        self.predict()
+        self.assertEqual(self.day_counts(), {"": 2, "30-44": 1, "65+": 1})
+
+    def test_severity_change_keeps_counting(self):
+        self.predict()
+        self.disease.severity = "high"
+        self.disease.save()
+        self.predict()
+        self.assertEqual(self.day_counts(), {"": 2})
+        client = APIClient(SERVER_NAME="localhost")
+        client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        response = client.get("/api/analytics/", {"group_by": "severity"})
+        self.assertEqual(
+            [(row["severity"], row["count"]) for row in response.data["results"]],
+            [("high", 2)],
+        )
+
+
+class ExportStreamingTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("exporter")
+        disease = Disease.objects.create(name="flu", description="")
+        Prediction.objects.bulk_create(
+            Prediction(user=user, predicted_disease=disease, confidence_score=i)
+            for i in range(250)
+        )
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(user)
+
+    def test_csv_header_is_sent_before_any_query(self):
+        response = self.client.get("/api/predictions/export/?export_format=csv")
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            header = next(chunks)
+        self.assertEqual(
+            header,
+            b"id,timestamp,predicted_disease,severity,"
+            b"confidence_score,symptoms,additional_symptoms,notes\r\n",
+        )
+        self.assertEqual(b"".join(chunks).count(b"\r\n"), 250)
+
+    def test_each_gzip_chunk_decompresses_on_arrival(self):
+        response = self.client.get(
+            "/api/predictions/export/", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        decompressor = zlib.decompressobj(31)
+        chunks = iter(response.streaming_content)
+        first = decompressor.decompress(next(chunks))
+        # The first row alone, complete, without waiting for a batch
+        self.assertEqual(first.count(b"\n"), 1)
+        second = decompressor.decompress(next(chunks))
+        self.assertEqual(second.count(b"\n"), 100)
+        rest = b"".join(decompressor.decompress(chunk) for chunk in chunks)
+        self.assertEqual((first + second + rest).count(b"\n"), 250)
+
+    def test_gzip_is_used_only_when_acceptable(self):
+        for accept_encoding, expected in [
+            ("gzip;q=0", None),
+            ("identity, gzip;q=0.0", None),
+            ("br, gzip;q=0.5", "gzip"),
+            ("*", "gzip"),
+        ]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get(
+                    "/api/predictions/export/", HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertEqual(response.get("Content-Encoding"), expected)
+
+
+def run_threads(count, target):
+    """Run target(index) in count threads, each with its own connections"""
+    errors = []
+
+    def run(index):
+        try:
+            target(index)
+        except Exception as exc:  # pragma: no cover - reported below
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+class ReviewQueueTests(TransactionTestCase):
+    def setUp(self):
+        patient = User.objects.create_user("patient")
+        disease = Disease.objects.create(name="flu", description="")
+        predictions = Prediction.objects.bulk_create(
+            Prediction(user=patient, predicted_disease=disease, confidence_score=50)
+            for _ in range(200)
+        )
+        HealthRecord.objects.bulk_create(
+            HealthRecord(user=patient, prediction=prediction)
+            for prediction in predictions
+        )
+        self.reviewers = [
+            User.objects.create_user(f"reviewer{i}", is_staff=True) for i in range(8)
+        ]
+
+    def test_concurrent_reviewers_never_claim_the_same_record(self):
+        claimed = [[] for _ in self.reviewers]
+
+        def review(index):
+            reviewer = self.reviewers[index]
+            while True:
+                records = review_queue.claim(reviewer, batch_size=5)
+                if not records:
+                    return
+                for record in records:
+                    claimed[index].append(record.pk)
+                    done = review_queue.complete(reviewer, record.pk, status="reviewed")
+                    self.assertIsNotNone(done)
+
+        started = time.perf_counter()
+        run_threads(len(self.reviewers), review)
+        elapsed = time.perf_counter() - started
+        every = [pk for ids in claimed for pk in ids]
+        self.assertEqual(len(every), len(set(every)))
+        self.assertEqual(
+            set(every), set(HealthRecord.objects.values_list("pk", flat=True))
+        )
+        self.assertFalse(HealthRecord.objects.filter(status="pending").exists())
+        # Claims are short writes; 200 reviews by 8 reviewers take well under
+        # a second here
+        self.assertLess(elapsed, 20)
+
+    def test_expired_lease_returns_records_to_the_queue(self):
+        first, second = self.reviewers[:2]
+        held = review_queue.claim(first, batch_size=3)
+        self.assertEqual(len(held), 3)
+        self.assertFalse(
+            set(r.pk for r in held)
+            & set(r.pk for r in review_queue.claim(second, batch_size=3))
+        )
+        HealthRecord.objects.filter(reviewer=first).update(
+            lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+        self.assertEqual(review_queue.claimed_by(first), [])
+        taken = review_queue.claim(second, batch_size=3)
+        self.assertEqual({r.pk for r in taken}, {r.pk for r in held})
+        # The first reviewer's late outcome does not overwrite the new lease
+        self.assertIsNone(review_queue.complete(first, held[0].pk, status="treated"))
+        self.assertIsNotNone(review_queue.release(second, held[0].pk))
+
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user("patient")
+        disease = Disease.objects.create(name="flu", description="")
+        days = [
+            date(2024, 12, 31),
+            date(2025, 1, 1),
+            date(2025, 1, 1),
+            date(2025, 3, 9),
+        ]
+        for index, day in enumerate(days):
+            prediction = Prediction.objects.create(
+                user=self.patient, predicted_disease=disease, confidence_score=50
+            )
+            record = HealthRecord.objects.create(
+                user=self.patient,
+                prediction=prediction,
+                follow_up_date=day,
+                status="treated" if index % 2 else "pending",
+            )
+            HealthRecord.objects.filter(pk=record.pk).update(
+                created_at=datetime(
+                    day.year, day.month, day.day, 23, tzinfo=timezone.utc
+                )
+            )
+
+    def test_unfiltered_count_comes_from_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        # Rows added since ANALYZE are not in the estimate
+        HealthRecord.objects.create(
+            user=self.patient, prediction=Prediction.objects.first()
+        )
+        records = HealthRecord.objects.order_by("pk")
+        with mock.patch.object(core_admin, "ESTIMATE_THRESHOLD", 0):
+            self.assertEqual(core_admin.EstimatedCountPaginator(records, 2).count, 4)
+            treated = records.filter(status="treated")
+            self.assertEqual(core_admin.EstimatedCountPaginator(treated, 2).count, 2)
+        # Small tables are counted exactly
+        self.assertEqual(core_admin.EstimatedCountPaginator(records, 2).count, 5)
+
+    def test_date_probes_match_distinct_dates(self):
+        for records in (
+            HealthRecord.objects.all(),
+            HealthRecord.objects.filter(status="treated"),
+            HealthRecord.objects.filter(status="reviewed"),
+        ):
+            probed = core_admin.date_probe(records)
+            for kind in ("year", "month", "day"):
+                for order in ("ASC", "DESC"):
+                    with CaptureQueriesContext(connection) as queries:
+                        dates = probed.dates("follow_up_date", kind, order)
+                        times = probed.datetimes("created_at", kind, order)
+                    self.assertEqual(
+                        dates, list(records.dates("follow_up_date", kind, order))
+                    )
+                    self.assertEqual(
+                        times, list(records.datetimes("created_at", kind, order))
+                    )
+                    self.assertFalse(
+                        any("DISTINCT" in query["sql"] for query in queries)
+                    )
+
+    def test_status_action_ends_review_leases(self):
+        admin = User.objects.create_superuser("admin", password="admin-password")
+        reviewer = User.objects.create_user("reviewer", is_staff=True)
+        held = review_queue.claim(reviewer, batch_size=2)
+        self.client.force_login(admin)
+        response = self.client.post(
+            "/admin/core/healthrecord/",
+            {"action": "mark_reviewed", "_selected_action": [r.pk for r in held]},
+        )
+        self.assertEqual(response.status_code, 302)
+        for record in HealthRecord.objects.filter(pk__in=[r.pk for r in held]):
+            self.assertEqual(record.status, "reviewed")
+            self.assertIsNone(record.reviewer_id)
+            self.assertIsNone(record.lease_expires_at)
+        self.assertEqual(review_queue.claimed_by(reviewer), [])
+        self.assertEqual(HealthRecord.objects.filter(status="reviewed").count(), 2)
+
+
+class FollowUpScannerTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user("patient")
+        self.disease = Disease.objects.create(name="flu", description="")
+        self.sink = QueueSink()
+        self.today = date(2026, 3, 10)
+
+    def record(self, follow_up_date, **fields):
+        prediction = Prediction.objects.create(
+            user=self.patient, predicted_disease=self.disease, confidence_score=50
+        )
+        return HealthRecord.objects.create(
+            user=self.patient,
+            prediction=prediction,
+            follow_up_date=follow_up_date,
+            **fields,
+        )
+
+    def scan(self):
+        scan_due("default", self.sink, self.today)
+        events = []
+        while not self.sink.queue.empty():
+            events.append(self.sink.queue.get())
+        return [(e["health_record_id"], e["follow_up_date"]) for e in events]
+
+    def test_each_due_record_is_reminded_once(self):
+        due = self.record(self.today)
+        self.record(self.today + timedelta(days=1))
+        self.record(self.today, status="treated")
+        self.assertEqual(self.scan(), [(due.pk, self.today)])
+        self.assertEqual(self.scan(), [])
+
+    def test_records_added_behind_the_scan_are_reminded(self):
+        first = self.record(self.today)
+        self.assertEqual(self.scan(), [(first.pk, self.today)])
+        # Created after the scan passed their date, or edited back to it
+        late = self.record(self.today - timedelta(days=5))
+        edited = self.record(self.today + timedelta(days=10))
+        HealthRecord.objects.filter(pk=edited.pk).update(follow_up_date=self.today)
+        self.assertEqual(
+            self.scan(),
+            [(late.pk, self.today - timedelta(days=5)), (edited.pk, self.today)],
+        )
+
+    def test_rescheduled_record_is_reminded_for_its_new_date(self):
+        record = self.record(self.today - timedelta(days=2))
+        self.scan()
+        record.follow_up_date = self.today
+        record.save()
+        self.assertEqual(self.scan(), [(record.pk, self.today)])
+
+    def test_dates_before_since_are_left_alone(self):
+        self.record(self.today - timedelta(days=40))
+        recent = self.record(self.today - timedelta(days=1))
+        scan_due(
+            "default", self.sink, self.today, since=self.today - timedelta(days=30)
+        )
+        self.assertEqual(self.sink.queue.get()["health_record_id"], recent.pk)
+        self.assertTrue(self.sink.queue.empty())
+
+
+class PredictionExplanationTests(TestCase):
+    def test_symptoms_differing_in_case_are_explained_once(self):
+        predictor = DiseasePredictor()
+        predictor.symptom_names = ["Cough", "cough", "fever", "rash"]
+        X = np.array([[1, 1, 1, 0], [1, 1, 0, 0], [0, 0, 1, 1], [0, 0, 0, 1]] * 5)
+        predictor.fit(X, ["flu", "cold", "measles", "pox"] * 5)
+        disease, confidence, explanation = predictor.predict_with_explanation(
+            ["COUGH", "fever"]
+        )
+        self.assertIsNotNone(disease)
+        self.assertEqual(sorted(name for name, _ in explanation), ["Cough", "fever"])
+        proba, contributions = predictor.predict_batch(
+            predictor.encode_symptoms([["cough", "fever"]])
+        )
+        best = list(predictor.model.classes_).index(disease)
+        credit = dict(explanation)["Cough"]
+        self.assertAlmostEqual(credit, contributions[0, :2, best].sum())
+
+
+class ModelBackendTests(TestCase):
+    # 13 symptoms, so the packed bitsets end in a partial byte
+    X = np.array(
+        [
+            [1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1],
+            [1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0, 0, 1, 1, 0, 1, 1, 0],
+            [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 1],
+        ]
+    )
+    y = ["flu", "flu", "measles", "measles", "pox", "pox"]
+
+    def test_bernoulli_nb_matches_sklearn(self):
+        from sklearn.naive_bayes import BernoulliNB
+
+        backend = BernoulliNBBackend().fit(self.X, self.y)
+        reference = BernoulliNB(alpha=1.0, fit_prior=False).fit(self.X, self.y)
+        queries = np.array(
+            [[1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1], [0] * 12 + [1], [0] * 13]
+        )
+        proba, contributions = backend.predict_batch(queries)
+        np.testing.assert_allclose(proba, reference.predict_proba(queries))
+        self.assertEqual(
+            list(backend.predict(queries)), list(reference.predict(queries))
+        )
+        # Only present symptoms are credited
+        self.assertTrue((contributions[1, :12] == 0).all())
+
+    def test_jaccard_returns_the_nearest_disease(self):
+        backend = JaccardNeighborBackend().fit(self.X, self.y)
+        query = np.array([[0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 1]])
+        similarities, contributions = backend.predict_batch(query)
+        # flu {0,1,2,12}, measles {3,4,5,6}, pox {7,8,9,10,11,12}
+        np.testing.assert_allclose(similarities[0], [1 / 6, 2 / 5, 1 / 8])
+        self.assertEqual(list(backend.predict(query)), ["measles"])
+        np.testing.assert_allclose(contributions.sum(axis=1), similarities)
+
+    def test_backends_survive_a_save_and_load(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for backend in ("bernoulli_nb", "jaccard_nn"):
+            with self.subTest(backend=backend):
+                trained = DiseasePredictor(backend)
+                trained.symptom_names = [f"symptom {i}" for i in range(13)]
+                trained.fit(self.X, self.y)
+                path = os.path.join(directory.name, f"{backend}.pkl")
+                loaded = DiseasePredictor()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    trained.save_model(path)
+                    self.assertTrue(loaded.load_model(path))
+                self.assertEqual(loaded.backend, backend)
+                for expected, actual in zip(
+                    trained.predict_batch(self.X), loaded.predict_batch(self.X)
+                ):
+                    np.testing.assert_array_equal(expected, actual)
+                self.assertEqual(
+                    loaded.predict_many([["symptom 3", "symptom 4"]]),
+                    trained.predict_many([["symptom 3", "symptom 4"]]),
+                )
+
+
+class ReplayTests(TestCase):
+    def test_chunks_are_read_only_as_the_pool_keeps_up(self):
+        read = []
+
+        def chunks():
+            for i in range(20):
+                read.append(i)
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = bounded_map(pool, lambda i: (i, len(read)), chunks(), 3)
+            seen = sorted(results)
+        self.assertEqual([i for i, _ in seen], list(range(20)))
+        # No chunk was read more than the window ahead of the one scored
+        self.assertTrue(all(ahead <= i + 3 for i, ahead in seen))
+
+    def test_only_confirmed_diagnoses_count_as_labels(self):
+        patient = User.objects.create_user("patient")
+        disease = Disease.objects.create(name="flu", description="")
+        confirmed = {}
+        for status, diagnosis_confirmed in [
+            ("reviewed", None),
+            ("treated", False),
+            ("treated", True),
+        ]:
+            prediction = Prediction.objects.create(
+                user=patient, predicted_disease=disease, confidence_score=50
+            )
+            HealthRecord.objects.create(
+                user=patient,
+                prediction=prediction,
+                status=status,
+                diagnosis_confirmed=diagnosis_confirmed,
+            )
+            confirmed[prediction.pk] = diagnosis_confirmed is True
+        rows = [row for chunk in _history(2, None) for row in chunk]
+        self.assertEqual([flag for _, _, flag in rows], list(confirmed.values()))
+
+    def test_owner_cannot_confirm_a_diagnosis(self):
+        patient = User.objects.create_user("patient")
+        record = HealthRecord.objects.create(
+            user=patient,
+            prediction=Prediction.objects.create(
+                user=patient,
+                predicted_disease=Disease.objects.create(name="flu", description=""),
+                confidence_score=50,
+            ),
+        )
+        client = APIClient(SERVER_NAME="localhost")
+        client.force_authenticate(patient)
+        response = client.patch(
+            f"/api/health-records/{record.pk}/",
+            {"diagnosis_confirmed": True},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        record.refresh_from_db()
+        self.assertIsNone(record.diagnosis_confirmed)
+
+
+class ReplayWorkerTests(TransactionTestCase):
+    def test_replay_runs_in_spawned_workers(self):
+        patient = User.objects.create_user("patient")
+        prediction = Prediction.objects.create(
+            user=patient,
+            predicted_disease=Disease.objects.create(name="flu", description=""),
+            confidence_score=50,
+        )
+        prediction.symptoms.set(
+            [Symptom.objects.get_or_create(name=name)[0] for name in ("Cough", "Fever")]
+        )
+        start_method = multiprocessing.get_start_method()
+        multiprocessing.set_start_method("spawn", force=True)
+        self.addCleanup(multiprocessing.set_start_method, start_method, force=True)
+        output = io.StringIO()
+        call_command(
+            "replay_predictions", str(settings.MODEL_PATH), workers=1, stdout=output
+        )
+        self.assertIn("predictions: 1", output.getvalue())
+
+
+class SymptomSuggestionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOG_SNAPSHOT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        catalog._version_cache.delete("version")
+        snapshot._current = None
+
+    def test_empty_catalog_has_nothing_to_suggest(self):
+        Disease.objects.all().delete()
+        self.assertEqual(
+            suggest_symptoms(["no such symptom", "no such symptom"]),
+            {
+                "suggestions": [],
+                "entropy": 0.0,
+                "likely_diseases": [],
+                "unknown_symptoms": ["no such symptom"],
+            },
+        )
+
+    def test_repeated_symptoms_count_once(self):
+        cough, fever, rash = (
+            Symptom.objects.get_or_create(name=name)[0]
+            for name in ("Cough", "Fever", "Rash")
+        )
+        Disease.objects.create(name="flu", description="").symptoms.set([cough, fever])
+        Disease.objects.create(name="measles", description="").symptoms.set(
+            [fever, rash]
+        )
+        self.assertEqual(
+            suggest_symptoms(["Cough", "cough ", "COUGH"], ["cough", "Rash", "rash"]),
+            suggest_symptoms(["Cough"], ["Rash"]),
+        )
+
+
+class CatalogFragmentTests(TestCase):
+    def setUp(self):
+        catalog._version_cache.delete("version")
+        cough, fever = (
+            Symptom.objects.get_or_create(name=name)[0] for name in ("Cough", "Fever")
+        )
+        self.disease = Disease.objects.create(name="flu", description="Seasonal")
+        self.disease.symptoms.set([cough, fever])
+        self.prediction = Prediction.objects.create(
+            user=User.objects.create_user("patient"),
+            predicted_disease=self.disease,
+            confidence_score=50,
+        )
+        self.prediction.symptoms.set([fever, cough])
+
+    def assertMatchesSerializers(self, prediction):
+        data = PredictionSerializer(prediction).data
+        self.assertEqual(
+            data["predicted_disease"],
+            DiseaseSerializer(Disease.objects.get(pk=self.disease.pk)).data,
+        )
+        self.assertEqual(
+            data["symptoms"],
+            SymptomSerializer(
+                Prediction.objects.get(pk=prediction.pk).symptoms.all(), many=True
+            ).data,
+        )
+
+    def test_cached_fields_render_as_the_catalog_serializers(self):
+        self.assertMatchesSerializers(self.prediction)
+        prefetched = Prediction.objects.prefetch_related("symptoms").get(
+            pk=self.prediction.pk
+        )
+        self.assertMatchesSerializers(prefetched)
+
+    def test_catalog_changes_reach_the_cached_fields(self):
+        PredictionSerializer(self.prediction).data
+        with self.captureOnCommitCallbacks(execute=True):
+            self.disease.description = "Pandemic"
+            self.disease.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Symptom.objects.filter(name="Cough").update(name="Dry cough")
+            # Bulk updates send no signals, so bump as an admin action would
+            catalog.bump_version()
+        data = PredictionSerializer(self.prediction).data
+        self.assertEqual(data["predicted_disease"]["description"], "Pandemic")
+        self.assertIn("Dry cough", [symptom["name"] for symptom in data["symptoms"]])
+        self.assertMatchesSerializers(self.prediction)
+        self.assertEqual(catalog.fragments()["stamp"], catalog.current_stamp())
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOG_SNAPSHOT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.forget()
+
+    def forget(self):
+        catalog._version_cache.delete("version")
+        snapshot._current = None
+
+    def test_repeated_version_does_not_reuse_stale_snapshot(self):
+        before = snapshot.current()
+        Disease.objects.create(name="scurvy", description="")
+        # A recreated or rolled-back database reaches the old version again
+        CatalogVersion.objects.filter(pk=1).update(version=before.version)
+        self.forget()
+        after = snapshot.current()
+        self.assertEqual(after.version, before.version)
+        self.assertIsNone(before.disease_row("scurvy"))
+        self.assertIsNotNone(after.disease_row("scurvy"))
+
+    def test_catalog_without_version_row_gets_a_token(self):
+        CatalogVersion.objects.all().delete()
+        self.forget()
+        version, token = catalog.current_stamp()
+        self.assertEqual(version, 0)
+        self.assertTrue(token)
+        self.assertEqual(snapshot.current().stamp, (version, token))
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        saved = dict(warmup._state)
+        self.addCleanup(lambda: warmup._state.update(saved))
+        warmup._state.update(status="cold", timings_ms={}, errors={})
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CATALOG_SNAPSHOT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    @override_settings(WARMUP="blocking")
+    def test_first_request_warms_the_process_up_once(self):
+        client = APIClient(SERVER_NAME="localhost")
+        response = client.get("/api/health/ready/")
+        self.assertEqual(response.data["warmup"]["status"], "done")
+        self.assertEqual(response.data["warmup"]["errors"], {})
+        started_at = warmup._state["started_at"]
+        client.get("/api/health/live/")
+        self.assertEqual(warmup._state["started_at"], started_at)
+
+    def test_child_forked_mid_warm_up_starts_over(self):
+        warmup._state.update(status="warming", started_at=datetime.now())
+        warmup._after_fork()
+        self.assertEqual(warmup._state["status"], "cold")
+        self.assertIsNone(warmup._state["started_at"])
+        self.assertFalse(warmup._lock.locked())
+
+        warmup._state["status"] = "done"
+        warmup._after_fork()
+        self.assertEqual(warmup._state["status"], "done")
+
+    @override_settings(WARMUP="off")
+    def test_process_without_warm_up_is_ready(self):
+        response = APIClient(SERVER_NAME="localhost").get("/api/health/ready/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["warmup"]["status"], "cold")
+
+
+@override_settings(THROTTLE_RATES={"login_ip": "3/min", "login_username": "2/min"})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        throttling._store.clear()
+        self.addCleanup(throttling._store.clear)
+        User.objects.create_user("victim", password="right horse battery")
+
+    def login(self, password, address, forwarded_for=None, username="victim"):
+        extra = {"REMOTE_ADDR": address}
+        if forwarded_for:
+            extra["HTTP_X_FORWARDED_FOR"] = forwarded_for
+        return APIClient(SERVER_NAME="localhost").post(
+            "/api/login/",
+            {"username": username, "password": password},
+            format="json",
+            **extra,
+        )
+
+    def test_forged_forwarded_for_does_not_reset_the_ip_bucket(self):
+        codes = [
+            self.login(
+                "wrong",
+                "203.0.113.9",
+                forwarded_for=f"198.51.100.{i}",
+                username=f"guess{i}",
+            ).status_code
+            for i in range(4)
+        ]
+        self.assertEqual(codes, [401, 401, 401, 429])
+
+    def test_failed_guesses_do_not_lock_the_owner_out(self):
+        for _ in range(3):
+            self.login("wrong", "203.0.113.9")
+        self.assertEqual(self.login("wrong", "203.0.113.9").status_code, 429)
+        self.assertEqual(
+            self.login("right horse battery", "192.0.2.1").status_code, 200
+        )
+
+
+class IdempotencyTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("patient")
+        self.calls = []
+
+        @api_view(["POST"])
+        @idempotent
+        def create(request):
+            self.calls.append(request.data)
+            time.sleep(0.3)
+            return Response({"call": len(self.calls)}, status=201)
+
+        self.view = create
+
+    def post(self, key="order-1", data=None):
+        request = APIRequestFactory().post(
+            "/api/predict/",
+            data or {"symptoms": ["cough"]},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+        force_authenticate(request, self.user)
+        return self.view(request)
+
+    def test_concurrent_retries_run_the_view_once(self):
+        responses = [None] * 6
+
+        def retry(index):
+            responses[index] = self.post()
+
+        run_threads(6, retry)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual({r.status_code for r in responses}, {201})
+        self.assertEqual({r.data["call"] for r in responses}, {1})
+        self.assertEqual(
+            sum(r.get("Idempotent-Replayed") == "true" for r in responses), 5
+        )
+
+    @override_settings(IDEMPOTENCY={"WAIT": 0.1, "LOCK_TIMEOUT": 0.1})
+    def test_original_finishing_after_a_takeover_keeps_the_new_response(self):
+        responses = [None] * 2
+
+        def retry(index):
+            time.sleep(index * 0.15)
+            responses[index] = self.post()
+
+        run_threads(2, retry)
+        # The retry found the original's record stale and ran the view again;
+        # the original then finished without clobbering the retry's record
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.post().data, {"call": 2})
+
+    @override_settings(IDEMPOTENCY={"WAIT": 0.2})
+    def test_retry_of_a_vanished_record_waits_for_its_deadline(self):
+        with mock.patch.object(idempotency, "_claim", return_value=None):
+            started = time.monotonic()
+            response = self.post()
+        self.assertEqual(response.status_code, 409)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.calls, [])
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    PROVISIONING_SYNC_MAX_ROWS=3,
+)
+class ProvisioningTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", password="admin-password")
+        self.client = APIClient(SERVER_NAME="localhost")
+        self.client.force_authenticate(admin)
+
+    def patients(self, count):
+        return [
+            {"username": f"patient{i}", "password": f"Clinic-visit-{i:04d}"}
+            for i in range(count)
+        ]
+
+    def test_small_batches_are_created_inline_with_validated_passwords(self):
+        batch = self.patients(2) + [{"username": "weak", "password": "password"}]
+        response = self.client.post(
+            "/api/patients/bulk/", {"patients": batch}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created", "created", "invalid"],
+        )
+        self.assertIn("password", response.data["results"][2]["errors"])
+        self.assertTrue(
+            User.objects.get(username="patient1").check_password("Clinic-visit-0001")
+        )
+
+    def test_large_batches_are_queued_for_the_intake_workers(self):
+        batch = self.patients(5) + [{"username": "weak", "password": "12345678"}]
+        response = self.client.post(
+            "/api/patients/bulk/", {"patients": batch, "chunk_size": 4}, format="json"
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["kind"], "provisioning")
+        self.assertFalse(User.objects.filter(username="patient0").exists())
+        job = IntakeJob.objects.get(pk=response.data["id"])
+
+        while chunk := intake.claim_chunk("worker", kinds=["provisioning"]):
+            intake.process_chunk(chunk, None)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual((job.created_predictions, job.failed_rows), (5, 1))
+        self.assertFalse(job.chunks.filter(secrets__isnull=False).exists())
+        self.assertTrue(
+            User.objects.get(username="patient4").check_password("Clinic-visit-0004")
+        )
+        results = list(intake.result_rows(job, provisioning.RESULT_FIELDS))
+        self.assertEqual([r["row"] for r in results], list(range(6)))
+        self.assertEqual(results[5]["status"], "invalid")
+        self.assertIn("password", results[5]["error"])
+
+    def queue(self, count):
+        return provisioning.create_job(
+            User.objects.get(username="admin"), self.patients(count), 4
+        )
+
+    def test_queued_passwords_are_stored_encrypted(self):
+        job = self.queue(2)
+        stored = bytes(job.chunks.get().secrets)
+        self.assertNotIn(b"Clinic-visit", stored)
+        with self.assertRaises(zlib.error):
+            intake.decode(stored)
+        self.assertEqual(
+            provisioning.decrypt_secrets(stored),
+            ["Clinic-visit-0000", "Clinic-visit-0001"],
+        )
+
+    def test_jobs_never_processed_drop_their_passwords(self):
+        job = self.queue(5)
+        self.assertEqual(provisioning.expire_jobs(), 0)
+        IntakeJob.objects.filter(pk=job.pk).update(
+            created_at=job.created_at - timedelta(days=2)
+        )
+        self.assertEqual(provisioning.expire_jobs(), 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.failed_rows, 5)
+        self.assertFalse(job.chunks.filter(secrets__isnull=False).exists())
+        results = list(intake.result_rows(job, provisioning.RESULT_FIELDS))
+        self.assertEqual({r["error"] for r in results}, {provisioning.EXPIRED})
+        self.assertFalse(User.objects.filter(username="patient0").exists())
+
+    @override_settings(PROVISIONING_SECRETS_TTL=0)
+    def test_expired_passwords_are_not_used(self):
+        job = self.queue(2)
+        time.sleep(1)
+        intake.process_chunk(intake.claim_chunk("worker"), None)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.failed_rows), ("completed", 2))
+        self.assertFalse(User.objects.filter(username="patient0").exists())
+
+
+class ArchiveLookupTests(TestCase):
+    def setUp(self):
+        self.patient = User.objects.create_user("patient")
+        disease = Disease.objects.create(name="flu", description="")
+        self.records = []
+        for month in (1, 2, 3):
+            prediction = Prediction.objects.create(
+                user=self.patient, predicted_disease=disease, confidence_score=50
+            )
+            record = HealthRecord.objects.create(
+                user=self.patient, prediction=prediction, status="treated"
+            )
+            at = datetime(2024, month, 15, tzinfo=timezone.utc)
+            Prediction.objects.filter(pk=prediction.pk).update(timestamp=at)
+            HealthRecord.objects.filter(pk=record.pk).update(created_at=at)
+            self.records.append(record.pk)
+        # A month of predictions nobody has a health record for
+        Prediction.objects.filter(
+            pk=Prediction.objects.create(
+                user=self.patient, predicted_disease=disease, confidence_score=50
+            ).pk
+        ).update(timestamp=datetime(2024, 4, 15, tzinfo=timezone.utc))
+        archive.archive_old_predictions(
+            "default", cutoff=datetime(2025, 1, 1, tzinfo=timezone.utc), pause=0
+        )
+
+    def decoded(self, lookup):
+        with mock.patch.object(archive, "decode", wraps=archive.decode) as decode:
+            found = lookup()
+        return found, decode.call_count
+
+    def test_record_lookup_decodes_only_the_segment_holding_it(self):
+        found, decoded = self.decoded(
+            lambda: archive.find_health_record(self.patient, self.records[1])
+        )
+        self.assertEqual(
+            (found.pk, found.prediction.timestamp.month), (self.records[1], 2)
+        )
+        self.assertEqual(decoded, 1)
+        self.assertEqual(
+            self.decoded(lambda: archive.find_health_record(self.patient, 0)), (None, 0)
+        )
+
+    def test_record_lists_skip_segments_without_matching_records(self):
+        records, decoded = self.decoded(
+            lambda: archive.archived_health_records(self.patient)
+        )
+        self.assertEqual([r.pk for r in records], self.records[::-1])
+        self.assertEqual(decoded, 3)
+        records, decoded = self.decoded(
+            lambda: archive.archived_health_records(
+                self.patient, start=date(2024, 3, 1)
+            )
+        )
+        self.assertEqual([r.pk for r in records], self.records[2:])
+        self.assertEqual(decoded, 1)
+
+
+class CompressionTests(TestCase):
+    def respond(self, response, accept_encoding="gzip"):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(
+            RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        )
+
+    def test_negotiation_honours_q_values_then_server_preference(self):
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.5"), "gzip")
+        self.assertEqual(negotiate("gzip, br"), "br")
+        self.assertEqual(negotiate("GZIP;q=0.8, br;q=0.8"), "br")
+        self.assertEqual(negotiate("zstd;q=0, *;q=0.1"), "br")
+        self.assertEqual(negotiate("br;q=abc, gzip;q=0.2"), "gzip")
+        self.assertIsNone(negotiate("identity"))
+        self.assertIsNone(negotiate(""))
+
+    def test_large_bodies_are_compressed_with_the_negotiated_coding(self):
+        body = b'{"rows": [' + b'{"disease": "flu"},' * 500 + b"{}]}"
+        response = self.respond(
+            HttpResponse(body, content_type="application/json"), "gzip;q=1, br;q=0"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(zlib.decompress(response.content, 31), body)
+
+    def test_streaming_small_and_encoded_responses_pass_through(self):
+        streaming = StreamingHttpResponse(
+            iter([b"x" * 4096]), content_type="application/json"
+        )
+        self.assertIs(self.respond(streaming), streaming)
+        self.assertFalse(streaming.has_header("Content-Encoding"))
+
+        small = self.respond(HttpResponse(b"{}", content_type="application/json"))
+        self.assertFalse(small.has_header("Content-Encoding"))
+
+        encoded = HttpResponse(b"x" * 4096, content_type="application/json")
+        encoded["Content-Encoding"] = "br"
+        self.assertEqual(self.respond(encoded).content, b"x" * 4096)
+
+
+class RetrainingTests(TestCase):
+    def setUp(self):
+        Disease.objects.all().delete()
+        symptoms = {
+            name: Symptom.objects.get_or_create(name=name)[0]
+            for name in ("Cough", "Fever", "Rash", "Headache")
+        }
+        for name, listed in [
+            ("flu", ["Cough", "Fever", "Headache"]),
+            ("measles", ["Fever", "Rash"]),
+            ("migraine", ["Headache"]),
+        ]:
+            disease = Disease.objects.create(name=name, description="")
+            disease.symptoms.set([symptoms[s] for s in listed])
+        self.symptoms = symptoms
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "model.pkl")
+
+    def retrain(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            outcome, _ = retrain(self.path, "random_forest")
+        return outcome
+
+    def test_fingerprint_ignores_order(self):
+        self.assertEqual(
+            catalog_fingerprint(["a", "b"], {"x": ["a", "b"], "y": ["b"]}),
+            catalog_fingerprint(["b", "a"], {"y": ["b"], "x": ["b", "a"]}),
+        )
+        self.assertNotEqual(
+            catalog_fingerprint(["a", "b"], {"x": ["a", "b"]}),
+            catalog_fingerprint(["a", "b"], {"x": ["a"]}),
+        )
+
+    def test_unchanged_catalog_is_not_retrained(self):
+        self.assertEqual(self.retrain(), "trained")
+        modified = os.path.getmtime(self.path)
+        self.assertEqual(self.retrain(), "unchanged")
+        self.assertEqual(os.path.getmtime(self.path), modified)
+
+    def test_changed_catalog_is_retrained(self):
+        self.retrain()
+        # Same symptoms and diseases: the forest grows instead
+        Disease.objects.get(name="migraine").symptoms.add(self.symptoms["Fever"])
+        self.assertEqual(self.retrain(), "extended")
+        self.assertEqual(self.retrain(), "unchanged")
+
+        Disease.objects.create(name="cold", description="").symptoms.set(
+            [self.symptoms["Cough"]]
+        )
+        self.assertEqual(self.retrain(), "trained")
+        with contextlib.redirect_stdout(io.StringIO()):
+            predictor = DiseasePredictor()
+            predictor.load_model(self.path)
+        self.assertIn("cold", predictor.model.classes_)
+        self.assertEqual(predictor.catalog_fingerprint, current_fingerprint())
+
+
+class FixedPredictor:
+    """Predicts one disease for every row"""
+
+    def __init__(self, disease):
+        self.disease = disease
+
+    def predict_many(self, symptom_lists):
+        return [(self.disease, 0.9) for _ in symptom_lists]
+
+
+class IntakeJobTests(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            CATALOG_SNAPSHOT_DIR=directory.name, INTAKE={"CHUNK_SIZE": 2}
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        catalog._version_cache.delete("version")
+        snapshot._current = None
+
+        self.owner = User.objects.create_superuser("clinic", password="x")
+        User.objects.create_user("patient")
+        Disease.objects.create(name="flu", description="")
+        upload = io.BytesIO(b"username,symptoms\n" + b"patient,cough;fever\n" * 8)
+        self.job = intake.create_job(self.owner, upload, "forms.csv")
+        self.predictor = FixedPredictor("flu")
+
+    def test_each_chunk_is_claimed_by_one_worker(self):
+        claimed = [[] for _ in range(8)]
+
+        def work(index):
+            while chunk := intake.claim_chunk(f"worker{index}"):
+                claimed[index].append(chunk.pk)
+                intake.process_chunk(chunk, self.predictor)
+
+        run_threads(8, work)
+        chunks = [pk for worker in claimed for pk in worker]
+        self.assertEqual(
+            sorted(chunks), sorted(self.job.chunks.values_list("pk", flat=True))
+        )
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "completed")
+        self.assertEqual(
+            (self.job.processed_rows, self.job.created_predictions), (8, 8)
+        )
+        self.assertEqual(Prediction.objects.count(), 8)
+
+    def test_chunk_resumes_after_its_worker_lost_the_lease(self):
+        first = intake.claim_chunk("crashed", lease_seconds=60)
+        # The worker commits its predictions, then dies before finishing
+        with mock.patch.object(intake, "finish_chunk", side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                intake.process_chunk(first, self.predictor)
+        self.assertEqual(Prediction.objects.count(), 2)
+        # Nobody else gets the chunk while the lease holds
+        second = intake.claim_chunk("survivor")
+        self.assertNotEqual(second.pk, first.pk)
+        intake.process_chunk(second, self.predictor)
+
+        IntakeChunk.objects.filter(pk=first.pk).update(
+            lease_expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+        while chunk := intake.claim_chunk("survivor"):
+            intake.process_chunk(chunk, self.predictor)
+        resumed = IntakeChunk.objects.get(pk=first.pk)
+        self.assertEqual(
+            (resumed.status, resumed.attempts, resumed.worker), ("done", 2, "survivor")
+        )
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "completed")
+        # The resumed chunk's predictions were not created twice
+        self.assertEqual(Prediction.objects.count(), 8)
+        self.assertEqual(self.job.created_predictions, 8)
+        rows = list(intake.result_rows(self.job))
+        self.assertEqual([row["row"] for row in rows], list(range(8)))
@@ -0,0 +1,237 @@
+import functools
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 60): a bucket of 30 tokens refilled over 60 seconds"""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+class MemoryBucketStore:
+    """Token buckets in this process only"""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity):
+        """Take a token; returns 0 if allowed, else seconds until one is due"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            # Dicts keep insertion order, so the first key is the least recent
+            while len(self._buckets) > self.maxsize:
+                del self._buckets[next(iter(self._buckets))]
+        return wait
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file shared by every worker on the host.
+
+    A stand-in for a shared store such as Redis: each take is one short
+    IMMEDIATE transaction, so the workers see a single bucket per key.
+    """
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, rate, capacity):
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, stamp FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, stamp = row or (capacity, now)
+            tokens = min(capacity, tokens + max(now - stamp, 0) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, stamp) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+
+_store = {}
+
+
+def get_store():
+    config = getattr(
+        settings, "THROTTLE_STORE", {"BACKEND": "core.throttling.MemoryBucketStore"}
+    )
+    key = repr(config)
+    if key not in _store:
+        _store.clear()
+        _store[key] = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _store[key]
+
+
+class BucketThrottle(BaseThrottle):
+    """Token-bucket throttle; the rate comes from settings.THROTTLE_RATES[scope]"""
+
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = getattr(settings, "THROTTLE_RATES", {}).get(self.scope)
+        key = self.get_key(request)
+        if not rate or key is None or request.method == "OPTIONS":
+            return True
+        count, seconds = parse_rate(rate)
+        self.delay = get_store().take(f"{self.scope}:{key}", count / seconds, count)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(BucketThrottle):
+    """Per authenticated user, per client IP for anonymous requests"""
+
+    def get_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+
+class IPBucketThrottle(BucketThrottle):
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class UsernameBucketThrottle(BucketThrottle):
+    """
+    Per account being logged into from each client IP. Keying on the
+    account alone would let anyone lock its owner out by failing logins.
+    """
+
+    def get_key(self, request):
+        username = request.data.get("username")
+        if not isinstance(username, str):
+            return None
+        return f"{username.strip().lower()}:{self.get_ident(request)}"
+
+
+class PredictUserThrottle(UserBucketThrottle):
+    scope = "predict_user"
+
+
+class PredictIPThrottle(IPBucketThrottle):
+    scope = "predict_ip"
+
+
+class LoginIPThrottle(IPBucketThrottle):
+    scope = "login_ip"
+
+
+class LoginUsernameThrottle(UsernameBucketThrottle):
+    scope = "login_username"
+
+
+class RegisterIPThrottle(IPBucketThrottle):
+    scope = "register_ip"
+
+
+class Overloaded(APIException):
+    status_code = 503
+    default_detail = "Server is busy, please retry shortly."
+    default_code = "overloaded"
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler sends this as Retry-After
+        self.wait = wait
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent executions in this process; callers wait up to timeout"""
+
+    def __init__(self, limit, timeout, retry_after=1):
+        self.limit = limit
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def __enter__(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Overloaded(self.retry_after)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._slots.release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """The process-wide limiter for settings.CONCURRENCY_LIMITS[name], or None"""
+    config = getattr(settings, "CONCURRENCY_LIMITS", {}).get(name)
+    if not config:
+        return None
+    key = (name, repr(config))
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = ConcurrencyLimiter(**config)
+        return _limiters[key]
+
+
+def limit_concurrency(name):
+    """View decorator shedding load with 503 + Retry-After past the limit"""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            limiter = get_limiter(name)
+            if limiter is None:
+                return view(*args, **kwargs)
+            with limiter:
+                return view(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
@@ -8,12 +8,21 @@ router.register(r"diseases", views.DiseaseViewSet)
 router.register(r"user-profiles", views.UserProfileViewSet, basename="userprofile")
 router.register(r"predictions", views.PredictionViewSet, basename="prediction")
 router.register(r"health-records", views.HealthRecordViewSet, basename="healthrecord")
+router.register(r"review-queue", views.ReviewQueueViewSet, basename="review-queue")
+router.register(r"intake-jobs", views.IntakeJobViewSet, basename="intake-job")
 
 urlpatterns = [
     path("", include(router.urls)),
     path("register/", views.register, name="register"),
+    path("patients/bulk/", views.provision_patients, name="provision_patients"),
     path("login/", views.login_view, name="login"),
+    path("logout/", views.logout_view, name="logout"),
+    path("token/refresh/", views.token_refresh, name="token_refresh"),
     path("predict/", views.predict_disease, name="predict_disease"),
+    path("suggest-symptoms/", views.suggest_symptoms, name="suggest_symptoms"),
     path("health-check/", views.health_check, name="health_check"),
+    path("health/live/", views.liveness, name="liveness"),
+    path("health/ready/", views.readiness, name="readiness"),
     path("dashboard/", views.user_dashboard, name="user_dashboard"),
+    path("analytics/", views.analytics, name="analytics"),
 ]
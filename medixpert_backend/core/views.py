@@ -1,10 +1,59 @@
+import logging
+from collections import Counter
+from itertools import chain, islice
+from operator import attrgetter
+
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    throttle_classes,
+    action,
+)
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
-from .models import Symptom, Disease, UserProfile, Prediction, HealthRecord
+from django.db.models import Prefetch, Sum
+from django.http import Http404
+from django.utils.dateparse import parse_date
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import get_tokens_for_user
+from .exports import (
+    HEALTH_RECORD_FIELDS,
+    PREDICTION_FIELDS,
+    archived_health_record_rows,
+    archived_prediction_rows,
+    export_response,
+    health_record_rows,
+    prediction_rows,
+)
+from .models import (
+    Symptom,
+    Disease,
+    UserProfile,
+    Prediction,
+    HealthRecord,
+    DiseaseIncidenceRollup,
+    IntakeJob,
+)
+from . import archive, catalog, intake, provisioning, review_queue, warmup
+from .compression import negotiate, precompressed_response
+from .idempotency import idempotent
+from .inference import get_predictor, submit_shadow
+from .revocation import revocation_store
+from .sharding import user_manager, user_queryset
+from .throttling import (
+    LoginIPThrottle,
+    LoginUsernameThrottle,
+    PredictIPThrottle,
+    PredictUserThrottle,
+    RegisterIPThrottle,
+    limit_concurrency,
+)
 from .serializers import (
     SymptomSerializer,
     DiseaseSerializer,
@@ -12,24 +61,43 @@ from .serializers import (
     PredictionSerializer,
     HealthRecordSerializer,
     PredictionCreateSerializer,
+    BulkProvisionSerializer,
+    IntakeJobSerializer,
+    IntakeUploadSerializer,
+    ReviewClaimSerializer,
+    ReviewCompletionSerializer,
+    SymptomSuggestionSerializer,
     UserRegistrationSerializer,
     UserSerializer,
 )
-import joblib
-import os
-import numpy as np
 
 
-class SymptomViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogListMixin:
+    """Serve the list from the per-version, pre-compressed catalog bodies"""
+
+    catalog_kind = None
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != "json":
+            return super().list(request, *args, **kwargs)
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        return precompressed_response(
+            catalog.encoded_list(self.catalog_kind, encoding), encoding
+        )
+
+
+class SymptomViewSet(CatalogListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Symptom.objects.all()
     serializer_class = SymptomSerializer
     permission_classes = [AllowAny]
+    catalog_kind = "symptoms"
 
 
-class DiseaseViewSet(viewsets.ReadOnlyModelViewSet):
+class DiseaseViewSet(CatalogListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Disease.objects.all()
     serializer_class = DiseaseSerializer
     permission_classes = [AllowAny]
+    catalog_kind = "diseases"
 
 
 from typing import Any, Dict, TypedDict, List, Optional
@@ -42,6 +110,24 @@ class PredictionData(TypedDict):
     additional_symptoms: str
     notes: str
 
+logger = logging.getLogger(__name__)
+
+SYMPTOM_IDS = Prefetch("symptoms", Symptom.objects.only("id"))
+
+
+def history_range(request):
+    """Optional ?start= and ?end= dates (inclusive) bounding a history list"""
+    return (
+        parse_date(request.query_params.get("start", "")),
+        parse_date(request.query_params.get("end", "")),
+    )
+
+
+def archived_pk(kwargs):
+    pk = kwargs.get("pk", "")
+    return int(pk) if pk.isdigit() else None
+
+
 class UserProfileViewSet(viewsets.ModelViewSet):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -55,7 +141,52 @@ class PredictionViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self) -> "QuerySet[Prediction]":  # type: ignore
-        return Prediction.objects.filter(user=self.request.user)
+        # Catalog objects come from the fragment cache; only symptom ids are needed
+        return (
+            user_queryset(Prediction, self.request.user)
+            .select_related("user")
+            .prefetch_related(SYMPTOM_IDS)
+        )
+
+    def list(self, request):
+        """Newest first, reading through to the archive past the hot window"""
+        start, end = history_range(request)
+        predictions = self.get_queryset()
+        if start:
+            predictions = predictions.filter(timestamp__date__gte=start)
+        if end:
+            predictions = predictions.filter(timestamp__date__lte=end)
+        predictions = archive.merge_newest_first(
+            predictions,
+            archive.archived_predictions(request.user, start, end),
+            key=attrgetter("timestamp"),
+        )
+        return Response(self.get_serializer(predictions, many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = archived_pk(kwargs)
+            prediction = pk and archive.find_prediction(request.user, pk)
+            if not prediction:
+                raise
+            return Response(self.get_serializer(prediction).data)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the user's full prediction history, archived rows first"""
+        return export_response(
+            request,
+            chain(
+                archived_prediction_rows(
+                    archive.archived_predictions(request.user, newest_first=False)
+                ),
+                prediction_rows(user_queryset(Prediction, request.user)),
+            ),
+            PREDICTION_FIELDS,
+            "predictions",
+        )
 
 
 class HealthRecordViewSet(viewsets.ModelViewSet):
@@ -63,11 +194,145 @@ class HealthRecordViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self) -> "QuerySet[HealthRecord]":  # type: ignore
-        return HealthRecord.objects.filter(user=self.request.user)
+        return (
+            user_queryset(HealthRecord, self.request.user)
+            .select_related("user", "prediction__user")
+            .prefetch_related(Prefetch("prediction__symptoms", SYMPTOM_IDS.queryset))
+        )
+
+    def list(self, request):
+        """Archived records (oldest first) followed by the hot ones"""
+        start, end = history_range(request)
+        records = self.get_queryset()
+        if start:
+            records = records.filter(created_at__date__gte=start)
+        if end:
+            records = records.filter(created_at__date__lte=end)
+        archived = archive.archived_health_records(
+            request.user, start, end, newest_first=False
+        )
+        return Response(self.get_serializer([*archived, *records], many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pk = archived_pk(kwargs)
+            record = pk and archive.find_health_record(request.user, pk)
+            if not record:
+                raise
+            return Response(self.get_serializer(record).data)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the user's full health record history, archived rows first"""
+        return export_response(
+            request,
+            chain(
+                archived_health_record_rows(
+                    archive.archived_health_records(request.user, newest_first=False)
+                ),
+                health_record_rows(user_queryset(HealthRecord, request.user)),
+            ),
+            HEALTH_RECORD_FIELDS,
+            "health-records",
+        )
+
+
+class ReviewQueueViewSet(viewsets.ViewSet):
+    """Clinician worklist of pending health records, handed out under leases"""
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        records = review_queue.claimed_by(request.user)
+        return Response(HealthRecordSerializer(records, many=True).data)
+
+    @action(detail=False, methods=["post"])
+    def claim(self, request):
+        serializer = ReviewClaimSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        records = review_queue.claim(request.user, **serializer.validated_data)
+        return Response(HealthRecordSerializer(records, many=True).data)
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        serializer = ReviewCompletionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        record = review_queue.complete(request.user, pk, **serializer.validated_data)
+        if record is None:
+            return Response(
+                {"error": "Record is not leased to you or the lease expired"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(HealthRecordSerializer(record).data)
+
+    @action(detail=True, methods=["post"])
+    def release(self, request, pk=None):
+        if review_queue.release(request.user, pk) is None:
+            return Response(
+                {"error": "Record is not leased to you or the lease expired"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({"message": "Record returned to the queue"})
+
+
+class IntakeJobViewSet(viewsets.ViewSet):
+    """
+    Clinic CSV uploads screened in the background by intake workers, and
+    large bulk provisioning batches they create the accounts of
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get_job(self, request, pk):
+        try:
+            return IntakeJob.objects.get(pk=pk, owner=request.user)
+        except (IntakeJob.DoesNotExist, ValueError):
+            raise Http404
+
+    def list(self, request):
+        jobs = IntakeJob.objects.filter(owner=request.user)[:100]
+        return Response(IntakeJobSerializer(jobs, many=True).data)
+
+    @limit_concurrency("intake_upload")
+    def create(self, request):
+        serializer = IntakeUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        upload = serializer.validated_data["file"]
+        try:
+            job = intake.create_job(request.user, upload, upload.name)
+        except ValueError as e:
+            return Response({"file": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(IntakeJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, pk=None):
+        return Response(IntakeJobSerializer(self.get_job(request, pk)).data)
+
+    @action(detail=True, methods=["get"])
+    def results(self, request, pk=None):
+        """Per-row outcomes of the rows processed so far, as NDJSON or CSV"""
+        job = self.get_job(request, pk)
+        fields = (
+            provisioning.RESULT_FIELDS
+            if job.kind == "provisioning"
+            else intake.RESULT_FIELDS
+        )
+        return export_response(
+            request,
+            intake.result_rows(job, fields),
+            fields,
+            f"intake-{job.pk}-results",
+        )
 
 
 @api_view(["POST", "OPTIONS"])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterIPThrottle])
+@limit_concurrency("password_hashing")
 def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
@@ -79,8 +344,38 @@ def register(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+@limit_concurrency("bulk_provisioning")
+def provision_patients(request):
+    """
+    Create a batch of patient accounts and profiles for a clinic. Batches of
+    more than PROVISIONING_SYNC_MAX_ROWS are queued as an intake job instead
+    """
+    serializer = BulkProvisionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    patients = serializer.validated_data["patients"]
+    if len(patients) > getattr(settings, "PROVISIONING_SYNC_MAX_ROWS", 20):
+        job = provisioning.create_job(
+            request.user, patients, serializer.validated_data["chunk_size"]
+        )
+        return Response(IntakeJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    results = provisioning.provision(patients)
+    return Response(
+        {
+            "summary": Counter(result["status"] for result in results),
+            "results": results,
+        }
+    )
+
+
 @api_view(["POST", "OPTIONS"])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
+@limit_concurrency("password_hashing")
 def login_view(request):
     username = request.data.get("username")
     password = request.data.get("password")
@@ -88,9 +383,7 @@ def login_view(request):
     if username and password:
         user = authenticate(username=username, password=password)
         if user:
-            from rest_framework_simplejwt.tokens import RefreshToken
-
-            refresh = RefreshToken.for_user(user)
+            refresh = get_tokens_for_user(user)
 
             return Response(
                 {
@@ -109,8 +402,75 @@ def login_view(request):
     )
 
 
+@api_view(["POST", "OPTIONS"])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    raw_token = request.data.get("refresh")
+    if not raw_token:
+        return Response(
+            {"error": "Refresh token required"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        refresh = RefreshToken(raw_token)
+    except TokenError:
+        return Response(
+            {"error": "Invalid or expired refresh token"},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    jti, exp = refresh[jwt_settings.JTI_CLAIM], refresh["exp"]
+    if revocation_store.is_revoked(jti, exp):
+        return Response(
+            {"error": "Refresh token has been revoked"},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    data = {"token": str(refresh.access_token)}
+    if jwt_settings.ROTATE_REFRESH_TOKENS:
+        # Revoking is an insert on a unique JTI, so of two concurrent refreshes
+        # with the same token only one can win the rotation
+        if jwt_settings.BLACKLIST_AFTER_ROTATION and not revocation_store.revoke(
+            jti, exp
+        ):
+            return Response(
+                {"error": "Refresh token has been revoked"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data["refresh"] = str(refresh)
+
+    return Response(data)
+
+
+@api_view(["POST", "OPTIONS"])
+@permission_classes([AllowAny])
+def logout_view(request):
+    raw_token = request.data.get("refresh")
+    if not raw_token:
+        return Response(
+            {"error": "Refresh token required"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        refresh = RefreshToken(raw_token)
+    except TokenError:
+        return Response(
+            {"error": "Invalid or expired refresh token"},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    revocation_store.revoke(refresh[jwt_settings.JTI_CLAIM], refresh["exp"])
+    return Response({"message": "Logged out successfully"})
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@throttle_classes([PredictUserThrottle, PredictIPThrottle])
+@idempotent
+@limit_concurrency("inference")
 def predict_disease(request: Request) -> Response:
     serializer = PredictionCreateSerializer(data=request.data)
     if serializer.is_valid():
@@ -119,62 +479,70 @@ def predict_disease(request: Request) -> Response:
         additional_symptoms: str = validated_data.get("additional_symptoms", "")
         notes: str = validated_data.get("notes", "")
 
-        print(f"Debug - Received symptoms: {symptoms_list}")  # Debug log
+        logger.debug("Predicting from %d symptoms", len(symptoms_list))
 
         # Load ML model and make prediction
         try:
-            import sys
-            import os  # Add os import here
-
-            sys.path.append(os.path.dirname(__file__))
-            from ml_model import DiseasePredictor
-
-            predictor = DiseasePredictor()
-            if predictor.load_model():
-                predicted_disease_name, confidence = predictor.predict_disease(
-                    symptoms_list
+            predictor = get_predictor()
+            if predictor is not None:
+                # Imported here, like the model, so workers load numpy lazily
+                from . import snapshot
+
+                (
+                    predicted_disease_name,
+                    confidence,
+                    explanation,
+                ) = predictor.predict_with_explanation(symptoms_list)
+                logger.debug(
+                    "Predicted disease %s with confidence %.3f",
+                    predicted_disease_name,
+                    confidence,
                 )
-                
-                print(f"Debug - Predicted disease: {predicted_disease_name}, confidence: {confidence}")  # Debug log
-
-                # Find the disease object
-                try:
-                    predicted_disease = Disease.objects.get(name=predicted_disease_name)
-                    print(f"Debug - Found disease in database: {predicted_disease.name}")  # Debug log
-                except Disease.DoesNotExist:
-                    print(f"Debug - Disease not found in database: {predicted_disease_name}")  # Debug log
+
+                # Find the disease and symptoms in the shared catalog snapshot
+                catalog_snapshot = snapshot.current()
+                row = catalog_snapshot.disease_row(predicted_disease_name)
+                if row is None:
+                    logger.debug("Disease not in the catalog: %s", predicted_disease_name)
                     return Response(
                         {"error": f"Predicted disease '{predicted_disease_name}' not found in database"},
                         status=status.HTTP_404_NOT_FOUND,
                     )
-
-                # Find symptoms in database
-                symptoms = Symptom.objects.filter(name__in=symptoms_list)
+                symptoms = catalog_snapshot.symptom_ids_for(symptoms_list)
 
                 # Create prediction record
-                prediction = Prediction.objects.create(
+                prediction = user_manager(Prediction, request.user).create(
                     user=request.user,
-                    predicted_disease=predicted_disease,
+                    predicted_disease_id=int(catalog_snapshot.disease_ids[row]),
                     confidence_score=confidence * 100,  # Convert to percentage
                     additional_symptoms=additional_symptoms,
                     notes=notes,
                 )
                 prediction.symptoms.set(symptoms)
+                submit_shadow(prediction, symptoms_list)
 
                 return Response(
                     {
                         "prediction": PredictionSerializer(prediction).data,
+                        # Symptoms ranked by how much they pushed the model
+                        # towards the predicted disease
+                        "explanation": [
+                            {"symptom": name, "contribution": round(value, 4)}
+                            for name, value in explanation
+                        ],
                         "message": "Prediction created successfully using ML model",
                     }
                 )
             else:
                 # Fallback to simple logic if model loading fails
+                warmup.record_fallback("model not loaded")
                 return _simple_prediction_fallback(
                     request, symptoms_list, additional_symptoms, notes
                 )
 
         except Exception as e:
-            print(f"ML prediction error: {e}")
+            logger.exception("ML prediction failed, using the fallback")
+            warmup.record_fallback(f"prediction error: {e}")
             # Fallback to simple logic
             return _simple_prediction_fallback(
                 request, symptoms_list, additional_symptoms, notes
@@ -185,50 +553,46 @@ def predict_disease(request: Request) -> Response:
 
 def _simple_prediction_fallback(request, symptoms_list, additional_symptoms, notes):
     """Fallback prediction method using simple symptom matching"""
+    from . import snapshot
+
     # Remove duplicates from symptoms list while preserving order
     symptoms_list = list(dict.fromkeys(symptoms_list))
-    print(f"Debug - Fallback method symptoms (after deduplication): {symptoms_list}")
-    print(f"Debug - All diseases in DB: {[d.name for d in Disease.objects.all()]}")
-    for disease in Disease.objects.all():
-        print(f"Debug - Disease: {disease.name}, Symptoms: {[s.name for s in disease.symptoms.all()]}")
-
-    # Find symptoms in database
-    symptoms = Symptom.objects.filter(name__in=symptoms_list)
-    
-    if not symptoms.exists():
+
+    # Find symptoms in the shared catalog snapshot
+    catalog_snapshot = snapshot.current()
+    columns = catalog_snapshot.exact_columns(symptoms_list)
+
+    if not columns:
         return Response(
             {"error": "No valid symptoms found"}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    print(f"Debug - Found {symptoms.count()} valid symptoms in database")
+    logger.debug("Fallback matching %d known symptoms", len(columns))
 
     # Simple prediction logic - find disease with most matching symptoms
-    diseases = Disease.objects.all()
+    # Score is the share of each disease's listed symptoms that were reported
+    matching = catalog_snapshot.incidence[:, columns].sum(axis=1)
+    listed = catalog_snapshot.listed
+    scores = matching / listed.clip(min=1)
     best_match = None
     best_score = 0
-    
-    symptom_ids = set(symptoms.values_list("id", flat=True))
-
-    for disease in diseases:
-        disease_symptom_ids = set(disease.symptoms.values_list("id", flat=True))
-        matching_count = len(symptom_ids.intersection(disease_symptom_ids))
-        total_symptoms = len(disease_symptom_ids)
-        
-        # Calculate score based on both matching ratio and absolute number of matches
-        score = (matching_count / total_symptoms) if total_symptoms > 0 else 0
-        
-        print(f"Debug - Disease: {disease.name}, Score: {score}, Matches: {matching_count}/{total_symptoms}")
-        
-        if score > best_score:
-            best_score = score
-            best_match = disease
-
-    if best_match:
-        print(f"Debug - Best match found: {best_match.name} with score {best_score}")
+    if len(scores) and scores.max() > 0:
+        # Ties go to the oldest disease, as when diseases were scanned by pk
+        tied = (scores == scores.max()).nonzero()[0]
+        best_match = int(tied[catalog_snapshot.disease_ids[tied].argmin()])
+        best_score = float(scores[best_match])
+    symptoms = catalog_snapshot.symptom_ids[columns].tolist()
+
+    if best_match is not None:
+        logger.debug(
+            "Fallback best match %s with score %.3f",
+            catalog_snapshot.disease_name(best_match),
+            best_score,
+        )
         # Create prediction record
-        prediction = Prediction.objects.create(
+        prediction = user_manager(Prediction, request.user).create(
             user=request.user,
-            predicted_disease=best_match,
+            predicted_disease_id=int(catalog_snapshot.disease_ids[best_match]),
             confidence_score=best_score * 100,  # Convert to percentage
             additional_symptoms=additional_symptoms,
             notes=notes,
@@ -242,24 +606,62 @@ def _simple_prediction_fallback(request, symptoms_list, additional_symptoms, not
             }
         )
     else:
-        print("Debug - No matching disease found")
+        logger.debug("Fallback found no matching disease")
         return Response(
             {"error": "No matching disease found"}, status=status.HTTP_404_NOT_FOUND
         )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def suggest_symptoms(request):
+    """Symptoms worth asking about next, ranked by expected information gain"""
+    serializer = SymptomSuggestionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Imported here so web workers load numpy only when intake starts
+    from .suggestions import suggest_symptoms as rank_symptoms
+
+    data = serializer.validated_data
+    return Response(
+        rank_symptoms(data["symptoms"], data["absent_symptoms"], data["limit"])
+    )
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def health_check(request):
     return Response({"status": "healthy", "message": "MediXpert API is running"})
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def liveness(request):
+    """The process is up and serving requests"""
+    return Response({"status": "alive", "uptime_seconds": warmup.uptime_seconds()})
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def readiness(request):
+    """503 until this worker is warmed up and has a model to predict with"""
+    ready, report = warmup.readiness()
+    return Response(
+        report,
+        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_dashboard(request):
     user = request.user
-    predictions = Prediction.objects.filter(user=user)[:5]  # Last 5 predictions
-    health_records = HealthRecord.objects.filter(user=user)[:5]  # Last 5 records
+    predictions = list(user_queryset(Prediction, user)[:5])  # Last 5 predictions
+    if len(predictions) < 5:
+        predictions += islice(archive.archived_predictions(user), 5 - len(predictions))
+    health_records = user_queryset(HealthRecord, user)[:5]  # Last 5 records
+    archived_predictions, archived_records = archive.counts(user)
 
     return Response(
         {
@@ -268,7 +670,73 @@ def user_dashboard(request):
             "recent_health_records": HealthRecordSerializer(
                 health_records, many=True
             ).data,
-            "total_predictions": Prediction.objects.filter(user=user).count(),
-            "total_health_records": HealthRecord.objects.filter(user=user).count(),
+            "total_predictions": user_queryset(Prediction, user).count()
+            + archived_predictions,
+            "total_health_records": user_queryset(HealthRecord, user).count()
+            + archived_records,
+        }
+    )
+
+
+# Query parameter -> rollup column for /api/analytics/?group_by=
+ANALYTICS_DIMENSIONS = {
+    "disease": "disease__name",
+    "severity": "disease__severity",
+    "age_band": "age_band",
+    "gender": "gender",
+}
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def analytics(request):
+    """Predicted disease counts per day or week, read only from the rollups"""
+    period = request.query_params.get("period", "day")
+    if period not in ("day", "week"):
+        return Response(
+            {"error": "period must be 'day' or 'week'"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    group_by = [
+        g for g in request.query_params.get("group_by", "disease").split(",") if g
+    ]
+    unknown = [g for g in group_by if g not in ANALYTICS_DIMENSIONS]
+    if unknown:
+        return Response(
+            {"error": f"Unknown group_by: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    rollups = DiseaseIncidenceRollup.objects.filter(period=period)
+    start = parse_date(request.query_params.get("start", ""))
+    end = parse_date(request.query_params.get("end", ""))
+    if start:
+        rollups = rollups.filter(period_start__gte=start)
+    if end:
+        rollups = rollups.filter(period_start__lte=end)
+    if request.query_params.get("disease"):
+        rollups = rollups.filter(disease__name=request.query_params["disease"])
+
+    columns = [ANALYTICS_DIMENSIONS[g] for g in group_by]
+    rows = (
+        rollups.values("period_start", *columns)
+        .annotate(total=Sum("count"))
+        .filter(total__gt=0)
+        .order_by("period_start", *columns)
+    )
+
+    return Response(
+        {
+            "period": period,
+            "group_by": group_by,
+            "results": [
+                {
+                    "period_start": row["period_start"],
+                    **{g: row[ANALYTICS_DIMENSIONS[g]] for g in group_by},
+                    "count": row["total"],
+                }
+                for row in rows
+            ],
         }
     )
@@ -0,0 +1,198 @@
+import datetime
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import catalog
+from .inference import get_predictor
+from .models import Disease
+
+_state = {
+    "status": "cold",  # cold -> warming -> done
+    "started_at": None,
+    "finished_at": None,
+    "timings_ms": {},
+    "errors": {},
+    "fallbacks": 0,
+    "last_fallback": None,
+}
+_lock = threading.Lock()
+_boot = time.monotonic()
+
+
+def _step(name, func):
+    start = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        _state["errors"][name] = str(e) or e.__class__.__name__
+    _state["timings_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _open_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def _load_model():
+    if get_predictor() is None:
+        raise FileNotFoundError(f"Model artifact not found: {settings.MODEL_PATH}")
+
+
+def _build_lookups():
+    from . import snapshot
+
+    catalog.fragments()
+    snapshot.current()
+
+
+def _dummy_inference():
+    predictor = get_predictor()
+    if predictor is None:
+        raise RuntimeError("No model loaded")
+    # One full symptom set per disease, then an explained single request
+    by_disease = defaultdict(list)
+    for disease_id, name in Disease.symptoms.through.objects.using(
+        "default"
+    ).values_list("disease_id", "symptom__name"):
+        by_disease[disease_id].append(name)
+    symptom_lists = list(by_disease.values()) or [predictor.symptom_names[:3]]
+    predictor.predict_many(symptom_lists)
+    predictor.predict_with_explanation(symptom_lists[0])
+
+
+def _claim():
+    with _lock:
+        if _state["status"] != "cold":
+            return False
+        _state["status"] = "warming"
+        return True
+
+
+def _run():
+    _state["started_at"] = timezone.now()
+    _step("database", _open_connections)
+    _step("model", _load_model)
+    _step("lookups", _build_lookups)
+    _step("inference", _dummy_inference)
+    _state["finished_at"] = timezone.now()
+    _state["status"] = "done"
+
+
+def _run_in_background():
+    try:
+        _run()
+    finally:
+        # Connections opened here belong to this thread; request threads
+        # open their own, but the server and page cache are now warm
+        connections.close_all()
+
+
+def warm_up():
+    """Pay this process's cold-start costs, unless already paid or underway"""
+    if _claim():
+        _run()
+
+
+def _mode():
+    return getattr(settings, "WARMUP", "background")
+
+
+def start():
+    """
+    Warm up this process as configured by settings.WARMUP: blocking,
+    background or off. Called on every request by WarmupMiddleware, so each
+    worker warms itself up after any fork; only the first call does anything.
+    """
+    if _state["status"] != "cold":
+        return
+    mode = _mode()
+    if mode == "blocking":
+        warm_up()
+    elif mode == "background" and _claim():
+        threading.Thread(target=_run_in_background, name="warmup", daemon=True).start()
+
+
+def _after_fork():
+    # A warm-up thread does not survive fork, and neither may a lock some
+    # other thread held; a child forked mid warm-up starts over
+    global _lock
+    _lock = threading.Lock()
+    if _state["status"] == "warming":
+        _state.update(
+            status="cold",
+            started_at=None,
+            finished_at=None,
+            timings_ms={},
+            errors={},
+        )
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def record_fallback(reason):
+    """Note that a prediction was served by the rule-based fallback"""
+    with _lock:
+        _state["fallbacks"] += 1
+        _state["last_fallback"] = {"at": timezone.now(), "reason": reason}
+
+
+def model_info():
+    predictor = get_predictor()
+    if predictor is None:
+        return None
+    path = str(settings.MODEL_PATH)
+    stat = os.stat(path)
+    return {
+        "path": path,
+        "backend": predictor.backend,
+        "modified_at": datetime.datetime.fromtimestamp(
+            stat.st_mtime, tz=datetime.timezone.utc
+        ),
+        "size_bytes": stat.st_size,
+        "symptoms": len(predictor.symptom_names),
+        "diseases": len(predictor.model.classes_),
+        "catalog_fingerprint": predictor.catalog_fingerprint,
+    }
+
+
+def readiness():
+    """(ready, report) for this worker"""
+    model = model_info()
+    database = True
+    try:
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Exception:
+        database = False
+    # With warm-up off the first requests pay the cold-start costs instead
+    warm = _state["status"] == "done" or _mode() == "off"
+    ready = warm and model is not None and database
+    return ready, {
+        "ready": ready,
+        "warmup": {
+            "status": _state["status"],
+            "started_at": _state["started_at"],
+            "finished_at": _state["finished_at"],
+            "timings_ms": _state["timings_ms"],
+            "errors": _state["errors"],
+        },
+        "model": model,
+        "database": database,
+        # Predictions served by the rule-based fallback since the worker started
+        "fallback": {
+            "active": model is None,
+            "count": _state["fallbacks"],
+            "last": _state["last_fallback"],
+        },
+    }
+
+
+def uptime_seconds():
+    return round(time.monotonic() - _boot, 1)
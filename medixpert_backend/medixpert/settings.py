@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -47,11 +49,15 @@ INSTALLED_APPS = [
 # Django REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.CachedJWTAuthentication",
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Make endpoints public by default
     ],
+    # Reverse proxies in front of the app. Throttles key anonymous clients on
+    # the X-Forwarded-For entry this many hops from the right, or on
+    # REMOTE_ADDR when 0; clients can forge everything further left.
+    "NUM_PROXIES": int(os.environ.get("MEDIXPERT_NUM_PROXIES", "0")),
 }
 
 # JWT settings
@@ -62,13 +68,35 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
 }
 
+# Refresh-token revocation: one Bloom filter per expiry bucket in each
+# process, backed by the core.RevokedToken table
+TOKEN_REVOCATION = {
+    "BUCKET_SECONDS": 6 * 60 * 60,
+    "BUCKET_CAPACITY": 250_000,  # revocations per bucket before the FP rate rises
+    "ERROR_RATE": 0.001,
+    "SYNC_INTERVAL": 5,  # seconds between pulls of other processes' revocations
+    "SYNC_OVERLAP": 60,  # seconds each pull re-reads for late commits
+}
+
+# Seconds an authenticated User stays in the per-process cache
+JWT_USER_CACHE_TTL = 60
+# Build request.user from signed token claims on read-only requests
+JWT_TRUST_USER_CLAIMS = True
+# Seconds between pulls of user changes (core.UserChange) made by other
+# processes; claims and cached users of a changed user stop being trusted
+# everywhere within this
+JWT_INVALIDATION_SYNC_INTERVAL = 1
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.WarmupMiddleware",
+    "core.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # Add CORS middleware
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -99,10 +127,244 @@ WSGI_APPLICATION = "medixpert.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.environ.get("MEDIXPERT_DB_NAME", BASE_DIR / "db.sqlite3"),
+        # A file rather than the in-memory default, so tests with concurrent
+        # threads wait on SQLite's locks as deployments do instead of failing
+        "TEST": {
+            "NAME": os.environ.get(
+                "MEDIXPERT_TEST_DB_NAME",
+                os.path.join(tempfile.gettempdir(), "medixpert-test.sqlite3"),
+            )
+        },
     }
 }
 
+# "development" keeps Django's SQLite defaults. "production" enables WAL so
+# readers never block on prediction writes, relaxes fsyncs to NORMAL (safe
+# under WAL), keeps connections open between requests and takes the write
+# lock up front (IMMEDIATE) so concurrent writers queue on busy_timeout
+# instead of failing with "database is locked" on lock upgrade.
+DB_PROFILE = os.environ.get("MEDIXPERT_DB_PROFILE", "development")
+
+if DB_PROFILE == "production":
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": int(os.environ.get("MEDIXPERT_DB_CONN_MAX_AGE", 600)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    f"PRAGMA mmap_size={os.environ.get('MEDIXPERT_SQLITE_MMAP_SIZE', 268435456)};"
+                    f"PRAGMA cache_size={os.environ.get('MEDIXPERT_SQLITE_CACHE_SIZE', -64000)};"
+                    f"PRAGMA busy_timeout={os.environ.get('MEDIXPERT_SQLITE_BUSY_TIMEOUT', 5000)};"
+                    "PRAGMA temp_store=MEMORY;"
+                ),
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    )
+
+# Read replicas, as comma separated SQLite paths (a file kept in sync by a
+# replication tool, or a plain copy for local testing). Writes always go to
+# "default"; reads go to a replica unless the request writes or the user
+# wrote within REPLICA_STICKINESS seconds.
+DATABASE_REPLICAS = []
+for _index, _path in enumerate(
+    filter(None, os.environ.get("MEDIXPERT_DB_REPLICAS", "").split(","))
+):
+    _alias = f"replica{_index + 1}"
+    DATABASES[_alias] = {
+        **DATABASES["default"],
+        "NAME": _path,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+# Optional user sharding, as comma separated SQLite paths. Predictions and
+# health records live on the owning user's shard; users and the disease/
+# symptom catalog are replicated to every shard. Run
+# `manage.py migrate --database shardN` and `manage.py sync_shard_catalog`
+# after adding a shard.
+DATABASE_SHARDS = []
+for _index, _path in enumerate(
+    filter(None, os.environ.get("MEDIXPERT_DB_SHARDS", "").split(","))
+):
+    _alias = f"shard{_index + 1}"
+    DATABASES[_alias] = {
+        **DATABASES["default"],
+        "NAME": _path,
+        "TEST": {
+            "NAME": os.path.join(
+                tempfile.gettempdir(), f"medixpert-test-{_alias}.sqlite3"
+            )
+        },
+    }
+    DATABASE_SHARDS.append(_alias)
+
+# Seconds a process trusts its cached user -> shard lookups
+SHARD_MAP_CACHE_TTL = 30
+
+DATABASE_ROUTERS = [
+    "core.db_routers.ShardRouter",
+    "core.db_routers.PrimaryReplicaRouter",
+]
+
+REPLICA_STICKINESS = 5
+
+# Shared by every worker: replica stickiness must be seen by whichever worker
+# serves the user's next request. The database cache lives on the primary
+# (run `manage.py createcachetable` once); set MEDIXPERT_REDIS_URL to use a
+# Redis server instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "medixpert_cache",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    }
+}
+if os.environ.get("MEDIXPERT_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["MEDIXPERT_REDIS_URL"],
+        }
+    }
+
+# How DiseaseIncidenceRollup is maintained: "incremental" updates it as each
+# prediction is created or deleted; "compaction" leaves it to a periodic
+# `manage.py compact_rollups` run from a watermark (deletes are then only
+# reflected by `manage.py rebuild_rollups`).
+ANALYTICS_ROLLUP_MODE = os.environ.get("MEDIXPERT_ROLLUP_MODE", "incremental")
+
+# Seconds a clinician holds claimed review-queue records before they return
+# to the queue
+REVIEW_LEASE_SECONDS = 15 * 60
+
+# Where scan_follow_ups sends reminder events
+FOLLOW_UP_SINK = {
+    "BACKEND": "core.reminders.FileSink",
+    "OPTIONS": {"path": BASE_DIR / "reminders.ndjson"},
+}
+
+# Model artifact served by predict_disease
+MODEL_PATH = BASE_DIR / "models" / "disease_predictor.pkl"
+# Estimator trained by ml_model.py: random_forest, bernoulli_nb or jaccard_nn.
+# The backend is stored in the artifact, so serving needs no matching setting.
+MODEL_BACKEND = os.environ.get("MEDIXPERT_MODEL_BACKEND", "random_forest")
+
+# Catalog-driven retraining (`manage.py retrain_model --loop`, a worker of its
+# own so training never runs in a web process). After catalog edits settle for
+# SETTLE_SECONDS, a random forest whose symptoms and diseases are unchanged
+# grows WARM_START_TREES trees, up to MAX_TREES; otherwise it is retrained.
+RETRAINING = {"SETTLE_SECONDS": 30, "WARM_START_TREES": 25, "MAX_TREES": 200}
+
+# Token buckets for the expensive endpoints ("N/period": bursts of N, refilled
+# at N per period). Shared state: MemoryBucketStore is per process;
+# SQLiteBucketStore shares buckets between the workers on a host.
+THROTTLE_STORE = {"BACKEND": "core.throttling.MemoryBucketStore", "OPTIONS": {}}
+if os.environ.get("MEDIXPERT_THROTTLE_DB"):
+    THROTTLE_STORE = {
+        "BACKEND": "core.throttling.SQLiteBucketStore",
+        "OPTIONS": {"path": os.environ["MEDIXPERT_THROTTLE_DB"]},
+    }
+THROTTLE_RATES = {
+    "predict_user": "30/min",
+    "predict_ip": "120/min",
+    "login_ip": "20/min",
+    # Per account and client IP, so failed guesses cannot lock an account's
+    # owner out from elsewhere
+    "login_username": "10/min",
+    "register_ip": "10/hour",
+}
+
+# Per-process caps on concurrent CPU-heavy work; requests wait up to
+# "timeout" seconds for a slot, then get 503 with Retry-After
+CONCURRENCY_LIMITS = {
+    "inference": {"limit": 4, "timeout": 0.5},
+    "password_hashing": {"limit": 2, "timeout": 1.0},
+    # One bulk batch at a time; hashing a full inline batch takes ~10 s
+    "bulk_provisioning": {"limit": 1, "timeout": 0, "retry_after": 10},
+    # Splitting an upload into chunks is quick, but the files are large
+    "intake_upload": {"limit": 2, "timeout": 0, "retry_after": 30},
+}
+if os.environ.get("MEDIXPERT_ADMISSION_CONTROL") == "off":
+    THROTTLE_RATES = {}
+    CONCURRENCY_LIMITS = {}
+
+# Bulk patient provisioning (POST /api/patients/bulk/, `manage.py
+# provision_patients`). A password hash costs about half a second of CPU
+# with the default hasher, so a request hashes at most
+# PROVISIONING_SYNC_MAX_ROWS passwords itself; larger batches, up to
+# PROVISIONING_MAX_ROWS, are queued as intake jobs for the
+# `manage.py process_intake_jobs` workers. Those and `manage.py
+# provision_patients` hash in a pool of PROVISIONING_WORKERS processes
+# (default: one per CPU). Queued passwords are stored encrypted with a key
+# derived from SECRET_KEY (this needs the cryptography package) and are
+# dropped, failing their rows, if not processed within
+# PROVISIONING_SECRETS_TTL seconds.
+PROVISIONING_WORKERS = None
+PROVISIONING_SYNC_MAX_ROWS = 20
+PROVISIONING_MAX_ROWS = 10000
+PROVISIONING_SECRETS_TTL = 24 * 60 * 60
+
+# Bulk intake jobs (POST /api/intake-jobs/): uploads are split into chunks of
+# CHUNK_SIZE rows that `manage.py process_intake_jobs` workers lease for
+# LEASE_SECONDS each; a chunk claimed more than MAX_ATTEMPTS times is failed.
+INTAKE = {
+    "CHUNK_SIZE": 1000,
+    "MAX_ROWS": 500000,
+    "LEASE_SECONDS": 300,
+    "MAX_ATTEMPTS": 3,
+}
+
+# Idempotency-Key handling for POST /api/predict/: stored responses live for
+# TTL seconds; retries wait up to WAIT seconds for an in-flight original,
+# which is presumed dead after LOCK_TIMEOUT seconds. Purge expired keys with
+# `manage.py purge_idempotency_keys`.
+IDEMPOTENCY = {"TTL": 24 * 60 * 60, "WAIT": 10, "LOCK_TIMEOUT": 60}
+
+# Tiered archival: `manage.py archive_predictions` moves predictions older
+# than AFTER_DAYS, with their health records, into compressed per-user monthly
+# segments, BATCH_SIZE predictions per transaction with PAUSE seconds between
+# batches. History endpoints read archived rows back transparently.
+ARCHIVE = {"AFTER_DAYS": 365, "BATCH_SIZE": 500, "PAUSE": 0.05}
+
+# Response compression (core.compression.CompressionMiddleware): bodies of at
+# least MIN_SIZE bytes are compressed with the first of ENCODINGS the client
+# accepts; "br" needs the brotli package and "zstd" the zstandard package.
+# The catalog list endpoints are compressed once per catalog version at
+# PRECOMPRESSED_LEVELS, everything else per response at LEVELS.
+COMPRESSION = {
+    "MIN_SIZE": 1024,
+    "ENCODINGS": ["zstd", "br", "gzip"],
+    "LEVELS": {"gzip": 6, "br": 4, "zstd": 3},
+    "PRECOMPRESSED_LEVELS": {"gzip": 9, "br": 11, "zstd": 19},
+}
+
+# Worker warm-up (model, catalog lookups, a dummy inference batch, DB
+# connections), started by each process's first request so it also runs in
+# workers forked from a preloaded master: "background" serves liveness
+# immediately and reports ready once done, "blocking" finishes before the
+# first request is served, "off" skips it (readiness then only needs the
+# model and the database)
+WARMUP = os.environ.get("MEDIXPERT_WARMUP", "background")
+
+# Seconds a process trusts its cached catalog version before re-reading it;
+# catalog edits made in the same process are seen immediately
+CATALOG_VERSION_TTL = 5
+
+# Where the read-only catalog snapshot (symptom and disease lookups, the
+# disease x symptom incidence matrix) is published for every worker on the
+# host to memory-map. Default: /dev/shm/medixpert-catalog, or the temp dir.
+CATALOG_SNAPSHOT_DIR = os.environ.get("MEDIXPERT_CATALOG_SNAPSHOT_DIR")
+
+# Candidate model scored in the background against live traffic; predictions
+# it disagrees with are stored as core.ShadowDisagreement. Unset disables it.
+SHADOW_MODEL_PATH = os.environ.get("MEDIXPERT_SHADOW_MODEL")
+# Shadow jobs allowed to wait before new ones are dropped
+SHADOW_BACKLOG = 100
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -164,6 +426,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -1,29 +1,174 @@
-import pandas as pd
+"""
+Disease prediction model.
+
+Only numpy and joblib are imported at module load: serving a saved model
+needs nothing else for the bitset backends, and a forest artifact pulls in
+sklearn and scipy when it is unpickled. Training imports sklearn and the
+Django models on demand, so importing this module never configures Django.
+"""
+
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import joblib
+import hashlib
+import json
 import os
-import django
+import tempfile
+import time
+import warnings
+
+# Bit i of byte value v, in np.packbits (big-endian) order, and its popcount
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+BYTE_POPCOUNT = BYTE_BITS.sum(axis=1)
+
+
+def catalog_fingerprint(symptom_names, disease_symptoms):
+    """Digest of the symptom vocabulary and every disease's symptom set"""
+    catalog = {
+        "symptoms": sorted(symptom_names),
+        "diseases": {
+            disease: sorted(symptoms) for disease, symptoms in disease_symptoms.items()
+        },
+    }
+    return hashlib.sha256(
+        json.dumps(catalog, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def pack_features(X):
+    """Pack binary feature rows into bitsets of n_features / 8 bytes"""
+    return np.packbits(np.asarray(X) > 0, axis=1)
+
+
+class BernoulliNBBackend:
+    """
+    Bernoulli Naive Bayes scored over packed symptom bitsets.
+
+    The joint log-likelihood of a row is a constant per class plus the
+    log-odds weight of every present symptom. The weights are folded into a
+    (byte position, byte value) lookup table, so scoring a row costs one
+    table lookup per 8 symptoms.
+    """
+
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, X, y):
+        from sklearn.naive_bayes import BernoulliNB
+
+        # Augmented sample counts differ per disease, so priors stay uniform
+        nb = BernoulliNB(alpha=self.alpha, fit_prior=False).fit(X, y)
+        self.classes_ = nb.classes_
+        log_p = nb.feature_log_prob_
+        log_not_p = np.log1p(-np.exp(log_p))
+        self.weights = (log_p - log_not_p).T  # features x classes
+        self.base = nb.class_log_prior_ + log_not_p.sum(axis=1)
+
+        n_features, n_classes = self.weights.shape
+        padded = np.zeros((-(-n_features // 8) * 8, n_classes))
+        padded[:n_features] = self.weights
+        self.table = np.einsum(
+            "vk,bkc->bvc", BYTE_BITS, padded.reshape(-1, 8, n_classes)
+        )
+        return self
+
+    def predict_batch(self, X):
+        """Posterior probabilities and per-symptom log-odds contributions"""
+        packed = pack_features(X)
+        jll = self.base + self.table[np.arange(packed.shape[1]), packed].sum(axis=1)
+        proba = np.exp(jll - jll.max(axis=1, keepdims=True))
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba, np.asarray(X)[:, :, None] * self.weights
+
+    def predict(self, X):
+        return self.classes_[self.predict_batch(X)[0].argmax(axis=1)]
+
+    @property
+    def feature_importances_(self):
+        spread = self.weights.std(axis=1)
+        return spread / spread.sum()
+
+
+class JaccardNeighborBackend:
+    """
+    Nearest disease by Jaccard similarity between symptom bitsets.
+
+    Each disease is represented by the union of its training rows, which is
+    its full Disease.symptoms set. The confidence is the similarity itself,
+    and a present symptom shared with a disease contributes 1 / |union|.
+    """
+
+    def fit(self, X, y):
+        X = np.asarray(X) > 0
+        self.classes_, y_index = np.unique(y, return_inverse=True)
+        prototypes = np.zeros((len(self.classes_), X.shape[1]), dtype=bool)
+        np.logical_or.at(prototypes, y_index, X)
+        self.prototypes = prototypes
+        self.packed = pack_features(prototypes)
+        self.sizes = prototypes.sum(axis=1)
+        return self
+
+    def predict_batch(self, X):
+        """Jaccard similarities and per-symptom contributions to them"""
+        packed = pack_features(X)
+        shared = BYTE_POPCOUNT[packed[:, None, :] & self.packed].sum(axis=2)
+        sizes = BYTE_POPCOUNT[packed].sum(axis=1)
+        union = np.maximum(sizes[:, None] + self.sizes - shared, 1)
+        contributions = (
+            (np.asarray(X)[:, :, None] > 0) * self.prototypes.T / union[:, None, :]
+        )
+        return shared / union, contributions
+
+    def predict(self, X):
+        return self.classes_[self.predict_batch(X)[0].argmax(axis=1)]
 
-# Setup Django
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medixpert_backend.settings")
-django.setup()
+    @property
+    def feature_importances_(self):
+        # Symptoms shared by fewer diseases discriminate better
+        counts = self.prototypes.sum(axis=0)
+        rarity = np.where(counts > 0, 1 / np.maximum(counts, 1), 0)
+        return rarity / rarity.sum()
 
-from core.models import Symptom, Disease
+
+def _random_forest():
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(
+        n_estimators=100, max_depth=10, random_state=42, class_weight="balanced"
+    )
+
+
+# Estimator backends selectable through settings.MODEL_BACKEND
+BACKENDS = {
+    "random_forest": _random_forest,
+    "bernoulli_nb": BernoulliNBBackend,
+    "jaccard_nn": JaccardNeighborBackend,
+}
 
 
 class DiseasePredictor:
-    def __init__(self):
+    # Predictions below this probability are treated as "no prediction"
+    CONFIDENCE_THRESHOLD = 0.2
+
+    def __init__(self, backend="random_forest"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend}")
+        self.backend = backend
         self.model = None
+        self.training_seconds = None
         self.symptom_encoder = None
         self.disease_encoder = None
         self.symptom_names = []
+        self.catalog_fingerprint = None
+        self.warm_started = False
+        self.feature_importance = None
+        self.contributions = None
+        self.contribution_offsets = None
+        self.contribution_bias = None
 
     def prepare_data(self):
         """Prepare training data from database"""
+        from core.models import Symptom, Disease
+
         print("Preparing training data...")
 
         # Get all symptoms and diseases from database
@@ -35,9 +180,11 @@ class DiseasePredictor:
         # Create training data
         X_data = []
         y_data = []
+        catalog = {}
 
         for disease in diseases:
             disease_symptoms = list(disease.symptoms.values_list("name", flat=True))
+            catalog[disease.name] = disease_symptoms
 
             # Create binary vector for symptoms
             symptom_vector = [
@@ -65,10 +212,21 @@ class DiseasePredictor:
                     X_data.append(symptom_vector)
                     y_data.append(disease.name)
 
+        # Fingerprint of exactly the catalog this data was built from
+        self.catalog_fingerprint = catalog_fingerprint(symptoms, catalog)
         return np.array(X_data), np.array(y_data)
 
-    def train_model(self):
-        """Train the disease prediction model"""
+    def train_model(self, previous=None, extra_trees=0):
+        """
+        Train the disease prediction model.
+
+        Given a previous predictor with the same backend, symptoms and
+        diseases, a random forest keeps its trees and grows extra_trees more
+        on the current data instead of being trained from scratch.
+        """
+        from sklearn.metrics import accuracy_score, classification_report
+        from sklearn.model_selection import train_test_split
+
         print("Training disease prediction model...")
 
         X, y = self.prepare_data()
@@ -87,12 +245,15 @@ class DiseasePredictor:
                 X, y, test_size=0.2, random_state=42, stratify=y
             )
 
-        # Train Random Forest model
-        self.model = RandomForestClassifier(
-            n_estimators=100, max_depth=10, random_state=42, class_weight="balanced"
-        )
-
-        self.model.fit(X_train, y_train)
+        if previous is not None and extra_trees and self.can_extend(previous, y):
+            self.extend(previous, X_train, y_train, extra_trees)
+            print(
+                f"Added {extra_trees} trees to {self.backend} "
+                f"in {self.training_seconds:.2f}s"
+            )
+        else:
+            self.fit(X_train, y_train)
+            print(f"Trained {self.backend} in {self.training_seconds:.2f}s")
 
         # Evaluate model
         y_pred = self.model.predict(X_test)
@@ -104,72 +265,296 @@ class DiseasePredictor:
 
         return True
 
-    def predict_disease(self, symptoms):
-        """Predict disease based on symptoms"""
-        if not self.model or not self.symptom_names:
-            print("Model or symptom names not initialized")
-            return None, 0.0
+    def fit(self, X, y):
+        """Fit the configured backend and drop state derived from a previous fit"""
+        start = time.perf_counter()
+        self.model = BACKENDS[self.backend]().fit(X, y)
+        self.training_seconds = time.perf_counter() - start
+        self.warm_started = False
+        self.feature_importance = None
+        self.contributions = None
+        self.contribution_offsets = None
+        self.contribution_bias = None
+        return self
+
+    def can_extend(self, previous, y):
+        """Whether previous's forest can be grown on data with labels y"""
+        return (
+            self.backend == "random_forest"
+            and previous.backend == "random_forest"
+            and list(previous.symptom_names) == list(self.symptom_names)
+            and np.array_equal(previous.model.classes_, np.unique(y))
+        )
+
+    def extend(self, previous, X, y, extra_trees):
+        """Grow extra_trees new trees on X, y next to previous's forest"""
+        start = time.perf_counter()
+        forest = previous.model
+        forest.set_params(
+            warm_start=True, n_estimators=len(forest.estimators_) + extra_trees
+        )
+        with warnings.catch_warnings():
+            # Balanced class weights are computed from X, y alone, which is
+            # what every tree of this forest was trained on anyway
+            warnings.simplefilter("ignore", UserWarning)
+            forest.fit(X, y)
+        forest.set_params(warm_start=False)
+        self.model = forest
+        self.training_seconds = time.perf_counter() - start
+        self.warm_started = True
+        self.feature_importance = None
+        self.contributions = None
+        self.contribution_offsets = None
+        self.contribution_bias = None
+        return self
+
+    def encode_symptoms(self, symptom_lists):
+        """Binary feature matrix, one row per list of symptom names"""
+        index = {}
+        for i, name in enumerate(self.symptom_names):
+            index.setdefault(name.lower().strip(), []).append(i)
+
+        X = np.zeros((len(symptom_lists), len(self.symptom_names)), dtype=np.float32)
+        for row, symptoms in enumerate(symptom_lists):
+            for symptom in symptoms:
+                X[row, index.get(symptom.lower().strip(), [])] = 1
+        return X
+
+    def _build_contributions(self):
+        """
+        Precompute tree-path (Saabas) contributions for every node of every tree.
+
+        Walking a tree from root to leaf, each step changes the class
+        distribution by value(child) - value(parent); that change is credited
+        to the feature split on at the parent. Row n of the resulting sparse
+        (total_nodes x features*classes) matrix holds the summed credit along
+        the path from the root to node n, so explaining a sample only needs
+        the leaf it reaches in each tree.
+        """
+        from scipy.sparse import csr_matrix, vstack
+
+        n_features = len(self.symptom_names)
+        n_classes = len(self.model.classes_)
+        blocks = []
+        offsets = []
+        offset = 0
+        bias = np.zeros(n_classes)
+
+        for estimator in self.model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            value = tree.value[:, 0, :]
+            value = value / value.sum(axis=1, keepdims=True)
+            bias += value[0]
+
+            internal = np.flatnonzero(tree.children_left != -1)
+            parent = np.full(n_nodes, -1)
+            parent[tree.children_left[internal]] = internal
+            parent[tree.children_right[internal]] = internal
+            has_parent = parent >= 0
+
+            # Credit of each single step, keyed by (node, feature*class)
+            delta = np.zeros_like(value)
+            delta[has_parent] = value[has_parent] - value[parent[has_parent]]
+            feature = np.zeros(n_nodes, dtype=np.int64)
+            feature[has_parent] = tree.feature[parent[has_parent]]
+            steps = csr_matrix(
+                (
+                    delta.ravel(),
+                    (
+                        np.repeat(np.arange(n_nodes), n_classes),
+                        np.repeat(feature * n_classes, n_classes)
+                        + np.tile(np.arange(n_classes), n_nodes),
+                    ),
+                ),
+                shape=(n_nodes, n_features * n_classes),
+            )
+
+            # Ancestor indicator (each node and all nodes above it), built by
+            # hopping to the parent of every node at once until past the root
+            rows, cols = [], []
+            nodes = np.arange(n_nodes)
+            current = nodes
+            while len(nodes):
+                rows.append(nodes)
+                cols.append(current)
+                current = parent[current]
+                keep = current >= 0
+                nodes, current = nodes[keep], current[keep]
+            ancestors = csr_matrix(
+                (
+                    np.ones(sum(len(r) for r in rows)),
+                    (np.concatenate(rows), np.concatenate(cols)),
+                ),
+                shape=(n_nodes, n_nodes),
+            )
 
-        # Normalize symptoms (lowercase and strip whitespace)
-        symptoms = [s.lower().strip() for s in symptoms]
-        symptom_names_normalized = [s.lower().strip() for s in self.symptom_names]
-        
-        print(f"Predicting disease for symptoms: {symptoms}")
-        print(f"Available symptoms: {symptom_names_normalized}")
+            blocks.append(ancestors @ steps)
+            offsets.append(offset)
+            offset += n_nodes
+
+        n_trees = len(self.model.estimators_)
+        self.contributions = (vstack(blocks).tocsr() / n_trees).tocsr()
+        self.contribution_offsets = np.array(offsets)
+        self.contribution_bias = bias / n_trees
+
+    def predict_batch(self, X):
+        """
+        Class probabilities and per-feature contributions for a batch.
+
+        Probabilities are bias + contributions summed over features, which is
+        exactly the forest's predict_proba, so explaining costs one leaf lookup
+        per tree and a sparse row sum. Other backends score X themselves.
+        """
+        if self.backend != "random_forest":
+            return self.model.predict_batch(X)
+        from scipy.sparse import csr_matrix
+
+        if self.contributions is None:
+            self._build_contributions()
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_samples = len(X)
+        n_trees = len(self.model.estimators_)
+        n_classes = len(self.model.classes_)
+
+        # Calling each tree's apply directly skips the forest's per-call
+        # joblib dispatch, which dominates latency for small batches
+        leaves = np.stack(
+            [estimator.tree_.apply(X) for estimator in self.model.estimators_],
+            axis=1,
+        )
+        leaves += self.contribution_offsets
+        indicator = csr_matrix(
+            (
+                np.ones(n_samples * n_trees),
+                leaves.ravel(),
+                np.arange(0, n_samples * n_trees + 1, n_trees),
+            ),
+            shape=(n_samples, self.contributions.shape[0]),
+        )
+        contributions = (indicator @ self.contributions).toarray()
+        contributions = contributions.reshape(n_samples, -1, n_classes)
+        proba = self.contribution_bias + contributions.sum(axis=1)
+        return proba, contributions
+
+    def predict_with_explanation(self, symptoms):
+        """Predict a disease and rank the given symptoms by their contribution"""
+        if not self.model or not self.symptom_names:
+            return None, 0.0, []
 
-        # Create symptom vector
-        symptom_vector = [1 if symptom in symptom_names_normalized else 0 for symptom in symptom_names_normalized]
-        print(f"Created symptom vector with {sum(symptom_vector)} active symptoms")
+        X = self.encode_symptoms([symptoms])
+        if X.sum() == 0:
+            return None, 0.0, []
 
-        # Make prediction
         try:
-            if sum(symptom_vector) == 0:
-                print("No valid symptoms found in input")
-                return None, 0.0
-
-            # Get prediction probabilities
-            proba = self.model.predict_proba([symptom_vector])[0]
-            predicted_class = self.model.predict([symptom_vector])[0]
-            confidence = max(proba)
-
-            print(f"Predicted disease: {predicted_class} with confidence: {confidence:.2f}")
-            
-            # If confidence is too low, return None
-            if confidence < 0.2:  # Lowered threshold from 0.3 to 0.2
-                print(f"Confidence too low ({confidence:.2f}), returning None")
-                return None, 0.0
-                
-            return predicted_class, confidence
-        except Exception as e:
-            print(f"Prediction error: {e}")
-            return None, 0.0
+            proba, contributions = self.predict_batch(X)
+        except Exception:
+            return None, 0.0, []
+
+        best = int(proba[0].argmax())
+        predicted_class = self.model.classes_[best]
+        confidence = float(proba[0, best])
+
+        # If confidence is too low, return None
+        if confidence < self.CONFIDENCE_THRESHOLD:
+            return None, 0.0, []
+
+        # Columns differing only in case are one symptom to encode_symptoms,
+        # so report their combined credit once
+        merged = {}
+        for i in np.flatnonzero(X[0]):
+            name = self.symptom_names[i]
+            key = name.lower().strip()
+            shown, total = merged.get(key, (name, 0.0))
+            merged[key] = (shown, total + float(contributions[0, i, best]))
+        explanation = sorted(merged.values(), key=lambda item: item[1], reverse=True)
+        return predicted_class, confidence, explanation
+
+    def predict_many(self, symptom_lists):
+        """Predict (disease or None, confidence) for many symptom lists at once"""
+        X = self.encode_symptoms(symptom_lists)
+        proba, _ = self.predict_batch(X)
+        best = proba.argmax(axis=1)
+        confidence = proba[np.arange(len(X)), best]
+        return [
+            (
+                (self.model.classes_[b], float(c))
+                if c >= self.CONFIDENCE_THRESHOLD and X[i].any()
+                else (None, 0.0)
+            )
+            for i, (b, c) in enumerate(zip(best, confidence))
+        ]
+
+    def predict_disease(self, symptoms):
+        """Predict disease based on symptoms"""
+        predicted_class, confidence, _ = self.predict_with_explanation(symptoms)
+        return predicted_class, confidence
 
     def get_feature_importance(self):
         """Get feature importance for symptoms"""
+        if self.feature_importance is not None:
+            return self.feature_importance
         if not self.model:
             return None
 
         importance = self.model.feature_importances_
-        feature_importance = list(zip(self.symptom_names, importance))
+        feature_importance = list(zip(self.symptom_names, importance.tolist()))
         feature_importance.sort(key=lambda x: x[1], reverse=True)
+        self.feature_importance = feature_importance
 
         return feature_importance
 
     def save_model(self, filepath="models/disease_predictor.pkl"):
-        """Save the trained model"""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-
-        model_data = {"model": self.model, "symptom_names": self.symptom_names}
-
-        joblib.dump(model_data, filepath)
+        """
+        Save the trained model.
+
+        The artifact is written next to filepath and renamed over it, so
+        workers reloading it never read a partly written file.
+        """
+        directory = os.path.dirname(filepath) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        self.get_feature_importance()
+        if self.backend == "random_forest":
+            self._build_contributions()
+        model_data = {
+            "backend": self.backend,
+            "model": self.model,
+            "training_seconds": self.training_seconds,
+            "symptom_names": self.symptom_names,
+            "catalog_fingerprint": self.catalog_fingerprint,
+            "feature_importance": self.feature_importance,
+            "contributions": self.contributions,
+            "contribution_offsets": self.contribution_offsets,
+            "contribution_bias": self.contribution_bias,
+        }
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            joblib.dump(model_data, temp_path)
+            # mkstemp creates the file private to this user
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, filepath)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
         print(f"Model saved to {filepath}")
 
     def load_model(self, filepath="models/disease_predictor.pkl"):
         """Load a trained model"""
         if os.path.exists(filepath):
             model_data = joblib.load(filepath)
+            self.backend = model_data.get("backend", "random_forest")
             self.model = model_data["model"]
             self.symptom_names = model_data["symptom_names"]
+            # Older artifacts lack these; they are then computed on first use
+            self.training_seconds = model_data.get("training_seconds")
+            self.catalog_fingerprint = model_data.get("catalog_fingerprint")
+            self.feature_importance = model_data.get("feature_importance")
+            self.contributions = model_data.get("contributions")
+            self.contribution_offsets = model_data.get("contribution_offsets")
+            self.contribution_bias = model_data.get("contribution_bias")
             print(f"Model loaded from {filepath}")
             return True
         else:
@@ -177,9 +562,11 @@ class DiseasePredictor:
             return False
 
 
-def train_and_save_model():
+def train_and_save_model(backend=None):
     """Train and save the disease prediction model"""
-    predictor = DiseasePredictor()
+    from django.conf import settings
+
+    predictor = DiseasePredictor(backend or settings.MODEL_BACKEND)
 
     if predictor.train_model():
         predictor.save_model()
@@ -198,6 +585,11 @@ def train_and_save_model():
 
 
 if __name__ == "__main__":
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medixpert.settings")
+    django.setup()
+
     print("Starting ML model training...")
     success = train_and_save_model()
     if success:
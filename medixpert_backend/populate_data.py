@@ -1,9 +1,9 @@
+import csv
 import os
 import django
-import pandas as pd
 
 # Setup Django
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medixpert_backend.settings")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medixpert.settings")
 django.setup()
 
 from core.models import Symptom, Disease
@@ -11,9 +11,10 @@ from core.models import Symptom, Disease
 
 def populate_symptoms():
     """Populate symptoms from CSV file"""
-    df = pd.read_csv("data/symptoms.csv")
+    with open("data/symptoms.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
 
-    for _, row in df.iterrows():
+    for row in rows:
         symptom, created = Symptom.objects.get_or_create(
             name=row["symptom"], defaults={"description": row["description"]}
         )
@@ -25,9 +26,10 @@ def populate_symptoms():
 
 def populate_diseases():
     """Populate diseases from CSV file"""
-    df = pd.read_csv("data/sample_diseases.csv")
+    with open("data/sample_diseases.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
 
-    for _, row in df.iterrows():
+    for row in rows:
         disease, created = Disease.objects.get_or_create(
             name=row["disease"],
             defaults={"description": row["description"], "severity": row["severity"]},